@@ -1,8 +1,93 @@
+import asyncio
+import time
+import requests
+
 from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+from api.resilience import remaining_time
+from metrics import upstream_retries, upstream_throttled
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Errors worth another attempt and errors meaning upstream gave no usable answer, for both HTTP clients
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout) + ((httpx.TransportError,) if httpx else ())
+UPSTREAM_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+
+class RetryDeadlineExceeded(requests.Timeout):
+    """
+    The next retry would start after the request deadline
+    """
+
+
+class RetryPolicy:
+    """
+    Retry listed statuses and connection errors with exponential backoff, never sleeping past the request deadline
+    send and send_async take a function making one attempt, so the requests session and the httpx client
+    retry Finnhub the same way
+    """
+    def __init__(self, total, backoff_factor, status_forcelist):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = frozenset(status_forcelist)
+
+    def send(self, attempt_fn, url):
+        attempt = 0
+        while True:
+            try:
+                r = attempt_fn()
+                reason = self._retry_reason(r, attempt)
+                if reason is None:
+                    return r
+            except TRANSPORT_ERRORS as error:
+                if attempt >= self.total:
+                    raise
+                reason = type(error).__name__
+            time.sleep(self._backoff(attempt, reason, url))
+            attempt += 1
+
+    async def send_async(self, attempt_fn, url):
+        """
+        send for coroutine functions
+        """
+        attempt = 0
+        while True:
+            try:
+                r = await attempt_fn()
+                reason = self._retry_reason(r, attempt)
+                if reason is None:
+                    return r
+            except TRANSPORT_ERRORS as error:
+                if attempt >= self.total:
+                    raise
+                reason = type(error).__name__
+            await asyncio.sleep(self._backoff(attempt, reason, url))
+            attempt += 1
+
+    def _retry_reason(self, r, attempt):
+        """
+        Status to retry the response for, None to return it
+        """
+        if r.status_code == 429:
+            upstream_throttled.inc()
+        if r.status_code not in self.status_forcelist:
+            return None
+        if attempt >= self.total:
+            r.raise_for_status()
+        return r.status_code
+
+    def _backoff(self, attempt, reason, url):
+        backoff = self.backoff_factor * (2 ** attempt)
+        remaining = remaining_time()
+        if remaining is not None and backoff >= remaining:
+            raise RetryDeadlineExceeded(f"No response from {url.split('?')[0]} within the request deadline")
+        upstream_retries.inc(reason=reason)
+        return backoff
 
 #Retry Logic
-retries = Retry(
+retries = RetryPolicy(
     total=3,
     backoff_factor=1,
     status_forcelist=[429, 500, 502, 503, 504]
@@ -12,6 +97,9 @@ retries = Retry(
 DEFAULT_TIMEOUT = 5 # seconds
 
 class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    Retries are left to RetryPolicy, every attempt is bounded by the timeout and the request deadline
+    """
     def __init__(self, *args, **kwargs):
         self.timeout = DEFAULT_TIMEOUT
         if "timeout" in kwargs:
@@ -23,4 +111,7 @@ class TimeoutHTTPAdapter(HTTPAdapter):
         timeout = kwargs.get("timeout")
         if timeout is None:
             kwargs["timeout"] = self.timeout
-        return super().send(request, **kwargs)
\ No newline at end of file
+        remaining = remaining_time()
+        if remaining is not None and isinstance(kwargs["timeout"], (int, float)):
+            kwargs["timeout"] = max(min(kwargs["timeout"], remaining), 0.001)
+        return super().send(request, **kwargs)
@@ -1,20 +1,143 @@
 import os
 import json
+import time
+import datetime
+import uuid
 import config
+import metrics
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context, json as flask_json
 from dotenv import load_dotenv
 from marshmallow import ValidationError
-from stocks.stocks import get_stock_quote, calculate_percent_change, get_stock_name, insert_stock_tracker, get_tracked_stocks_details, get_tracked_stocks_news_details
-from database.database import Database
-from api.schema import StockDifferenceSchema, AddStocksSchema, TrackedStocksSchema, TrackedStocksNews
-from logger import configure_logger, get_logger_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from stocks.stocks import quote_cache, profile_cache, quote_history, finnhub_limiter, upstream_guards, get_stock_quote, get_stock_quotes, calculate_percent_change, get_tracked_stocks_details, get_tracked_stocks_news_details, get_tracked_stocks_page, get_tracked_stocks_news_page
+from database.database import get_pool_stats
+from database.queries import fetch_tracker_state, fetch_news_state
+from api.schema import StockDifferenceSchema, BatchStockDifferenceSchema, AddStocksSchema, TrackedStocksSchema, TrackedStocksNews, QuoteHistorySchema
+from api.resilience import request_deadline, set_request_deadline, reset_request_deadline
+from api.uploads import read_upload, UploadError
+from api.pagination import page_params, wants_stream, encode_cursor, ndjson_response, peek
+from api.http_cache import strong_etag, weak_etag, quote_window, http_date, is_not_modified, with_validators, not_modified, tracker_validators
+from api.ratelimit import request_priority, BACKFILL
+from api.profiler import profiler, save_profile
+from stocks.tracker import store_positions, STORED, SUPERSEDED, INVALID, FAILED
+from stocks.history import get_quote_history, history_source
+from stocks.stream import get_quote_stream_stats
+from stocks.scheduler import get_scheduler_status
+from stocks.fetcher import chunked, Deadline
+from logger import configure_logger, get_logger_with_context, get_log_stats, request_id
 
 load_dotenv()
 logger = configure_logger()
 
 api_bp = Blueprint("api_bp", __name__)
 
+
+@api_bp.before_request
+def start_request_deadline():
+    """
+    Upstream calls and their retries share the request's time budget
+    """
+    g.request_deadline = set_request_deadline(config.API_REQUEST_DEADLINE)
+
+
+@api_bp.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_id = request_id.set(new_request_id(request.headers))
+    if config.PROFILER_ENABLED:
+        profiler.start()
+
+
+@api_bp.after_request
+def default_cache_control(resp):
+    """
+    Responses without validators (stats, writes, errors) are never stored by proxies or clients
+    """
+    if "Cache-Control" not in resp.headers:
+        resp.cache_control.no_store = True
+    return resp
+
+
+@api_bp.after_request
+def add_request_id(resp):
+    resp.headers["X-Request-ID"] = request_id.get()
+    return resp
+
+
+@api_bp.after_request
+def observe_request_duration(resp):
+    start = g.get("request_start")
+    if start is not None:
+        metrics.http_request_duration.observe(time.perf_counter() - start, route=request_route(),
+                                              method=request.method, status=resp.status_code)
+    return resp
+
+
+@api_bp.teardown_request
+def clear_request_deadline(error=None):
+    token = g.pop("request_deadline", None)
+    if token is not None:
+        reset_request_deadline(token)
+    token = g.pop("request_id", None)
+    if token is not None:
+        request_id.reset(token)
+
+
+@api_bp.teardown_request
+def stop_request_profile(error=None):
+    """
+    Keep the sampled stacks of requests slower than PROFILER_SLOW_REQUEST
+    """
+    if not config.PROFILER_ENABLED:
+        return
+    stacks = profiler.stop()
+    start = g.get("request_start")
+    if stacks and start is not None:
+        duration = time.perf_counter() - start
+        if duration >= config.PROFILER_SLOW_REQUEST:
+            save_profile(stacks, request.method, request_route(), duration)
+
+
+def new_request_id(headers):
+    """
+    The caller's X-Request-ID when it looks like an ID, otherwise a new one, logged with every record of the request
+    """
+    incoming = headers.get("X-Request-ID", "")
+    if 0 < len(incoming) <= 64 and incoming.replace("-", "").replace("_", "").isalnum():
+        return incoming
+    return uuid.uuid4().hex
+
+
+def request_route():
+    """
+    The matched URL rule, so every symbol or page of a route shares one label
+    """
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def collect_metrics():
+    """
+    Copy stats the caches, pools and circuit breakers keep themselves into the metrics registry
+    """
+    for cache_name, stats in (("quote", quote_cache.stats()), ("profile", profile_cache.memory.stats())):
+        for result in ("hits", "misses", "coalesced", "stale_hits"):
+            metrics.cache_requests.set(stats[result], cache=cache_name, result=result)
+    for pool_name, stats in get_pool_stats().items():
+        for state in ("open", "in_use", "idle"):
+            metrics.db_pool_connections.set(stats[state], pool=pool_name, state=state)
+        metrics.db_pool_connections.set(stats["size"], pool=pool_name, state="max")
+        metrics.db_pool_wait_timeouts.set(stats["timeouts"], pool=pool_name)
+    for endpoint, guard in upstream_guards.items():
+        metrics.circuit_open.set(int(guard.breaker.stats()["state"] == "open"), endpoint=endpoint)
+    log_stats = get_log_stats()
+    if log_stats is not None:
+        metrics.log_records_dropped.set(log_stats["dropped"])
+
+
+metrics.register_collector(collect_metrics)
+
+
 @api_bp.route("/healthcheck")
 def healthcheck():
     logger = get_logger_with_context("")
@@ -22,6 +145,80 @@ def healthcheck():
     return jsonify({"status": "ok"}), 200
 
 
+@api_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    Request, Finnhub and SQL latency histograms, retry, 429 and cache counters and pool gauges in the Prometheus text format
+    """
+    return Response(metrics.render(), status=200, mimetype="text/plain; version=0.0.4")
+
+
+@api_bp.route("/database/pool", methods=["GET"])
+def database_pool_stats():
+    """
+    Show connection pool utilisation and wait time for each database
+    """
+    return jsonify({"status": "success", "data": get_pool_stats()}), 200
+
+
+@api_bp.route("/cache/quotes", methods=["GET"])
+def quote_cache_stats():
+    """
+    Show quote cache hit, miss and eviction counters
+    """
+    return jsonify({"status": "success", "data": quote_cache.stats()}), 200
+
+
+@api_bp.route("/cache/profiles", methods=["GET"])
+def profile_cache_stats():
+    """
+    Show company profile cache counters, including database hits and background refreshes
+    """
+    return jsonify({"status": "success", "data": profile_cache.stats()}), 200
+
+
+@api_bp.route("/history/quotes", methods=["GET"])
+def quote_history_stats():
+    """
+    Show how many fetched quotes were written to the quote history, buffered or dropped
+    """
+    return jsonify({"status": "success", "data": quote_history.stats()}), 200
+
+
+@api_bp.route("/ratelimit/finnhub", methods=["GET"])
+def finnhub_rate_limit_stats():
+    """
+    Show Finnhub calls per priority class, queue length and time spent waiting for a token
+    """
+    return jsonify({"status": "success", "data": finnhub_limiter.stats()}), 200
+
+
+@api_bp.route("/upstream/finnhub", methods=["GET"])
+def finnhub_upstream_stats():
+    """
+    Show circuit breaker state and hedged request win rate for each Finnhub endpoint
+    """
+    data = {endpoint: guard.stats() for endpoint, guard in upstream_guards.items()}
+    return jsonify({"status": "success", "data": data}), 200
+
+
+@api_bp.route("/stream/quotes", methods=["GET"])
+def quote_stream_stats():
+    """
+    Show streamed quote subscriptions, received and dropped frames and reconnects
+    """
+    return jsonify({"status": "success", "data": get_quote_stream_stats()}), 200
+
+
+@api_bp.route("/scheduler", methods=["GET"])
+def scheduler_status():
+    """
+    Show the market session, each scheduled job's next run and last run duration,
+    and the upcoming per-symbol polls of the tracking job
+    """
+    return jsonify({"status": "success", "data": get_scheduler_status()}), 200
+
+
 @api_bp.route("/stocks/difference", methods=["POST"])
 def check_stock_difference():
     """
@@ -47,7 +244,7 @@ def check_stock_difference():
                         "percent_difference": percent_difference}})
         resp.status_code = 200 
         logger = get_logger_with_context("")
-        logger.info("Check Stock Difference - status: 200 OK, Symbol: {symbol}, Percent Difference: {percent_difference}".format(symbol=symbol, percent_difference=percent_difference))
+        logger.info("Check Stock Difference - status: 200 OK, Symbol: %s, Percent Difference: %s", symbol, percent_difference)
         return resp
     except ValidationError as error:
         resp = jsonify({"error": error.messages}), 400
@@ -57,12 +254,77 @@ def check_stock_difference():
 
 
 
+@api_bp.route("/stocks/difference/batch", methods=["POST"])
+def check_stock_difference_batch():
+    """
+    POST request Body
+        {
+            "stocks": [
+                {"symbol": "F", "avg_purchase_cost": 5.00, "percent": 5},
+                {"symbol": "SNAP", "avg_purchase_cost": 10.00, "percent": 2}
+            ]
+        }
+    Streams one NDJSON line per entry in request order, with either percent_difference or error
+    """
+    # Also caps chunked bodies without Content-Length while they are read. Werkzeug ends those at the limit
+    # without an error, so the limit is one byte more and a body that reaches it is too large
+    request.max_content_length = config.BATCH_MAX_PAYLOAD_BYTES + 1
+    try:
+        if len(request.get_data()) > config.BATCH_MAX_PAYLOAD_BYTES:
+            raise RequestEntityTooLarge()
+    except RequestEntityTooLarge:
+        logger = get_logger_with_context("")
+        logger.info("Check Stock Difference Batch - error: 413 Payload Too Large")
+        return jsonify({"error": f"Request body is larger than {config.BATCH_MAX_PAYLOAD_BYTES} bytes"}), 413
+    try:
+        data = BatchStockDifferenceSchema().load(request.get_json())
+    except ValidationError as error:
+        logger = get_logger_with_context("")
+        logger.info("Check Stock Difference Batch - error: 400 Bad Request")
+        return jsonify({"error": error.messages}), 400
+
+    entries = [(stock["symbol"].upper(), float(stock["avg_purchase_cost"])) for stock in data["stocks"]]
+    symbols = list(dict.fromkeys(symbol for symbol, _ in entries))
+
+    def generate():
+        quotes = {}
+        deadline = Deadline(config.API_REQUEST_DEADLINE)
+        position = 0
+        for chunk in chunked(symbols, config.BATCH_CHUNK_SIZE):
+            for result in get_stock_quotes(chunk, timeout=deadline.remaining()):
+                quotes[result.key] = result
+            # Emit every entry whose quote is now known, keeping request order
+            while position < len(entries) and entries[position][0] in quotes:
+                symbol, avg_purchase_cost = entries[position]
+                yield json.dumps(difference_line(symbol, avg_purchase_cost, quotes[symbol])) + "\n"
+                position += 1
+
+        logger = get_logger_with_context("")
+        logger.info("Check Stock Difference Batch - status: 200 OK, Entries: %s, Symbols: %s", len(entries), len(symbols))
+
+    return Response(stream_with_context(generate()), status=200, mimetype="application/x-ndjson")
+
+
+def difference_line(symbol, avg_purchase_cost, result):
+    if result.error is not None:
+        return {"symbol": symbol, "error": f"Quote unavailable: {result.error}"}
+    if not result.value:
+        return {"symbol": symbol, "error": f"You entered an invalid stock symbol: {symbol}"}
+    try:
+        return {"symbol": symbol, "percent_difference": calculate_percent_change(result.value, avg_purchase_cost)}
+    except ZeroDivisionError:
+        return {"symbol": symbol, "error": "avg_purchase_cost must not be 0"}
+
+
 @api_bp.route("/stocks/track", methods=["GET"])
 def get_tracked_stocks(): 
     """
     Show me all the stocks im tracking, filter by params
     Params: symbol, detailed = True/False 
     If "detailed" = True, show percent difference and last modified date
+    Params for large portfolios:
+        limit, cursor: one page of stocks, continue with the next_cursor of the previous page
+        stream = True (or Accept: application/x-ndjson): one NDJSON line per stock, streamed from the database cursor
     """
     try:
         data = TrackedStocksSchema().load(request.args.to_dict())
@@ -71,17 +333,42 @@ def get_tracked_stocks():
         else:
             symbol = ""
         detailed = data["detailed"]
-        
-        tracked_stocks_list = get_tracked_stocks_details(detailed, symbol)
+        page = page_params(data)
+
+        etag, last_modified, max_age = tracked_stocks_validators(symbol, detailed)
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified, max_age)
+
+        if wants_stream(data, request):
+            def log_streamed(count):
+                logger = get_logger_with_context("")
+                logger.info("Get Tracked Stocks - status: 200 OK, Streamed Tracked Stocks: %s", count)
+            first, tracked_stocks = peek(get_tracked_stocks_details(detailed, symbol, stream=True))
+            if first is None:
+                logger = get_logger_with_context("")
+                logger.info("Get Tracked Stocks - error: 404 Not Found")
+                return jsonify({}), 404
+            resp = ndjson_response(tracked_stocks, log_streamed)
+            return with_validators(resp, etag, last_modified, max_age)
+
+        next_cursor = None
+        if page is not None:
+            tracked_stocks_list, next_after_id = get_tracked_stocks_page(detailed, page[0], page[1], symbol)
+            next_cursor = encode_cursor(next_after_id)
+        else:
+            tracked_stocks_list = get_tracked_stocks_details(detailed, symbol)
         if not tracked_stocks_list:
             logger = get_logger_with_context("")
             logger.info("Get Tracked Stocks - error: 404 Not Found")
             return jsonify({}), 404
 
-        resp = jsonify({"status": "success", "data": tracked_stocks_list})
+        body = {"status": "success", "data": tracked_stocks_list}
+        if page is not None:
+            body["next_cursor"] = next_cursor
+        resp = with_validators(jsonify(body), etag, last_modified, max_age)
         resp.status_code = 200 
         logger = get_logger_with_context("")
-        logger.info("Get Tracked Stocks - status: 200 OK, Tracked Stocks: {tracked_stocks_list}".format(tracked_stocks_list=tracked_stocks_list))
+        logger.info("Get Tracked Stocks - status: 200 OK, Tracked Stocks: %s", len(tracked_stocks_list))
         return resp
     except ValidationError as error:
         resp = jsonify({"error": error.messages}), 400
@@ -95,6 +382,7 @@ def get_tracked_stocks_news():
     """
     Show me all the news articles for stocks im tracking, filter by params
     Params: symbol, start, end 
+    Pages (limit, cursor) and streaming (stream) work as in /stocks/track, a page holds news for limit stocks
     """
     try:
         data = TrackedStocksNews().load(request.args.to_dict())
@@ -105,17 +393,42 @@ def get_tracked_stocks_news():
         start = data["start"]
         end = data["end"]
         detailed = data["detailed"]
+        page = page_params(data)
+
+        etag, last_modified, max_age = tracked_stocks_news_validators(symbol, start, end)
+        if is_not_modified(etag, last_modified):
+            return not_modified(etag, last_modified, max_age)
+
+        if wants_stream(data, request):
+            def log_streamed(count):
+                logger = get_logger_with_context("")
+                logger.info("Get Tracked Stocks News - status: 200 OK, Streamed Tracked Stocks: %s", count)
+            first, tracked_stocks_news = peek(get_tracked_stocks_news_details(detailed, start, end, symbol, stream=True))
+            if first is None:
+                logger = get_logger_with_context("")
+                logger.info("Get Tracked Stocks News - error: 404 Not Found")
+                return jsonify({}), 404
+            resp = ndjson_response(tracked_stocks_news, log_streamed)
+            return with_validators(resp, etag, last_modified, max_age)
 
-        tracked_stocks_news_list = get_tracked_stocks_news_details(detailed, start, end, symbol)
+        next_cursor = None
+        if page is not None:
+            tracked_stocks_news_list, next_after_id = get_tracked_stocks_news_page(detailed, start, end, page[0], page[1], symbol)
+            next_cursor = encode_cursor(next_after_id)
+        else:
+            tracked_stocks_news_list = get_tracked_stocks_news_details(detailed, start, end, symbol)
         if not tracked_stocks_news_list:
             logger = get_logger_with_context("")
             logger.info("Get Tracked Stocks News - error: 404 Not Found")
             return jsonify({}), 404
 
-        resp = jsonify({"status": "success", "data": tracked_stocks_news_list})
+        body = {"status": "success", "data": tracked_stocks_news_list}
+        if page is not None:
+            body["next_cursor"] = next_cursor
+        resp = with_validators(jsonify(body), etag, last_modified, max_age)
         resp.status_code = 200 
         logger = get_logger_with_context("")
-        logger.info("Get Tracked Stocks News- status: 200 OK, Tracked Stocks News:") 
+        logger.info("Get Tracked Stocks News- status: 200 OK, Tracked Stocks News: %s", len(tracked_stocks_news_list))
         return resp
 
     except ValidationError as error:
@@ -126,6 +439,75 @@ def get_tracked_stocks_news():
 
 
     
+def tracked_stocks_validators(symbol, detailed):
+    return tracker_validators(fetch_tracker_state(symbol), detailed)
+
+
+def tracked_stocks_news_validators(symbol, start, end):
+    """
+    (ETag, Last-Modified, max-age) from the tracker state and stored news coverage
+    Today's news is refetched on every load, so ranges that include today also follow the quote window
+    """
+    tracker_state = fetch_tracker_state(symbol)
+    news_state = fetch_news_state(start, end, symbol)
+    state = [tracker_state, news_state]
+    last_modified = [http_date(tracker_state["last_modified"]), http_date(news_state["fetched_at"])]
+    if end < datetime.date.today():
+        return strong_etag(*state), max(filter(None, last_modified), default=None), None
+
+    window_start, window_end = quote_window()
+    state.append(window_start)
+    last_modified.append(http_date(window_start))
+    return weak_etag(*state), max(filter(None, last_modified)), window_end - time.time()
+
+
+@api_bp.route("/stocks/history", methods=["GET"])
+def get_stock_history():
+    """
+    OHLC buckets of recorded quotes for a symbol
+    Params: symbol, start, end (ISO 8601, UTC unless an offset is given, default now), resolution (1m, 5m, 1h, 1d, default 5m)
+    """
+    logger = get_logger_with_context("")
+    try:
+        data = QuoteHistorySchema().load(request.args.to_dict())
+    except ValidationError as error:
+        logger.info("Get Stock History - error: 400 Bad Request")
+        return jsonify({"error": error.messages}), 400
+
+    symbol = data["symbol"].upper()
+    start = int(utc_datetime(data["start"]).timestamp())
+    end = int(utc_datetime(data["end"]).timestamp()) if "end" in data else int(time.time())
+    resolution = config.QUOTE_HISTORY_RESOLUTIONS[data.get("resolution", "5m")]
+    if end <= start:
+        logger.info("Get Stock History - error: 400 Bad Request")
+        return jsonify({"error": "end must be after start"}), 400
+    if (end - start) // resolution > config.QUOTE_HISTORY_MAX_BUCKETS:
+        logger.info("Get Stock History - error: 400 Bad Request")
+        return jsonify({"error": f"Range spans more than {config.QUOTE_HISTORY_MAX_BUCKETS} buckets, use a coarser resolution"}), 400
+
+    # Buckets past the rollup lookback no longer change, so they can be cached for long
+    settled_at = end + config.QUOTE_ROLLUP_LOOKBACK + config.QUOTE_ROLLUP_INTERVAL
+    if settled_at <= time.time():
+        etag = strong_etag(history_source(start, resolution))
+        last_modified, max_age = http_date(settled_at), config.HTTP_HISTORY_MAX_AGE
+    else:
+        window_start, window_end = quote_window()
+        etag, last_modified, max_age = weak_etag(window_start), http_date(window_start), window_end - time.time()
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified, max_age)
+
+    resolution, buckets = get_quote_history(symbol, start, end, resolution)
+    logger.info("Get Stock History - status: 200 OK, Symbol: %s, Buckets: %s", symbol, len(buckets))
+    resp = jsonify({"status": "success", "data": {"symbol": symbol, "resolution": resolution, "buckets": buckets}})
+    return with_validators(resp, etag, last_modified, max_age), 200
+
+
+def utc_datetime(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value
+
+
 @api_bp.route("/stocks/tracker", methods=["POST"])
 def store_new_stock():
     """
@@ -148,31 +530,80 @@ def store_new_stock():
                 }
             ]
         }
-    Save values to database
+    Save values to database in one transaction, nothing is saved when any symbol is invalid
     """
     try:
         stock_list = AddStocksSchema().load(request.get_json())
-        for stock in stock_list["stocks"]:
-            symbol = stock["symbol"].upper()
-            avg_purchase_cost = float(stock["avg_purchase_cost"])
-            percent = stock["percent"]  
-            increase = 1 if stock["increase"] else 0
-            decrease = 1 if stock["decrease"] else 0
-
-            name = get_stock_name(symbol)
-            if not name:
-                return jsonify({"error": f"You entered an invalid stock symbol: {symbol}"}), 404
-            
-            with Database(config.DATABASE) as db:
-                db.execute("INSERT IGNORE INTO stock (symbol,name) VALUES (%s, %s)",(symbol, name))
-                db.execute("SELECT id FROM stock WHERE symbol=%s AND name=%s", [symbol, name,])
-                stock_id = db.fetchone()
-            insert_stock_tracker(stock_id.get("id"), avg_purchase_cost, percent, increase, decrease)
-                        
+        outcomes, _ = store_positions(stock_list["stocks"], all_or_nothing=True)
+        for outcome in outcomes:
+            if outcome["status"] == INVALID:
+                return jsonify({"error": outcome["error"]}), 404
+            if outcome["status"] == FAILED:
+                return jsonify({"error": outcome["error"]}), 503
+
         resp = jsonify({"status": "success"})
         resp.status_code = 200
         return resp
     except ValidationError as error:
         resp = jsonify({"error": error.messages}), 400
         return resp
-    
\ No newline at end of file
+    
+
+
+@api_bp.route("/stocks/tracker/bulk", methods=["POST"])
+def store_new_stocks_bulk():
+    """
+    Portfolio import, streamed as CSV (text/csv), NDJSON (application/x-ndjson) or the JSON body of /stocks/tracker
+        symbol,avg_purchase_cost,percent,increase,decrease
+        SNAP,1,5,true,true
+        TWTR,1,2,false,false
+    Rows are stored BULK_CHUNK_SIZE at a time as they are parsed, one transaction per chunk, and the response
+    reporting an outcome for every row is streamed as they are stored
+    A symbol listed twice within a chunk keeps its last position, across chunks the later row replaces the earlier one
+    An upload that turns out invalid after its first rows keeps the chunks stored so far and reports the error
+    """
+    logger = get_logger_with_context("")
+    try:
+        # The first row is parsed before the response starts, so an unreadable upload is still a 400
+        _, rows = peek(read_upload(request))
+    except UploadError as error:
+        logger.info("Store Stocks Bulk - error: 400 Bad Request")
+        return jsonify({"error": str(error)}), 400
+
+    def generate():
+        summary = {status: 0 for status in (STORED, SUPERSEDED, INVALID, FAILED)}
+        total = new_stocks = 0
+        body = {}
+        yield '{"rows": ['
+        try:
+            # Unknown symbols are looked up upstream, which can take longer than a regular request,
+            # and at backfill priority so an import does not use up the tokens kept for interactive calls
+            with request_deadline(config.BULK_REQUEST_DEADLINE), request_priority(BACKFILL):
+                for chunk in chunked(rows, config.BULK_CHUNK_SIZE):
+                    positions = [position for _, position, errors in chunk if errors is None]
+                    outcomes, chunk_new_stocks = store_positions(positions) if positions else ([], 0)
+                    new_stocks += chunk_new_stocks
+                    outcomes = iter(outcomes)
+                    lines = []
+                    for line_number, _, errors in chunk:
+                        if errors is not None:
+                            row = {"row": line_number, "status": INVALID, "error": errors}
+                        else:
+                            row = dict({"row": line_number}, **next(outcomes))
+                        summary[row["status"]] += 1
+                        lines.append(("," if total else "") + flask_json.dumps(row))
+                        total += 1
+                    yield "".join(lines)
+        except UploadError as error:
+            body["error"] = str(error)
+        body["summary"] = dict(summary, total=total, new_stocks=new_stocks)
+        yield "], " + flask_json.dumps(body)[1:]
+
+        logger = get_logger_with_context("")
+        if "error" in body:
+            logger.info("Store Stocks Bulk - error: %s after %s rows, Stored: %s", body["error"], total, summary[STORED])
+        else:
+            logger.info("Store Stocks Bulk - status: 200 OK, Rows: %s, Stored: %s, New Stocks: %s",
+                        total, summary[STORED], new_stocks)
+
+    return Response(stream_with_context(generate()), status=200, mimetype="application/json")
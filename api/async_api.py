@@ -0,0 +1,202 @@
+import json
+import time
+import config
+import metrics
+
+from marshmallow import ValidationError
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from quart import Blueprint, Response, request, jsonify, g, json as quart_json
+from database.queries import stream_tracked_stocks_async, fetch_tracker_state_async
+from api.schema import StockDifferenceSchema, BatchStockDifferenceSchema, TrackedStocksSchema
+from api.resilience import request_deadline
+from api.pagination import NDJSON, page_params, wants_stream, encode_cursor, apeek
+from api.http_cache import is_not_modified, with_validators, tracker_validators
+from api.api import difference_line, new_request_id
+from stocks.stocks import calculate_percent_change
+from stocks.async_stocks import (get_stock_quote_async, get_stock_quotes_async, get_tracked_stocks_details_async,
+                                 get_tracked_stocks_page_async, generate_tracked_stocks_response_async)
+from stocks.fetcher import chunked, Deadline
+from logger import get_logger_with_context, request_id
+
+async_api_bp = Blueprint("async_api_bp", __name__)
+
+
+@async_api_bp.route("/healthcheck")
+async def healthcheck():
+    logger = get_logger_with_context("")
+    logger.info("Health check status: OK")
+    return jsonify({"status": "ok"}), 200
+
+
+@async_api_bp.route("/stocks/difference", methods=["POST"])
+async def check_stock_difference():
+    """
+    Same as /stocks/difference in api_bp, the quote is awaited on the event loop
+    """
+    try:
+        data = StockDifferenceSchema().load(await request.get_json())
+    except ValidationError as error:
+        logger = get_logger_with_context("")
+        logger.info("Check Stock Difference - error: 400 Bad Request")
+        return jsonify({"error": error.messages}), 400
+
+    symbol = data["symbol"].upper()
+    avg_purchase_cost = float(data["avg_purchase_cost"])
+    with request_deadline(config.API_REQUEST_DEADLINE):
+        response = await get_stock_quote_async(symbol)
+    if not response:
+        return jsonify({"error": f"You entered an invalid stock symbol: {symbol}"}), 404
+    percent_difference = calculate_percent_change(response, avg_purchase_cost)
+
+    logger = get_logger_with_context("")
+    logger.info("Check Stock Difference - status: 200 OK, Symbol: %s, Percent Difference: %s", symbol, percent_difference)
+    return jsonify({"status": "success", "data": {"symbol": symbol, "percent_difference": percent_difference}}), 200
+
+
+async def read_json(max_bytes):
+    """
+    The request's JSON like get_json, counting the body as it arrives so a chunked body without
+    Content-Length is cut off once it passes max_bytes. Raises RequestEntityTooLarge
+    """
+    if request.content_length is not None and request.content_length > max_bytes:
+        raise RequestEntityTooLarge()
+    body = bytearray()
+    async for data in request.body:
+        body.extend(data)
+        if len(body) > max_bytes:
+            raise RequestEntityTooLarge()
+    if not request.is_json:
+        return None
+    try:
+        return quart_json.loads(body)
+    except ValueError:
+        raise BadRequest("Failed to decode JSON object")
+
+
+@async_api_bp.route("/stocks/difference/batch", methods=["POST"])
+async def check_stock_difference_batch():
+    """
+    Same as /stocks/difference/batch in api_bp, every quote in a chunk is fetched concurrently on the event loop
+    """
+    try:
+        payload = await read_json(config.BATCH_MAX_PAYLOAD_BYTES)
+    except RequestEntityTooLarge:
+        logger = get_logger_with_context("")
+        logger.info("Check Stock Difference Batch - error: 413 Payload Too Large")
+        return jsonify({"error": f"Request body is larger than {config.BATCH_MAX_PAYLOAD_BYTES} bytes"}), 413
+    try:
+        data = BatchStockDifferenceSchema().load(payload)
+    except ValidationError as error:
+        logger = get_logger_with_context("")
+        logger.info("Check Stock Difference Batch - error: 400 Bad Request")
+        return jsonify({"error": error.messages}), 400
+
+    entries = [(stock["symbol"].upper(), float(stock["avg_purchase_cost"])) for stock in data["stocks"]]
+    symbols = list(dict.fromkeys(symbol for symbol, _ in entries))
+
+    async def generate():
+        quotes = {}
+        deadline = Deadline(config.API_REQUEST_DEADLINE)
+        position = 0
+        with request_deadline(config.API_REQUEST_DEADLINE):
+            for chunk in chunked(symbols, config.BATCH_CHUNK_SIZE):
+                for result in await get_stock_quotes_async(chunk, timeout=deadline.remaining()):
+                    quotes[result.key] = result
+                while position < len(entries) and entries[position][0] in quotes:
+                    symbol, avg_purchase_cost = entries[position]
+                    yield (json.dumps(difference_line(symbol, avg_purchase_cost, quotes[symbol])) + "\n").encode()
+                    position += 1
+
+        logger = get_logger_with_context("")
+        logger.info("Check Stock Difference Batch - status: 200 OK, Entries: %s, Symbols: %s", len(entries), len(symbols))
+
+    return Response(generate(), status=200, mimetype=NDJSON)
+
+
+@async_api_bp.route("/stocks/track", methods=["GET"])
+async def get_tracked_stocks():
+    """
+    Same params and responses as /stocks/track in api_bp
+    """
+    try:
+        data = TrackedStocksSchema().load(request.args.to_dict())
+        page = page_params(data)
+    except ValidationError as error:
+        logger = get_logger_with_context("")
+        logger.info("Check Stock Difference - error: 400 Bad Request")
+        return jsonify({"error": error.messages}), 400
+    symbol = data["symbol"].upper() if "symbol" in data else ""
+    detailed = data["detailed"]
+
+    etag, last_modified, max_age = await tracked_stocks_validators(symbol, detailed)
+    if is_not_modified(etag, last_modified, req=request):
+        return with_validators(Response("", status=304), etag, last_modified, max_age)
+
+    if wants_stream(data, request):
+        # The first row is read before the response starts, so an untracked symbol is a 404 as without streaming
+        first, tracked_stocks = await apeek(stream_tracked_stocks_async(symbol))
+        if first is None:
+            logger = get_logger_with_context("")
+            logger.info("Get Tracked Stocks - error: 404 Not Found")
+            return jsonify({}), 404
+
+        async def generate():
+            count = 0
+            try:
+                with request_deadline(config.API_REQUEST_DEADLINE):
+                    async for stock in generate_tracked_stocks_response_async(tracked_stocks, detailed):
+                        count += 1
+                        yield (quart_json.dumps(stock) + "\n").encode()
+            finally:
+                await tracked_stocks.aclose()
+            logger = get_logger_with_context("")
+            logger.info("Get Tracked Stocks - status: 200 OK, Streamed Tracked Stocks: %s", count)
+        return with_validators(Response(generate(), status=200, mimetype=NDJSON), etag, last_modified, max_age)
+
+    next_cursor = None
+    with request_deadline(config.API_REQUEST_DEADLINE):
+        if page is not None:
+            tracked_stocks_list, next_after_id = await get_tracked_stocks_page_async(detailed, page[0], page[1], symbol)
+            next_cursor = encode_cursor(next_after_id)
+        else:
+            tracked_stocks_list = await get_tracked_stocks_details_async(detailed, symbol)
+    if not tracked_stocks_list:
+        logger = get_logger_with_context("")
+        logger.info("Get Tracked Stocks - error: 404 Not Found")
+        return jsonify({}), 404
+
+    body = {"status": "success", "data": tracked_stocks_list}
+    if page is not None:
+        body["next_cursor"] = next_cursor
+    logger = get_logger_with_context("")
+    logger.info("Get Tracked Stocks - status: 200 OK, Tracked Stocks: %s", len(tracked_stocks_list))
+    return with_validators(jsonify(body), etag, last_modified, max_age), 200
+
+
+async def tracked_stocks_validators(symbol, detailed):
+    return tracker_validators(await fetch_tracker_state_async(symbol), detailed, req=request)
+
+
+@async_api_bp.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Each request runs in its own task, so the request ID does not leak into other requests
+    request_id.set(new_request_id(request.headers))
+
+
+@async_api_bp.after_request
+async def default_cache_control(resp):
+    if "Cache-Control" not in resp.headers:
+        resp.cache_control.no_store = True
+    resp.headers["X-Request-ID"] = request_id.get()
+    return resp
+
+
+@async_api_bp.after_request
+async def observe_request_duration(resp):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.http_request_duration.observe(time.perf_counter() - start, route=route,
+                                              method=request.method, status=resp.status_code)
+    return resp
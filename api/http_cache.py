@@ -0,0 +1,99 @@
+import datetime
+import hashlib
+import json
+import time
+import config
+
+from flask import request, Response
+from stocks.market import market_session
+
+
+def strong_etag(*parts, req=None):
+    """
+    Strong validator for the representation described by parts
+    The request's query string and Accept header are included, since they select the representation
+    req defaults to the current Flask request
+    """
+    req = request if req is None else req
+    key = [req.path, sorted(req.args.items(multi=True)), req.accept_mimetypes.best] + list(parts)
+    return hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()[:32]
+
+
+def weak_etag(*parts, req=None):
+    """
+    Weak validator, for representations that include quotes: parts only name the quote window,
+    not the prices served in it, so two responses with one ETag are equivalent but not byte for byte equal
+    """
+    return "W/" + strong_etag(*parts, req=req)
+
+
+def split_etag(etag):
+    """
+    (opaque tag, whether it is weak)
+    """
+    if etag.startswith("W/"):
+        return etag[2:], True
+    return etag, False
+
+
+def quote_window(now=None):
+    """
+    (window start, window end) of the current quote freshness window
+    Quotes are treated as changing once per window, whose length depends on the market session
+    """
+    now = now or time.time()
+    length = config.HTTP_QUOTE_WINDOWS[market_session()]
+    start = int(now // length * length)
+    return start, start + length
+
+
+def http_date(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(int(timestamp), datetime.timezone.utc)
+
+
+def is_not_modified(etag, last_modified=None, req=None):
+    """
+    Whether the client's copy is current, checked before the payload is built
+    If-None-Match takes precedence over If-Modified-Since, as RFC 9110 requires
+    """
+    req = request if req is None else req
+    if req.if_none_match:
+        return req.if_none_match.contains_weak(split_etag(etag)[0])
+    if req.if_modified_since is not None and last_modified is not None:
+        return last_modified <= req.if_modified_since
+    return False
+
+
+def with_validators(resp, etag, last_modified=None, max_age=None):
+    """
+    Attach ETag, Last-Modified and a private Cache-Control, max_age None means clients revalidate every time
+    """
+    resp.set_etag(*split_etag(etag))
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    # Only the client may store responses, shared caches on the way must not
+    resp.cache_control.private = True
+    if max_age is None:
+        resp.cache_control.no_cache = True
+    else:
+        resp.cache_control.max_age = max(int(max_age), 0)
+    return resp
+
+
+def not_modified(etag, last_modified=None, max_age=None):
+    return with_validators(Response(status=304), etag, last_modified, max_age)
+
+
+def tracker_validators(tracker_state, detailed, req=None):
+    """
+    (ETag, Last-Modified, max-age) from the tracker state, plus the quote window when percent differences are included
+    """
+    last_modified = http_date(tracker_state["last_modified"])
+    if not detailed:
+        return strong_etag(tracker_state, req=req), last_modified, None
+
+    window_start, window_end = quote_window()
+    last_modified = max(filter(None, [last_modified, http_date(window_start)]))
+    return weak_etag(tracker_state, window_start, req=req), last_modified, window_end - time.time()
@@ -0,0 +1,98 @@
+import base64
+import itertools
+import json
+import config
+
+from flask import Response, stream_with_context, json as flask_json
+from marshmallow import ValidationError
+
+NDJSON = "application/x-ndjson"
+
+
+def encode_cursor(after_id):
+    """
+    Opaque cursor for the row to continue after
+    """
+    if after_id is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps({"after": after_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        after_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["after"]
+    except (ValueError, TypeError, KeyError):
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+    if not isinstance(after_id, int) or after_id < 0:
+        raise ValidationError({"cursor": ["Invalid cursor."]})
+    return after_id
+
+
+def page_params(data):
+    """
+    (after id, limit) when the request asks for a page, None for the whole result
+    """
+    if "limit" not in data and "cursor" not in data:
+        return None
+    return decode_cursor(data.get("cursor")), data.get("limit", config.PAGE_DEFAULT_LIMIT)
+
+
+def wants_stream(data, request):
+    return data.get("stream", False) or request.accept_mimetypes.best == NDJSON
+
+
+def peek(items):
+    """
+    (first item, iterator over every item including the first), first is None when there are no items
+    Lets a streamed response be answered with a 404 before its status is sent
+    """
+    iterator = iter(items)
+    first = next(iterator, None)
+    if first is None:
+        return None, iterator
+    return first, itertools.chain([first], iterator)
+
+
+async def apeek(items):
+    """
+    peek for an async generator, the generator is closed when it has no items
+    Close the returned iterator once the response is done with it, so an unfinished cursor is released
+    """
+    first = await anext(items, None)
+    if first is None:
+        await items.aclose()
+        return None, None
+
+    async def chained():
+        try:
+            yield first
+            async for item in items:
+                yield item
+        finally:
+            await items.aclose()
+    return first, chained()
+
+
+def ndjson_response(items, on_complete=None):
+    """
+    Stream items as one JSON line each, flushed in chunks so no more than a chunk is buffered
+    on_complete(count) runs once the last line has been produced
+    """
+    def generate():
+        lines = []
+        count = 0
+        for item in items:
+            # Flask's encoder, so dates read the same as in jsonify responses
+            lines.append(flask_json.dumps(item) + "\n")
+            count += 1
+            if len(lines) >= config.STREAM_RESPONSE_CHUNK_LINES:
+                yield "".join(lines)
+                lines = []
+        if lines:
+            yield "".join(lines)
+        if on_complete is not None:
+            on_complete(count)
+
+    return Response(stream_with_context(generate()), status=200, mimetype=NDJSON)
@@ -0,0 +1,117 @@
+import contextvars
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+import config
+
+from collections import Counter
+from metrics import slow_requests_profiled
+from logger import get_logger_with_context
+
+# Stacks of the request being profiled, copied into fetch_all's worker threads with the rest of the context
+profiled_stacks = contextvars.ContextVar("profiled_stacks", default=None)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of threads serving requests from one background thread, every interval seconds
+    A request's samples are kept as folded stacks ("module:function;module:function count"),
+    the input format of flamegraph.pl and speedscope
+    Pool threads running work for a profiled request through follow() are sampled into the request's stacks
+    """
+    def __init__(self, interval=config.PROFILER_INTERVAL, max_depth=config.PROFILER_MAX_DEPTH):
+        self.interval = interval
+        self.max_depth = max_depth
+
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start sampling the calling thread
+        """
+        stacks = Counter()
+        profiled_stacks.set(stacks)
+        with self._lock:
+            self._active[threading.get_ident()] = stacks
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        """
+        Stop sampling the calling thread, returns its folded stacks or None when it was not being sampled
+        """
+        profiled_stacks.set(None)
+        with self._lock:
+            return self._active.pop(threading.get_ident(), None)
+
+    def follow(self, fn, *args):
+        """
+        Call fn(*args), sampling the calling thread into the stacks of the profiled request whose context it runs in
+        """
+        stacks = profiled_stacks.get()
+        if stacks is None:
+            return fn(*args)
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = stacks
+        self._wake.set()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._active.pop(ident, None)
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+            self._wake.wait()
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        with self._lock:
+            active = dict(self._active)
+        frames = sys._current_frames()
+        for ident, stacks in active.items():
+            frame = frames.get(ident)
+            if frame is not None:
+                stacks[self.fold(frame)] += 1
+
+    def fold(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            names.append("{}:{}".format(frame.f_globals.get("__name__", "?"), frame.f_code.co_name))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+def save_profile(stacks, method, route, duration, path=config.PROFILER_OUTPUT_PATH):
+    """
+    Write folded stacks to a file named after the time and route, returns its path
+    """
+    os.makedirs(path, exist_ok=True)
+    name = "{}-{}-{}.folded".format(datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f"), method,
+                                    re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_"))
+    file_path = os.path.join(path, name)
+    with open(file_path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write("{} {}\n".format(stack, count))
+
+    slow_requests_profiled.inc(route=route)
+    logger = get_logger_with_context("profiler")
+    logger.warning("Slow request %s %s took %sms, %s stack samples saved to %s",
+                   method, route, round(duration * 1000), sum(stacks.values()), file_path)
+    return file_path
+
+
+profiler = SamplingProfiler()
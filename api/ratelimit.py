@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+import config
+
+from contextlib import contextmanager
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Priority classes, lower values are served first
+INTERACTIVE = 0
+CRON = 1
+BACKFILL = 2
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", CRON: "cron", BACKFILL: "backfill"}
+
+_request_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority):
+    """
+    Run upstream calls made inside the block at the given priority class
+    """
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def current_priority():
+    return _request_priority.get()
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class LocalTokenStore:
+    """
+    In-process token buckets, used by a single worker and for testing
+    """
+    blocking = False
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, reserve):
+        """
+        Take one token while leaving at least reserve tokens in the bucket
+        Returns 0 on success, otherwise the seconds until a token is expected
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0
+            if tokens - 1 >= reserve:
+                tokens -= 1
+            else:
+                wait = (reserve + 1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+        return wait
+
+
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local wait = 0
+if tokens - 1 >= reserve then
+    tokens = tokens - 1
+else
+    wait = (reserve + 1 - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "updated", now)
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisTokenStore:
+    """
+    Token buckets kept in Redis so every worker process shares one quota
+    """
+    blocking = True
+
+    def __init__(self, url, prefix="ratelimit:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a shared rate limit store")
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(TAKE_TOKEN_SCRIPT)
+        self._prefix = prefix
+
+    def take(self, key, rate, capacity, reserve):
+        return float(self._script(keys=[self._prefix + key], args=[rate, capacity, reserve]))
+
+
+class RateLimiter:
+    """
+    Token bucket limiter that queues callers before the upstream quota is hit
+    Waiting callers in this process are served in priority order, and lower priority
+    classes leave a reserve of tokens so interactive requests from other processes still get through
+    """
+    def __init__(self, key, calls_per_minute, burst, reserves, store, timeout):
+        self.key = key
+        self.rate = calls_per_minute / 60
+        self.capacity = burst
+        self.reserves = reserves
+        self.store = store
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+
+        self._acquired = {name: 0 for name in PRIORITY_NAMES.values()}
+        self._waited = 0
+        self._total_wait = 0.0
+        self._rejected = 0
+
+    def acquire(self, priority=None, timeout=None):
+        priority = current_priority() if priority is None else priority
+        timeout = self.timeout if timeout is None else timeout
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        reserve = self.reserves.get(name, 0) * self.capacity
+        start = time.monotonic()
+        ticket = (priority, next(self._sequence))
+
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            self._cond.notify_all()
+        try:
+            while True:
+                with self._cond:
+                    while self._waiters[0] != ticket:
+                        self._cond.wait(self._remaining(start, timeout))
+                # The store may be a Redis round trip, taken without the condition so other callers can queue meanwhile
+                wait = self.store.take(self.key, self.rate, self.capacity, reserve)
+                if wait == 0:
+                    break
+                with self._cond:
+                    # Woken early by callers queueing, which may now be ahead of this one
+                    self._cond.wait(min(wait, self._remaining(start, timeout)))
+        finally:
+            with self._cond:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._acquired[name] = self._acquired.get(name, 0) + 1
+            if waited > 0.001:
+                self._waited += 1
+                self._total_wait += waited
+
+    def _remaining(self, start, timeout):
+        """
+        Seconds left to wait, raises RateLimitExceeded once there are none, called with the condition held
+        """
+        remaining = start + timeout - time.monotonic()
+        if remaining <= 0:
+            self._rejected += 1
+            raise RateLimitExceeded(f"No {self.key} rate limit token within {timeout}s")
+        return remaining
+
+    def resize(self, calls_per_minute, burst):
+        """
+        Change the quota, tokens above the new burst are dropped on the next take
+        """
+        with self._cond:
+            self.rate = calls_per_minute / 60
+            self.capacity = burst
+            self._cond.notify_all()
+
+    async def acquire_async(self, priority=None, timeout=None):
+        """
+        Same bucket for coroutines, which sleep on the event loop instead of holding a thread
+        Coroutines are not queued behind waiting threads, but still leave their priority's reserve
+        A store that makes network calls is called from a worker thread, so the event loop never waits on Redis
+        """
+        priority = current_priority() if priority is None else priority
+        timeout = self.timeout if timeout is None else timeout
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        reserve = self.reserves.get(name, 0) * self.capacity
+        start = time.monotonic()
+
+        while True:
+            if self.store.blocking:
+                wait = await asyncio.to_thread(self.store.take, self.key, self.rate, self.capacity, reserve)
+            else:
+                wait = self.store.take(self.key, self.rate, self.capacity, reserve)
+            if wait == 0:
+                break
+            with self._cond:
+                remaining = self._remaining(start, timeout)
+            await asyncio.sleep(min(wait, remaining))
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._acquired[name] = self._acquired.get(name, 0) + 1
+            if waited > 0.001:
+                self._waited += 1
+                self._total_wait += waited
+
+    def stats(self):
+        with self._cond:
+            return {
+                "calls_per_minute": self.rate * 60,
+                "burst": self.capacity,
+                "queued": len(self._waiters),
+                "acquired": dict(self._acquired),
+                "waited": self._waited,
+                "avg_wait_ms": round(self._total_wait / self._waited * 1000, 3) if self._waited else 0,
+                "rejected": self._rejected,
+            }
+
+
+def create_finnhub_limiter():
+    store = RedisTokenStore(config.RATE_LIMIT_URL) if config.RATE_LIMIT_URL else LocalTokenStore()
+    return RateLimiter("finnhub", config.FINNHUB_CALLS_PER_MINUTE, config.FINNHUB_BURST,
+                       config.FINNHUB_PRIORITY_RESERVES, store, config.FINNHUB_RATE_LIMIT_TIMEOUT)
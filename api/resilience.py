@@ -0,0 +1,299 @@
+import asyncio
+import contextvars
+import threading
+import time
+import config
+
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+_request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds):
+    """
+    Bound the time upstream calls and their retries may take inside the block
+    """
+    token = _request_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def set_request_deadline(seconds):
+    return _request_deadline.set(time.monotonic() + seconds)
+
+
+def reset_request_deadline(token):
+    _request_deadline.reset(token)
+
+
+def remaining_time():
+    """
+    Seconds left before the current request deadline, None when there is no deadline
+    """
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fail fast after consecutive upstream failures, then let a single trial call through
+    once the recovery timeout has passed
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold, recovery_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+        self._opened = 0
+        self._rejected = 0
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """
+        The call never reached upstream, let the next caller make the trial instead
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._opened,
+                "rejected": self._rejected,
+            }
+
+
+class LatencyWindow:
+    """
+    Recent call latencies, used to pick the hedging delay
+    """
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(int(len(samples) * percent / 100), len(samples) - 1)]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=config.HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+
+
+class UpstreamGuard:
+    """
+    Circuit breaker and optional hedged requests around one upstream endpoint
+    Errors listed in ignored are raised without counting against the breaker
+    """
+    def __init__(self, name, hedge=False, ignored=()):
+        self.name = name
+        self.hedge = hedge
+        self.ignored = ignored
+        self.breaker = CircuitBreaker(name, config.BREAKER_FAILURE_THRESHOLD, config.BREAKER_RECOVERY_TIMEOUT)
+        self.latencies = LatencyWindow(config.HEDGE_LATENCY_WINDOW)
+
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._failures = 0
+        self._hedges_sent = 0
+        self._hedge_wins = 0
+
+    def call(self, fn):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+
+        start = time.monotonic()
+        try:
+            result = self._hedged_call(fn) if self.hedge else fn()
+        except self.ignored:
+            self.breaker.release_trial()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            with self._lock:
+                self._calls += 1
+                self._failures += 1
+            raise
+
+        self.breaker.record_success()
+        self.latencies.add(time.monotonic() - start)
+        with self._lock:
+            self._calls += 1
+        return result
+
+    async def call_async(self, fn):
+        """
+        call for coroutine functions, hedging with a second task instead of a second thread
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+
+        start = time.monotonic()
+        try:
+            result = await (self._hedged_call_async(fn) if self.hedge else fn())
+        except self.ignored:
+            self.breaker.release_trial()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            with self._lock:
+                self._calls += 1
+                self._failures += 1
+            raise
+
+        self.breaker.record_success()
+        self.latencies.add(time.monotonic() - start)
+        with self._lock:
+            self._calls += 1
+        return result
+
+    async def _hedged_call_async(self, fn):
+        delay = self.hedge_delay()
+        if delay is None:
+            return await fn()
+
+        primary = asyncio.ensure_future(fn())
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        backup = asyncio.ensure_future(fn())
+        with self._lock:
+            self._hedges_sent += 1
+
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            with self._lock:
+                                self._hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def hedge_delay(self):
+        """
+        Send the backup request once the primary is slower than the recent p95,
+        only once there are enough samples to trust the estimate
+        """
+        if len(self.latencies) < config.HEDGE_MIN_SAMPLES:
+            return None
+        delay = max(self.latencies.percentile(95), config.HEDGE_MIN_DELAY)
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+    def _hedged_call(self, fn):
+        delay = self.hedge_delay()
+        if delay is None:
+            return fn()
+
+        primary = _hedge_executor.submit(contextvars.copy_context().run, fn)
+
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        backup = _hedge_executor.submit(contextvars.copy_context().run, fn)
+        with self._lock:
+            self._hedges_sent += 1
+
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        with self._lock:
+                            self._hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stats(self):
+        p95 = self.latencies.percentile(95)
+        with self._lock:
+            return {
+                "breaker": self.breaker.stats(),
+                "calls": self._calls,
+                "failures": self._failures,
+                "hedging": self.hedge,
+                "hedges_sent": self._hedges_sent,
+                "hedge_wins": self._hedge_wins,
+                "hedge_win_rate": round(self._hedge_wins / self._hedges_sent, 4) if self._hedges_sent else 0,
+                "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+            }
@@ -1,10 +1,17 @@
-from marshmallow import Schema, fields, INCLUDE, ValidationError
+import config
+
+from marshmallow import Schema, fields, validate, INCLUDE, ValidationError
 
 class StockDifferenceSchema(Schema):
     symbol = fields.Str(required=True, error_messages={"required": "symbol is required."})
     avg_purchase_cost = fields.Float(required=True, error_messages={"required": "avg_purchase_cost is required."})
     percent = fields.Float(required=True, error_messages={"required": "percent is required."})
 
+class BatchStockDifferenceSchema(Schema):
+    stocks = fields.Nested(StockDifferenceSchema, many=True, required=True,
+                           validate=validate.Length(min=1, max=config.BATCH_MAX_ENTRIES),
+                           error_messages={"required": "stocks is required."})
+
 class StockDetailsSchema(Schema):
     symbol = fields.Str(required=True, error_messages={"required": "symbol is required."})
     avg_purchase_cost = fields.Float(required=True, error_messages={"required": "avg_purchase_cost is required."})
@@ -18,9 +25,21 @@ class AddStocksSchema(Schema):
 class TrackedStocksSchema(Schema):
     symbol = fields.Str()
     detailed = fields.Boolean(required=True, error_messages={"required": "decrease is required."})
+    limit = fields.Int(validate=validate.Range(min=1, max=config.PAGE_MAX_LIMIT))
+    cursor = fields.Str()
+    stream = fields.Boolean()
 
 class TrackedStocksNews(Schema):
     symbol = fields.Str()
     start = fields.Date(required=True, error_messages={"required": "Start date is required."})
     end = fields.Date(required=True, error_messages={"required": "End date is required."})
     detailed = fields.Boolean(required=True, error_messages={"required": "decrease is required."})
+    limit = fields.Int(validate=validate.Range(min=1, max=config.PAGE_MAX_LIMIT))
+    cursor = fields.Str()
+    stream = fields.Boolean()
+
+class QuoteHistorySchema(Schema):
+    symbol = fields.Str(required=True, error_messages={"required": "symbol is required."})
+    start = fields.DateTime(required=True, error_messages={"required": "Start time is required."})
+    end = fields.DateTime()
+    resolution = fields.Str(validate=validate.OneOf(list(config.QUOTE_HISTORY_RESOLUTIONS)))
@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+import re
+import config
+
+from marshmallow import ValidationError
+from api.schema import StockDetailsSchema
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+class UploadError(Exception):
+    pass
+
+
+def read_csv(stream):
+    """
+    Rows of a CSV upload with a header line: symbol,avg_purchase_cost,percent,increase,decrease
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    for row in reader:
+        yield reader.line_num, {key.strip(): value.strip() for key, value in row.items() if key and value is not None}
+
+
+def read_ndjson(stream):
+    """
+    One JSON object per line, blank lines are ignored
+    """
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8"), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as error:
+            yield line_number, ValidationError(f"Invalid JSON: {error}")
+
+
+class JSONReader:
+    """
+    Values read one at a time from a JSON text stream, holding a block and the value being read rather than the whole text
+    """
+    WHITESPACE = re.compile(r"\s*")
+
+    def __init__(self, text, block_size=64 * 1024):
+        self.text = text
+        self.block_size = block_size
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        block = self.text.read(self.block_size)
+        if not block:
+            return False
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            self.pos = self.WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self._fill():
+                return
+
+    def skip(self, char):
+        """
+        Consume char if it is next, returns whether it was
+        """
+        self._skip_whitespace()
+        if self.buffer.startswith(char, self.pos):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.skip(char):
+            found = self.buffer[self.pos:self.pos + 1] or "end of input"
+            raise UploadError(f"Invalid JSON: expected {char!r}, found {found!r}")
+
+    def value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError as error:
+                if not self._fill():
+                    raise UploadError(f"Invalid JSON: {error}")
+                continue
+            # A number ending the block may go on in the next one
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def at_end(self):
+        self._skip_whitespace()
+        return self.pos == len(self.buffer)
+
+
+def read_json(stream):
+    """
+    The same {"stocks": [...]} body /api/stocks/tracker accepts, parsed a row at a time as the body arrives
+    """
+    reader = JSONReader(io.TextIOWrapper(stream, encoding="utf-8-sig"))
+    reader.expect("{")
+    found = False
+    if not reader.skip("}"):
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if key == "stocks" and not found:
+                if not reader.skip("["):
+                    raise UploadError("stocks is required.")
+                found = True
+                line_number = 0
+                if not reader.skip("]"):
+                    while True:
+                        line_number += 1
+                        yield line_number, reader.value()
+                        if reader.skip("]"):
+                            break
+                        reader.expect(",")
+            else:
+                reader.value()
+            if reader.skip("}"):
+                break
+            reader.expect(",")
+    if not found:
+        raise UploadError("stocks is required.")
+    if not reader.at_end():
+        raise UploadError("Invalid JSON: extra data after the body")
+
+
+def read_upload(request, max_rows=None):
+    """
+    Parse a position upload row by row from the request stream, up to max_rows or BULK_MAX_ROWS rows
+    Yields (row, position, errors) with either a validated position or the row's validation errors
+    """
+    max_rows = config.BULK_MAX_ROWS if max_rows is None else max_rows
+    mimetype = request.mimetype
+    if mimetype in CSV_TYPES:
+        rows = read_csv(request.stream)
+    elif mimetype in NDJSON_TYPES:
+        rows = read_ndjson(request.stream)
+    elif mimetype == "application/json":
+        rows = read_json(request.stream)
+    else:
+        raise UploadError(f"Unsupported content type: {mimetype or 'none'}, use CSV, NDJSON or JSON")
+
+    schema = StockDetailsSchema()
+    for count, (line_number, row) in enumerate(rows, start=1):
+        if count > max_rows:
+            raise UploadError(f"Uploads are limited to {max_rows} rows")
+        if isinstance(row, ValidationError):
+            yield line_number, None, row.messages
+            continue
+        try:
+            yield line_number, schema.load(row), None
+        except ValidationError as error:
+            yield line_number, None, error.messages
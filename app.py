@@ -1,11 +1,23 @@
+import multiprocessing
+
 from flask import Flask, jsonify
 from api.api import api_bp
+from stocks.stream import start_quote_stream
+from stocks.scheduler import start_scheduler
 
 
 app = Flask(__name__)
 app.config.from_object("config")
 app.register_blueprint(api_bp, url_prefix="/api")
 
+# Alert worker processes are spawned and import the main module again, only the serving process starts background work
+if multiprocessing.parent_process() is None:
+    if app.config["STREAM_ENABLED"]:
+        start_quote_stream()
+
+    if app.config["SCHEDULER_ENABLED"]:
+        start_scheduler()
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'status': 'Not Found',}), 404
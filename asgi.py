@@ -0,0 +1,67 @@
+"""
+Async serving mode, run with an ASGI server: hypercorn asgi:app or uvicorn asgi:app
+Only these routes run natively as coroutines, so many slow upstream calls overlap on one worker:
+    /api/healthcheck, /api/stocks/difference, /api/stocks/difference/batch and /api/stocks/track
+Every other route stays on WSGI, served by the sync Flask app through WsgiToAsgi on a thread pool:
+    /api/stocks/tracker, /api/stocks/tracker/bulk, /api/stocks/news, /api/stocks/history and the
+    operational endpoints (metrics, database/pool, cache, history/quotes, ratelimit, upstream, stream, scheduler)
+so both modes expose the same API
+Quotes go through the same cache, retry policy, rate limiter and circuit breakers in both
+"""
+from werkzeug.exceptions import HTTPException
+from app import app as flask_app
+
+try:
+    from quart import Quart
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    Quart = None
+
+
+class RouteDispatcher:
+    """
+    Send requests for routes the async app defines to it and everything else to the sync app
+    """
+    def __init__(self, async_app, sync_app):
+        self.async_app = async_app
+        self.sync_app = sync_app
+        self._adapter = async_app.url_map.bind("localhost")
+
+    def handles(self, scope):
+        try:
+            self._adapter.match(scope["path"], method=scope["method"])
+            return True
+        except HTTPException:
+            return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not self.handles(scope):
+            await self.sync_app(scope, receive, send)
+        else:
+            await self.async_app(scope, receive, send)
+
+
+def create_app():
+    if Quart is None:
+        raise RuntimeError("The async serving mode requires quart, asgiref, httpx and aiomysql")
+    from api.async_api import async_api_bp
+    from database.async_database import close_async_pools
+    from stocks.async_stocks import close_async_http
+
+    async_app = Quart(__name__)
+    async_app.config.from_object("config")
+    async_app.register_blueprint(async_api_bp, url_prefix="/api")
+
+    @async_app.errorhandler(500)
+    async def internal_error(error):
+        return {"status": "Internal Server Error"}, 500
+
+    @async_app.after_serving
+    async def close_clients():
+        await close_async_http()
+        await close_async_pools()
+
+    return RouteDispatcher(async_app, WsgiToAsgi(flask_app))
+
+
+app = create_app()
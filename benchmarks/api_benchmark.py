@@ -0,0 +1,347 @@
+"""
+Load test the API and the cron path against stocks.fake_finnhub and a seeded local MySQL database
+Run with: python -m benchmarks.api_benchmark --portfolio-sizes 100 1000 --concurrency 1 8 32 --requests 200
+Every run is written to benchmarks/results/<name>.json, --baseline prints the change against an earlier run
+The benchmark database (--database, default stocks_benchmark) is emptied and reseeded for every portfolio size
+--backend sqlite runs against an in-memory SQLite database instead, no server needed
+"""
+import argparse
+import datetime
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from stocks.fake_finnhub import start_fake_finnhub, fake_quote
+
+# Symbols posted by the tracker scenario, unique within a run
+new_symbols = itertools.count(1)
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "results")
+SCENARIOS = ["difference", "track", "news", "tracker", "cron"]
+
+
+class QueryCounter:
+    """
+    Counts statements sent to MySQL by every pymysql connection in the process,
+    or run by every SQLite connection opened after install
+    """
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def increment(self):
+        with self._lock:
+            self.count += 1
+
+    def install(self, backend="mysql"):
+        if backend == "sqlite":
+            self.install_sqlite()
+            return
+
+        import pymysql.connections
+
+        query = pymysql.connections.Connection.query
+        counter = self
+
+        def counted_query(con, sql, unbuffered=False):
+            counter.increment()
+            return query(con, sql, unbuffered)
+
+        pymysql.connections.Connection.query = counted_query
+
+    def install_sqlite(self):
+        from database.sqlite_database import SQLiteConnectionPool
+
+        connect = SQLiteConnectionPool._connect
+        counter = self
+
+        def trace(sql):
+            # Transaction control is not counted, as pymysql sends COMMIT without query()
+            if not sql.lstrip().upper().startswith(("BEGIN", "COMMIT", "ROLLBACK")):
+                counter.increment()
+
+        def counted_connect(pool):
+            con = connect(pool)
+            con.set_trace_callback(trace)
+            return con
+
+        SQLiteConnectionPool._connect = counted_connect
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+
+def seed_database(database, size, seed):
+    """
+    Empty every table of the benchmark database and track size generated symbols
+    Purchase costs sit a few percent around the fake quotes, so some positions cross their thresholds
+    """
+    from database import setup
+    from database.database import Database
+
+    setup.main(database)
+
+    rng = random.Random(seed)
+    now = time.time()
+    stocks = []
+    trackers = []
+    for i in range(size):
+        symbol = "B{:05d}".format(i)
+        stocks.append((i + 1, symbol, "{} Corp".format(symbol)))
+        avg_purchase_cost = round(fake_quote(symbol, now)["pc"] * rng.uniform(0.9, 1.1), 2)
+        trackers.append((avg_purchase_cost, rng.choice([1, 2, 5, 10]), rng.random() < 0.7, rng.random() < 0.7, i + 1))
+
+    with Database(database) as db:
+        tables = [table for table in db.table_names() if table != "schema_migrations"]
+        if db.dialect == "sqlite":
+            # Deleting every table in one transaction leaves no dangling references by the commit
+            db.execute("PRAGMA defer_foreign_keys = ON")
+            for table in tables:
+                db.execute("DELETE FROM {}".format(table))
+            db.execute("DELETE FROM sqlite_sequence")
+        else:
+            db.execute("SET FOREIGN_KEY_CHECKS = 0")
+            for table in tables:
+                db.execute("TRUNCATE TABLE `{}`".format(table))
+            db.execute("SET FOREIGN_KEY_CHECKS = 1")
+        db.executemany("INSERT INTO stock (id, symbol, name) VALUES (%s, %s, %s)", stocks)
+        db.executemany("INSERT INTO stock_tracker (avg_purchase_cost, percent, increase, decrease, stock_id) VALUES (%s, %s, %s, %s, %s)", trackers)
+    return [symbol for _, symbol, _ in stocks]
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies, statuses, seconds):
+    latencies = sorted(latencies)
+    succeeded = sum(count for status, count in statuses.items() if status.isdigit() and int(status) < 400)
+    return {
+        "requests": len(latencies),
+        "errors": len(latencies) - succeeded,
+        "statuses": statuses,
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 2) if seconds else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def request_factory(scenario, symbols, rng):
+    """
+    Function of the request number returning (method, path, json body) for an API scenario
+    """
+    today = datetime.date.today()
+    if scenario == "difference":
+        def make(i):
+            return "POST", "/api/stocks/difference", {"symbol": rng.choice(symbols), "avg_purchase_cost": 100, "percent": 5}
+    elif scenario == "track":
+        def make(i):
+            return "GET", "/api/stocks/track?detailed=true", None
+    elif scenario == "news":
+        path = "/api/stocks/news?detailed=false&start={}&end={}".format(today - datetime.timedelta(days=7), today)
+
+        def make(i):
+            return "GET", path, None
+    else:
+        def make(i):
+            stock = {"symbol": "N{:07d}".format(next(new_symbols)), "avg_purchase_cost": 10, "percent": 5,
+                     "increase": True, "decrease": True}
+            return "POST", "/api/stocks/tracker", {"stocks": [stock]}
+    return make
+
+
+def run_api_scenario(base_url, make_request, total, concurrency):
+    import requests
+
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def send(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        method, path, body = make_request(i)
+        start = time.perf_counter()
+        try:
+            status = str(session.request(method, base_url + path, json=body, timeout=120).status_code)
+        except requests.RequestException as error:
+            status = type(error).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(total)))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def run_cron_scenario(runs):
+    from stocks.stocks import get_tracked_stocks
+
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    for _ in range(runs):
+        run_start = time.perf_counter()
+        try:
+            get_tracked_stocks()
+            status = "200"
+        except Exception as error:
+            status = type(error).__name__
+        latencies.append(time.perf_counter() - run_start)
+        statuses[status] = statuses.get(status, 0) + 1
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def start_api_server(app):
+    from werkzeug.serving import make_server
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="benchmark-api", daemon=True).start()
+    return server, "http://127.0.0.1:{}".format(server.server_port)
+
+
+def compare(results, baseline):
+    """
+    Throughput and p95 change per (scenario, portfolio size, concurrency) present in both runs
+    """
+    previous = {(r["scenario"], r["portfolio_size"], r["concurrency"]): r for r in baseline["results"]}
+    print("\nAgainst baseline {}".format(baseline["name"]))
+    print("{:>10} {:>10} {:>6} {:>14} {:>14} {:>14}".format("scenario", "portfolio", "conc", "throughput", "p95", "upstream"))
+    for result in results:
+        before = previous.get((result["scenario"], result["portfolio_size"], result["concurrency"]))
+        if before is None:
+            continue
+        print("{:>10} {:>10} {:>6} {:>14} {:>14} {:>14}".format(
+            result["scenario"], result["portfolio_size"], result["concurrency"],
+            change(before["throughput_rps"], result["throughput_rps"]),
+            change(before["p95_ms"], result["p95_ms"]),
+            change(before["upstream_calls"], result["upstream_calls"])))
+
+
+def change(before, after):
+    if not before or after is None:
+        return "n/a"
+    return "{:+.1f}%".format((after - before) / before * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--portfolio-sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario and concurrency level")
+    parser.add_argument("--cron-runs", type=int, default=3)
+    parser.add_argument("--database", default="stocks_benchmark", help="emptied and reseeded, never the app database")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default=os.getenv("DB_BACKEND", "mysql"))
+    parser.add_argument("--sqlite-path", default=":memory:", help="SQLITE_PATH for --backend sqlite")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds per fake Finnhub call")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--finnhub-calls-per-minute", type=int, default=60000,
+                        help="client-side rate limit, pass 60 to include the production limit")
+    parser.add_argument("--warm", action="store_true", help="keep the in-memory caches between runs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--name", default=datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--baseline", help="results file to compare with")
+    args = parser.parse_args()
+
+    if args.database == os.getenv("STOCKS_DB_NAME", "stocks"):
+        parser.error("--database {} is the app database, the benchmark empties it".format(args.database))
+
+    fake_finnhub = start_fake_finnhub(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                      throttle_rate=args.throttle_rate, seed=args.seed)
+    os.environ["FINNHUB_API_URL"] = fake_finnhub.url
+    os.environ["STOCKS_DB_NAME"] = args.database
+    os.environ["DB_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["SQLITE_PATH"] = args.sqlite_path
+    os.environ.setdefault("FINNHUB_TOKEN", "benchmark")
+    os.environ["SCHEDULER_ENABLED"] = "false"
+    os.environ["STREAM_ENABLED"] = "false"
+
+    import config
+    config.FINNHUB_CALLS_PER_MINUTE = args.finnhub_calls_per_minute
+    config.FINNHUB_BURST = max(config.FINNHUB_BURST, args.finnhub_calls_per_minute // 60)
+    config.LOGGER_LEVEL = logging.WARNING
+    os.makedirs(os.path.dirname(config.LOG_FILE_PATH), exist_ok=True)
+
+    query_counter = QueryCounter()
+    query_counter.install(args.backend)
+
+    from app import app
+    from stocks.stocks import quote_cache, profile_cache
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    api_server, base_url = start_api_server(app)
+
+    results = []
+    print("{:>10} {:>10} {:>6} {:>9} {:>7} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        "scenario", "portfolio", "conc", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms", "upstream", "queries"))
+    for size in args.portfolio_sizes:
+        symbols = seed_database(args.database, size, args.seed)
+        for scenario in args.scenarios:
+            levels = [1] if scenario == "cron" else args.concurrency
+            for concurrency in levels:
+                if not args.warm:
+                    quote_cache.clear()
+                    profile_cache.memory.clear()
+                fake_finnhub.reset()
+                query_counter.reset()
+
+                if scenario == "cron":
+                    result = run_cron_scenario(args.cron_runs)
+                else:
+                    make_request = request_factory(scenario, symbols, random.Random(args.seed))
+                    result = run_api_scenario(base_url, make_request, args.requests, concurrency)
+
+                upstream = fake_finnhub.stats()
+                result.update({
+                    "scenario": scenario,
+                    "portfolio_size": size,
+                    "concurrency": concurrency,
+                    "upstream": upstream,
+                    "upstream_calls": sum(endpoint["calls"] for endpoint in upstream.values()),
+                    "db_queries": query_counter.count,
+                })
+                results.append(result)
+                print("{:>10} {:>10} {:>6} {:>9} {:>7} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+                    scenario, size, concurrency, result["requests"], result["errors"], result["throughput_rps"],
+                    result["p50_ms"], result["p95_ms"], result["p99_ms"], result["upstream_calls"], result["db_queries"]))
+    api_server.shutdown()
+
+    settings = {key: value for key, value in vars(args).items() if key not in ("name", "baseline")}
+    settings["python"] = platform.python_version()
+    settings["platform"] = platform.platform()
+    run = {"name": args.name, "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+           "settings": settings, "results": results}
+    os.makedirs(RESULTS_PATH, exist_ok=True)
+    path = os.path.join(RESULTS_PATH, "{}.json".format(args.name))
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    print("\nSaved {}".format(path))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Compare the per-dict threshold check with the NumPy batch path
+Run with: python -m benchmarks.threshold_benchmark --sizes 1000 100000 1000000
+"""
+import argparse
+import random
+import time
+
+from stocks.stocks import calculate_percent_change
+from stocks.vectorized import load_columns, evaluate_thresholds
+
+
+def generate_positions(size, seed):
+    rng = random.Random(seed)
+    positions = []
+    quotes = {}
+    for i in range(size):
+        symbol = "S{}".format(i)
+        avg_purchase_cost = round(rng.uniform(1, 500), 2)
+        positions.append({
+            "id": i,
+            "stock_id": i,
+            "symbol": symbol,
+            "name": "Stock {}".format(i),
+            "avg_purchase_cost": avg_purchase_cost,
+            "percent": rng.choice([1, 2, 5, 10, 2.5]),
+            "increase": rng.random() < 0.7,
+            "decrease": rng.random() < 0.7,
+        })
+        # Prices drift a few percent around cost, so a minority of positions cross a threshold
+        quotes[symbol] = {"c": round(max(avg_purchase_cost * rng.gauss(1, 0.05), 0.01), 2), "t": 1582641000}
+    return positions, quotes
+
+
+def per_dict_path(positions, quotes):
+    """
+    The original loop: a response dict per stock, then repeated .get() comparisons
+    """
+    stocks_increased = []
+    stocks_decreased = []
+    for position in positions:
+        stock_detail = {
+            "symbol": position["symbol"],
+            "name": position["name"],
+            "percent_difference": calculate_percent_change(quotes[position["symbol"]], position["avg_purchase_cost"]),
+            "alert_on_increase": bool(position["increase"]),
+            "alert_on_decrease": bool(position["decrease"]),
+            "avg_purchase_cost": position["avg_purchase_cost"],
+            "percent_to_track_threshold": position["percent"],
+        }
+        if stock_detail.get("alert_on_increase"):
+            if stock_detail.get("percent_difference") >= stock_detail.get("percent_to_track_threshold") and stock_detail.get("percent_difference") > 0:
+                stocks_increased.append((stock_detail.get("symbol"), stock_detail.get("percent_difference")))
+        if stock_detail.get("alert_on_decrease"):
+            if abs(stock_detail.get("percent_difference")) >= stock_detail.get("percent_to_track_threshold") and stock_detail.get("percent_difference") < 0:
+                stocks_decreased.append((stock_detail.get("symbol"), stock_detail.get("percent_difference")))
+    return stocks_increased, stocks_decreased
+
+
+def vectorized_path(positions, quotes):
+    columns, quoted = load_columns(positions, quotes)
+    return vectorized_evaluate(columns, quoted)
+
+
+def vectorized_evaluate(columns, quoted):
+    percent_difference, increased, decreased = evaluate_thresholds(columns)
+    percent_difference = percent_difference.tolist()
+    stocks_increased = [(quoted[i]["symbol"], percent_difference[i]) for i in increased.nonzero()[0].tolist()]
+    stocks_decreased = [(quoted[i]["symbol"], percent_difference[i]) for i in decreased.nonzero()[0].tolist()]
+    return stocks_increased, stocks_decreased
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("{:>10} {:>14} {:>14} {:>14} {:>9} {:>10}".format(
+        "positions", "per-dict (ms)", "numpy (ms)", "evaluate (ms)", "speedup", "identical"))
+    for size in args.sizes:
+        positions, quotes = generate_positions(size, args.seed)
+        per_dict_time, expected = timed(per_dict_path, positions, quotes, repeat=args.repeat)
+        vectorized_time, actual = timed(vectorized_path, positions, quotes, repeat=args.repeat)
+        # The vectorised pass alone, for callers that keep positions in columns between runs
+        columns, _ = load_columns(positions, quotes)
+        evaluate_time, _ = timed(evaluate_thresholds, columns, repeat=args.repeat)
+        print("{:>10} {:>14.2f} {:>14.2f} {:>14.2f} {:>8.1f}x {:>10}".format(
+            size, per_dict_time * 1000, vectorized_time * 1000, evaluate_time * 1000,
+            per_dict_time / vectorized_time, str(expected == actual)))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,145 @@ load_dotenv()
 
 DEBUG = True
 PATH = os.path.dirname(os.path.realpath(__file__))
-DATABASE = "stocks"
-LOG_FILE_PATH = "logs/stock_market_bot.log"
-LOGGER_LEVEL = logging.DEBUG
+DATABASE = os.getenv("STOCKS_DB_NAME", "stocks")
+LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "logs/stock_market_bot.log")
+LOGGER_LEVEL = getattr(logging, os.getenv("LOG_LEVEL", "DEBUG").upper())
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text") # text, or json for one object per line
+LOG_QUEUE_SIZE = 10000 # records waiting for the writer thread before new ones are dropped
+LOG_BATCH_SIZE = 500 # records written per flush
+LOG_MAX_MESSAGE_LENGTH = 2000 # characters of a message kept, the rest is cut
+LOG_INFO_SAMPLE_RATE = 1.0 # share of INFO and DEBUG records kept, warnings and errors are always kept
+
+# Database connection pool
+DB_POOL_SIZE = 10
+DB_POOL_TIMEOUT = 10 # seconds to wait for a free connection
+DB_POOL_RECYCLE = 3600 # seconds before a connection is replaced
+DB_POOL_IDLE_TIMEOUT = 300 # seconds an idle connection is kept open
+DB_POOL_PING_AFTER = 5 # seconds idle before a connection is pinged on checkout
+
+# Storage backend
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql") # mysql, or sqlite for an embedded database file on a single node
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/{database}.sqlite3") # :memory: keeps each database in memory for the life of the process
+SQLITE_BUSY_TIMEOUT = 10 # seconds a write waits for another connection's write to finish
+SQLITE_STATEMENT_CACHE = 256 # prepared statements kept per connection
+
+# Concurrent upstream fetches
+FETCH_MAX_WORKERS = 16 # concurrent Finnhub requests per fan-out
+FETCH_DEADLINE = 15 # seconds for a whole fan-out before unfinished symbols are reported as errors
+FETCH_CHUNK_SIZE = 500 # tracked stocks fanned out at a time
+
+# Quote cache
+QUOTE_CACHE_TTL = 15 # seconds a quote is served without calling Finnhub
+QUOTE_CACHE_MAX_SIZE = 5000 # symbols kept before least recently used are evicted
+QUOTE_CACHE_URL = os.getenv("QUOTE_CACHE_URL") # e.g. redis://localhost:6379/0 to share quotes across workers
+
+# Finnhub client-side rate limit
+FINNHUB_API_URL = os.getenv("FINNHUB_API_URL", "https://finnhub.io/api/v1") # e.g. http://127.0.0.1:8766 for python -m stocks.fake_finnhub
+FINNHUB_CALLS_PER_MINUTE = 60
+FINNHUB_BURST = 30 # tokens available at once
+FINNHUB_PRIORITY_RESERVES = {"interactive": 0, "cron": 0.2, "backfill": 0.5} # share of the burst each class leaves for higher priorities
+FINNHUB_RATE_LIMIT_TIMEOUT = 30 # seconds a call waits for a token before failing
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL") # e.g. redis://localhost:6379/0 to share the quota across workers
+
+# Upstream resilience
+API_REQUEST_DEADLINE = 10 # seconds an API request may spend on upstream calls and retries
+BREAKER_FAILURE_THRESHOLD = 5 # consecutive failures before an endpoint's circuit opens
+BREAKER_RECOVERY_TIMEOUT = 30 # seconds before a trial call is let through an open circuit
+HEDGE_ENDPOINTS = ["quote"] # idempotent endpoints that send a backup request when slow
+HEDGE_MIN_SAMPLES = 20 # latency samples needed before hedging starts
+HEDGE_MIN_DELAY = 0.05 # seconds, floor for the p95-based hedging delay
+HEDGE_LATENCY_WINDOW = 200 # recent latencies kept per endpoint
+HEDGE_MAX_WORKERS = 32
+
+# Streaming quotes
+STREAM_ENABLED = os.getenv("STREAM_ENABLED", "false").lower() == "true"
+STREAM_URL = os.getenv("STREAM_URL", "wss://ws.finnhub.io?token={}".format(os.getenv("FINNHUB_TOKEN")))
+STREAM_MAX_AGE = 60 # seconds a streamed price is used instead of calling the quote endpoint
+STREAM_QUEUE_SIZE = 10000 # frames buffered before the oldest are dropped
+STREAM_RESUBSCRIBE_INTERVAL = 30 # seconds between checks of the tracked symbol set
+STREAM_RECEIVE_TIMEOUT = 5 # seconds
+STREAM_MAX_BACKOFF = 60 # seconds between reconnect attempts
+
+# Alerts
+VECTORIZE_MIN_POSITIONS = 200 # changed positions before thresholds are evaluated with NumPy
+ALERT_NEWS_INTERVAL = 900 # seconds between loads of a symbol's news for alert messages, quotes are polled more often
+
+# Sharded alert worker
+ALERT_SHARDING = os.getenv("ALERT_SHARDING", "false").lower() == "true" # the tracking job runs the shards this node leases instead of only on the scheduler leader
+ALERT_SHARDS = 64 # positions are split by stock_id into this many shards, must be the same on every worker
+ALERT_WORKER_PROCESSES = int(os.getenv("ALERT_WORKER_PROCESSES", "4")) # shards evaluated at once on one node, 1 runs them in-process
+ALERT_LEASE_TTL = 300 # seconds a shard stays with a worker that stopped renewing it
+ALERT_WORKER_QUOTA_SHARE = 0.5 # share of the Finnhub quota for shard processes next to the API without RATE_LIMIT_URL, the API keeps the rest
+
+# Scheduler
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
+SCHEDULER_TICK = 5 # seconds between checks for due jobs
+SCHEDULER_LEADER_ELECTION = True # only the worker process holding the scheduler lease runs exclusive jobs
+SCHEDULER_LEADER_TTL = 30 # seconds before another process takes over from a leader that stopped renewing
+SCHEDULER_STATUS_UPCOMING = 20 # upcoming symbol polls listed on /api/scheduler
+TRACKING_INTERVALS = {"regular": 60, "extended": 300, "closed": None} # seconds between polls of each symbol, None pauses
+
+# Market hours
+MARKET_TIMEZONE = "America/New_York"
+MARKET_REGULAR_HOURS = ("09:30", "16:00")
+MARKET_EXTENDED_HOURS = ("04:00", "20:00")
+MARKET_HOLIDAYS = [
+    "2026-01-01", "2026-01-19", "2026-02-16", "2026-04-03", "2026-05-25", "2026-06-19",
+    "2026-07-03", "2026-09-07", "2026-11-26", "2026-12-25",
+    "2027-01-01", "2027-01-18", "2027-02-15", "2027-03-26", "2027-05-31", "2027-06-18",
+    "2027-07-05", "2027-09-06", "2027-11-25", "2027-12-24",
+]
+
+# News
+NEWS_NEAR_DUPLICATES = False # also treat syndicated copies of a headline as the same article
+NEWS_NEAR_DUPLICATE_WINDOW = 6 * 3600 # seconds apart two sources may publish a headline and still be copies of one article
+
+# Batch endpoints
+BATCH_MAX_ENTRIES = 1000 # entries accepted by /api/stocks/difference/batch
+BATCH_MAX_PAYLOAD_BYTES = 256 * 1024
+BATCH_CHUNK_SIZE = 100 # symbols fetched before their results are streamed back
+BULK_MAX_ROWS = 50000 # rows accepted by /api/stocks/tracker/bulk
+BULK_REQUEST_DEADLINE = 120 # seconds a bulk import may spend looking up unknown symbols
+BULK_CHUNK_SIZE = 500 # bulk import rows parsed, stored and answered at a time
+QUERY_IN_BATCH_SIZE = 1000 # values per IN (...) list
+
+# Company profile cache
+PROFILE_CACHE_TTL = 3600 # seconds a profile is served from memory before the database is checked again
+PROFILE_CACHE_MAX_SIZE = 10000 # profiles kept in memory
+PROFILE_TTL = 7 * 24 * 3600 # seconds before a stored profile is refreshed in the background
+PROFILE_NEGATIVE_TTL = 24 * 3600 # seconds an unknown symbol is remembered before it is looked up again
+PROFILE_REFRESH_INTERVAL = 600 # seconds between background refresh runs
+PROFILE_REFRESH_BATCH = 50 # stale profiles refreshed per run
+
+# Quote history
+QUOTE_HISTORY_ENABLED = True # append every quote fetched from Finnhub to stock_quote_history
+QUOTE_HISTORY_BATCH_SIZE = 500 # buffered quotes written per executemany
+QUOTE_HISTORY_FLUSH_INTERVAL = 5 # seconds a quote may wait in the buffer
+QUOTE_HISTORY_RAW_RETENTION = 7 * 24 * 3600 # seconds raw quotes are kept
+QUOTE_ROLLUP_RETENTION = {60: 90 * 24 * 3600, 3600: 2 * 365 * 24 * 3600, 86400: None} # rollup resolution: seconds kept, None keeps forever
+QUOTE_HISTORY_RESOLUTIONS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400} # resolutions /api/stocks/history accepts
+QUOTE_HISTORY_MAX_BUCKETS = 5000 # buckets a single history query may return
+QUOTE_ROLLUP_INTERVAL = 300 # seconds between rollup runs
+QUOTE_ROLLUP_LOOKBACK = 900 # seconds of buckets rebuilt every rollup run, for quotes whose trade time lags the poll
+QUOTE_RETENTION_INTERVAL = 3600 # seconds between retention runs
+QUOTE_RETENTION_BATCH = 10000 # rows deleted per statement, so retention never holds long locks
+
+# Pagination and streamed responses
+PAGE_DEFAULT_LIMIT = 100 # tracked stocks per page when only a cursor is given
+PAGE_MAX_LIMIT = 1000 # largest page a client may ask for
+STREAM_RESPONSE_CHUNK_LINES = 100 # NDJSON lines written to the response at a time
+
+# HTTP caching
+HTTP_QUOTE_WINDOWS = {"regular": 15, "extended": 60, "closed": 900} # seconds a response with quotes keeps its ETag, per market session
+HTTP_HISTORY_MAX_AGE = 3600 # Cache-Control max-age for quote history that no longer changes
+
+# Async serving mode
+ASYNC_HTTP_MAX_CONNECTIONS = 100 # open connections to Finnhub per event loop
+ASYNC_HTTP_MAX_KEEPALIVE = 20 # idle connections kept for reuse
+
+# Metrics and profiling
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true" # sample the stacks of API requests and save those of slow ones
+PROFILER_INTERVAL = 0.005 # seconds between stack samples
+PROFILER_SLOW_REQUEST = 1 # seconds before a request's sampled stacks are saved
+PROFILER_MAX_DEPTH = 128 # frames kept per sampled stack
+PROFILER_OUTPUT_PATH = "logs/profiles" # one folded stack file per slow request, for flamegraph.pl or speedscope
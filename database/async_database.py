@@ -0,0 +1,145 @@
+import asyncio
+import itertools
+import os
+import config
+
+from dotenv import load_dotenv
+from database.database import Database
+from metrics import db_query_duration, statement_name
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+load_dotenv()
+
+STOCKS_DB_PASSWORD = os.getenv("STOCKS_DB_PASSWORD")
+
+# One pool per event loop, an aiomysql pool cannot be shared between loops
+_pools = {}
+
+
+async def get_async_pool(name):
+    if aiomysql is None:
+        raise RuntimeError("The aiomysql package is required for the async serving mode")
+    key = (id(asyncio.get_running_loop()), name)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = await aiomysql.create_pool(host="127.0.0.1",
+                                          user="root",
+                                          password=STOCKS_DB_PASSWORD,
+                                          charset="utf8mb4",
+                                          db=name,
+                                          cursorclass=aiomysql.DictCursor,
+                                          maxsize=config.DB_POOL_SIZE,
+                                          pool_recycle=config.DB_POOL_RECYCLE)
+        pool = _pools.setdefault(key, pool)
+    return pool
+
+
+async def close_async_pools():
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _pools if key[0] == loop_id]:
+        pool = _pools.pop(key)
+        pool.close()
+        await pool.wait_closed()
+
+
+def get_async_pool_stats():
+    return {
+        name: {"size": pool.size, "in_use": pool.size - pool.freesize, "max_size": pool.maxsize}
+        for (_, name), pool in _pools.items()
+    }
+
+
+class AsyncDatabase:
+    """
+    Database for coroutines: same transaction handling, waiting for a pooled connection without holding a thread
+        async with AsyncDatabase(config.DATABASE) as db:
+            rows = await db.query(sql, params)
+    SQLite has no async driver, with DB_BACKEND=sqlite statements run on a pooled Database in a worker thread
+    """
+    def __init__(self, name):
+        self.name = name
+        self._pool = None
+        self._con = None
+        self._cursor = None
+        self._db = None
+
+    async def __aenter__(self):
+        if config.DB_BACKEND == "sqlite":
+            self._db = await asyncio.to_thread(Database, self.name)
+            return self
+        self._pool = await get_async_pool(self.name)
+        self._con = await asyncio.wait_for(self._pool.acquire(), config.DB_POOL_TIMEOUT)
+        self._cursor = await self._con.cursor()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if self._db is not None:
+            await asyncio.to_thread(self._db.close, exc_type is None)
+            return
+        try:
+            if exc_type is None:
+                await self._con.commit()
+            else:
+                await self._con.rollback()
+        finally:
+            await self._cursor.close()
+            self._pool.release(self._con)
+
+    async def execute(self, sql, params=None):
+        if self._db is not None:
+            return await asyncio.to_thread(self._db.execute, sql, params)
+        with db_query_duration.time(statement=statement_name(sql)):
+            await self._cursor.execute(sql, params or ())
+
+    async def executemany(self, sql, params):
+        if self._db is not None:
+            return await asyncio.to_thread(self._db.executemany, sql, params)
+        with db_query_duration.time(statement=statement_name(sql)):
+            await self._cursor.executemany(sql, params)
+
+    async def query(self, sql, params=None):
+        if self._db is not None:
+            return await asyncio.to_thread(self._db.query, sql, params)
+        await self.execute(sql, params)
+        return await self._cursor.fetchall()
+
+    async def stream(self, sql, params=None):
+        """
+        Async generator over the rows of a server-side cursor instead of buffering the whole result
+        The connection cannot run other statements until the generator is exhausted or closed
+        """
+        if self._db is not None:
+            async for row in self._stream_in_thread(sql, params):
+                yield row
+            return
+        cursor = await self._con.cursor(aiomysql.SSDictCursor)
+        try:
+            # Timed until the first rows are ready, the rest arrive as the caller reads them
+            with db_query_duration.time(statement=statement_name(sql)):
+                await cursor.execute(sql, params or ())
+            while True:
+                row = await cursor.fetchone()
+                if row is None:
+                    return
+                yield row
+        finally:
+            await cursor.close()
+
+    async def _stream_in_thread(self, sql, params):
+        """
+        Database.stream read in the worker thread a chunk at a time
+        """
+        rows = self._db.stream(sql, params)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(list, itertools.islice(rows, config.FETCH_CHUNK_SIZE))
+                if not chunk:
+                    return
+                for row in chunk:
+                    yield row
+        finally:
+            await asyncio.to_thread(rows.close)
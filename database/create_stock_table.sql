@@ -1,5 +0,0 @@
-CREATE TABLE IF NOT EXISTS stock (
-    id INTEGER PRIMARY KEY AUTO_INCREMENT,
-    symbol TEXT NOT NULL UNIQUE,
-    name TEXT NOT NULL UNIQUE
-);
\ No newline at end of file
@@ -1,28 +1,289 @@
 import pymysql
 import pymysql.cursors
 import os
+import threading
+import time
+import config
 
+from collections import deque
 from dotenv import load_dotenv
+from metrics import db_query_duration, statement_name
 
 load_dotenv()
 
 STOCKS_DB_PASSWORD = os.getenv("STOCKS_DB_PASSWORD")
 
-class Database:
-    def __init__(self, name):
-        self._con = pymysql.connect(host="127.0.0.1",
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of reusable connections to a single database
+    Connections are health checked on checkout and recycled once they
+    exceed their maximum lifetime or have been idle for too long
+    The pool is also where a storage backend lives: it connects, adapts SQL written for MySQL
+    with %s placeholders and phrases upserts, see SQLiteConnectionPool for the embedded backend
+    """
+    dialect = "mysql"
+    Error = pymysql.Error
+
+    def __init__(self, name, size=config.DB_POOL_SIZE, timeout=config.DB_POOL_TIMEOUT,
+                 recycle=config.DB_POOL_RECYCLE, idle_timeout=config.DB_POOL_IDLE_TIMEOUT,
+                 ping_after=config.DB_POOL_PING_AFTER):
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._created_at = {}
+        self._open = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+        self._connects = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+
+    def _connect(self):
+        return pymysql.connect(host="127.0.0.1",
                 user="root",
                 password=STOCKS_DB_PASSWORD,
                 charset="utf8mb4",
-                db=name,
+                db=self.name,
                 cursorclass=pymysql.cursors.DictCursor)
-        self._cursor = self._con.cursor()
+
+    def _is_expired(self, con, last_used, now):
+        if now - self._created_at.get(id(con), now) > self.recycle:
+            return True
+        return now - last_used > self.idle_timeout
+
+    def _discard(self, con):
+        """
+        Close a connection and free its slot, caller must hold the lock
+        """
+        self._created_at.pop(id(con), None)
+        self._open -= 1
+        try:
+            con.close()
+        except self.Error:
+            pass
+
+    def _is_open(self, con):
+        return con.open
+
+    def _is_healthy(self, con):
+        try:
+            con.ping(reconnect=False)
+            return True
+        except pymysql.Error:
+            return False
+
+    def acquire(self):
+        """
+        Check out a connection, blocking up to the pool timeout when every connection is in use
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        con = None
+        last_used = None
+        waited = False
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    candidate, candidate_last_used = self._idle.pop()
+                    if self._is_expired(candidate, candidate_last_used, now):
+                        self._recycled += 1
+                        self._discard(candidate)
+                        continue
+                    con, last_used = candidate, candidate_last_used
+                    break
+                if con is not None or self._open < self.size:
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(f"Timed out after {self.timeout}s waiting for a connection to {self.name}")
+                waited = True
+                self._cond.wait(remaining)
+
+            if con is None:
+                self._open += 1
+            self._in_use += 1
+
+        try:
+            if con is not None and time.monotonic() - last_used > self.ping_after and not self._is_healthy(con):
+                with self._cond:
+                    self._failed_health_checks += 1
+                    self._discard(con)
+                    self._open += 1
+                con = None
+            if con is None:
+                con = self._connect()
+                with self._cond:
+                    self._connects += 1
+                    self._created_at[id(con)] = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        wait_time = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._total_wait += wait_time
+            self._max_wait = max(self._max_wait, wait_time)
+        return con
+
+    def release(self, con, discard=False):
+        """
+        Return a connection to the pool, closing it if it is broken or past its lifetime
+        """
+        now = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if discard or not self._is_open(con):
+                self._discard(con)
+            elif now - self._created_at.get(id(con), now) > self.recycle:
+                self._recycled += 1
+                self._discard(con)
+            else:
+                self._idle.append((con, now))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "backend": self.dialect,
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "utilisation": round(self._in_use / self.size, 4) if self.size else 0,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": round(self._total_wait / self._checkouts * 1000, 3) if self._checkouts else 0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+                "connects": self._connects,
+                "recycled": self._recycled,
+                "failed_health_checks": self._failed_health_checks,
+            }
+
+    def prepare(self, sql, params):
+        """
+        Statement and parameters as the driver takes them
+        """
+        return sql, params or ()
+
+    def prepare_many(self, sql):
+        return sql
+
+    def stream_cursor(self, con):
+        return con.cursor(pymysql.cursors.SSDictCursor)
+
+    def insert_ignore_sql(self, table, columns):
+        return "INSERT IGNORE INTO {} ({}) VALUES ({})".format(table, ", ".join(columns), ", ".join(["%s"] * len(columns)))
+
+    def upsert_sql(self, table, columns, keys, update, expressions=None):
+        """
+        MySQL finds the conflicting row from any unique key, keys only matter to other backends
+        """
+        assignments = ["{0}=VALUES({0})".format(column) for column in update]
+        assignments += ["{}={}".format(column, expression) for column, expression in (expressions or {}).items()]
+        return "INSERT INTO {} ({}) VALUES ({}) ON DUPLICATE KEY UPDATE {}".format(
+            table, ", ".join(columns), ", ".join(["%s"] * len(columns)), ", ".join(assignments))
+
+    def table_names_sql(self):
+        return "SHOW TABLES"
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+def _reset_pools():
+    """
+    Drop pools inherited from a parent process without closing their sockets,
+    which are still owned by the parent
+    """
+    global _pools, _pools_lock, _pools_pid
+    _pools = {}
+    _pools_lock = threading.Lock()
+    _pools_pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools)
+
+
+def pool_class():
+    """
+    ConnectionPool for the configured DB_BACKEND
+    """
+    if config.DB_BACKEND == "sqlite":
+        from database.sqlite_database import SQLiteConnectionPool
+        return SQLiteConnectionPool
+    if config.DB_BACKEND != "mysql":
+        raise RuntimeError("Unknown DB_BACKEND {}, expected mysql or sqlite".format(config.DB_BACKEND))
+    return ConnectionPool
+
+
+def get_pool(name):
+    if _pools_pid != os.getpid():
+        _reset_pools()
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _pools[name] = pool_class()(name)
+    return pool
+
+
+def get_pool_stats():
+    return {name: pool.stats() for name, pool in list(_pools.items())}
+
+
+class Database:
+    """
+    One pooled connection to the configured backend for the duration of a transaction,
+    committed on a clean exit and rolled back otherwise
+    Statements use %s placeholders, a tuple parameter expands to a list for IN,
+    and insert_ignore and upsert leave their phrasing to the backend
+    """
+    def __init__(self, name):
+        self._pool = get_pool(name)
+        self._con = self._pool.acquire()
+        try:
+            self._cursor = self._con.cursor()
+        except BaseException:
+            # No Database to close yet, so the connection goes back here, dropped since it could not open a cursor
+            self._pool.release(self._con, discard=True)
+            raise
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+        self.close(commit=exc_type is None)
 
     @property
     def connection(self):
@@ -32,16 +293,56 @@ class Database:
     def cursor(self):
         return self._cursor
 
+    @property
+    def dialect(self):
+        return self._pool.dialect
+
     def commit(self):
         self.connection.commit()
 
     def close(self, commit=True):
-        if commit:
-            self.commit()
-        self.connection.close()
+        """
+        Finish the transaction and hand the connection back to the pool
+        """
+        broken = False
+        try:
+            if commit:
+                self.commit()
+            else:
+                self.connection.rollback()
+        except self._pool.Error:
+            broken = True
+            raise
+        finally:
+            try:
+                self._cursor.close()
+            except self._pool.Error:
+                broken = True
+            self._pool.release(self._con, discard=broken)
 
     def execute(self, sql, params=None):
-        self.cursor.execute(sql, params or ())
+        with db_query_duration.time(statement=statement_name(sql)):
+            self.cursor.execute(*self._pool.prepare(sql, params))
+
+    def executemany(self, sql, params):
+        with db_query_duration.time(statement=statement_name(sql)):
+            self.cursor.executemany(self._pool.prepare_many(sql), params)
+
+    def insert_ignore(self, table, columns, rows):
+        """
+        Insert rows, skipping any that would duplicate a primary or unique key
+        """
+        self.executemany(self._pool.insert_ignore_sql(table, columns), rows)
+
+    def upsert(self, table, columns, rows, keys, update, expressions=None):
+        """
+        Insert rows, for a row whose keys are already stored set the update columns to the new values instead
+        expressions sets further columns on update, e.g. {"fetched_at": "CURRENT_TIMESTAMP"}
+        """
+        self.executemany(self._pool.upsert_sql(table, columns, keys, update, expressions), rows)
+
+    def table_names(self):
+        return [list(row.values())[0] for row in self.query(self._pool.table_names_sql())]
 
     def fetchall(self):
         return self.cursor.fetchall()
@@ -50,5 +351,20 @@ class Database:
         return self.cursor.fetchone()
 
     def query(self, sql, params=None):
-        self.cursor.execute(sql, params or ())
-        return self.fetchall()
\ No newline at end of file
+        self.execute(sql, params)
+        return self.fetchall()
+
+    def stream(self, sql, params=None):
+        """
+        Yield rows one at a time from a server-side cursor instead of buffering the whole result
+        The connection cannot run other statements until the generator is exhausted or closed
+        """
+        cursor = self._pool.stream_cursor(self.connection)
+        try:
+            # Timed until the first rows are ready, the rest arrive as the caller reads them
+            with db_query_duration.time(statement=statement_name(sql)):
+                cursor.execute(*self._pool.prepare(sql, params))
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
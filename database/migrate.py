@@ -0,0 +1,236 @@
+"""
+Versioned schema migrations
+Run with: python -m database.migrate [status|up|down|check] [--to VERSION] [--database NAME]
+Each migration is a pair of files in database/migrations/<backend>, NNNN_name.up.sql and NNNN_name.down.sql,
+holding statements separated by semicolons. Applied versions are recorded in schema_migrations,
+and a version means the same schema on every backend
+MySQL commits DDL as it runs, so a version is recorded only once every statement of its step succeeded,
+a step that fails halfway has to be finished or undone by hand before running again
+SQLite runs a whole step in one transaction with foreign keys checked at its end, a step that fails leaves nothing behind
+"""
+import argparse
+import os
+import re
+import sys
+import config
+
+from collections import namedtuple
+from database.database import Database
+from database import queries
+
+MIGRATIONS_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "migrations", config.DB_BACKEND)
+MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.(up|down)\.sql$")
+
+Migration = namedtuple("Migration", ["version", "name", "up", "down"])
+
+
+class MigrationError(Exception):
+    pass
+
+
+def split_statements(sql):
+    """
+    Statements of a migration file, comment lines dropped
+    """
+    lines = [line for line in sql.splitlines() if not line.lstrip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def load_migrations(path=MIGRATIONS_PATH):
+    files = {}
+    for file_name in os.listdir(path):
+        match = MIGRATION_FILE.match(file_name)
+        if match is None:
+            continue
+        version, name, direction = int(match.group(1)), match.group(2), match.group(3)
+        with open(os.path.join(path, file_name)) as f:
+            files.setdefault((version, name), {})[direction] = split_statements(f.read())
+
+    migrations = []
+    for (version, name), steps in sorted(files.items()):
+        if "up" not in steps or "down" not in steps:
+            raise MigrationError("Migration {:04d}_{} needs both an up and a down file".format(version, name))
+        if migrations and migrations[-1].version == version:
+            raise MigrationError("Two migrations share version {}".format(version))
+        migrations.append(Migration(version, name, steps["up"], steps["down"]))
+    return migrations
+
+
+def ensure_version_table(database):
+    with Database(database) as db:
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+
+def applied_versions(database):
+    ensure_version_table(database)
+    with Database(database) as db:
+        return {row["version"] for row in db.query("SELECT version FROM schema_migrations")}
+
+
+def current_version(database):
+    return max(applied_versions(database), default=0)
+
+
+def run_step(database, migration, direction):
+    with Database(database) as db:
+        sqlite = db.dialect == "sqlite"
+        if sqlite:
+            # Off for the step so a table can be rebuilt under the rows that reference it, checked before the commit
+            db.execute("PRAGMA foreign_keys=OFF")
+        try:
+            if sqlite:
+                db.execute("BEGIN")
+            for statement in getattr(migration, direction):
+                db.execute(statement)
+            if direction == "up":
+                db.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", [migration.version, migration.name])
+            else:
+                db.execute("DELETE FROM schema_migrations WHERE version = %s", [migration.version])
+            if sqlite:
+                violations = db.query("PRAGMA foreign_key_check")
+                if violations:
+                    raise MigrationError("{:04d}_{} leaves {} rows with a missing parent in {}".format(
+                        migration.version, migration.name, len(violations), ", ".join(sorted({row["table"] for row in violations}))))
+                db.commit()
+        except Exception:
+            if sqlite:
+                # Foreign keys can only be turned back on outside a transaction
+                db.connection.rollback()
+            raise
+        finally:
+            if sqlite:
+                db.execute("PRAGMA foreign_keys=ON")
+
+
+def upgrade(database=config.DATABASE, target=None):
+    """
+    Apply every migration up to target, the latest when None, returns the versions applied
+    """
+    applied = applied_versions(database)
+    done = []
+    for migration in load_migrations():
+        if migration.version in applied or (target is not None and migration.version > target):
+            continue
+        print("Applying {:04d}_{}".format(migration.version, migration.name))
+        run_step(database, migration, "up")
+        done.append(migration.version)
+    return done
+
+
+def downgrade(database=config.DATABASE, target=None):
+    """
+    Revert applied migrations newer than target, only the latest one when None, returns the versions reverted
+    """
+    applied = applied_versions(database)
+    if target is None:
+        target = max(applied, default=1) - 1
+    done = []
+    for migration in reversed(load_migrations()):
+        if migration.version not in applied or migration.version <= target:
+            continue
+        print("Reverting {:04d}_{}".format(migration.version, migration.name))
+        run_step(database, migration, "down")
+        done.append(migration.version)
+    return done
+
+
+def status(database=config.DATABASE):
+    applied = applied_versions(database)
+    for migration in load_migrations():
+        print("{} {:04d}_{}".format("applied" if migration.version in applied else "pending", migration.version, migration.name))
+
+
+# (name, SQL, params, tables that are meant to be read in full) for the statements in database/queries.py,
+# with sample parameters. Plans only mean something on tables with realistic row counts,
+# e.g. a database seeded by benchmarks.api_benchmark
+CHECKED_QUERIES = [
+    ("tracked stocks", queries.TRACKED_STOCKS_BY_ID_SQL, [], {"stock_tracker"}),
+    ("tracked stock by symbol", queries.TRACKED_STOCK_BY_SYMBOL_SQL, ["AAPL"], set()),
+    ("tracked stocks page", queries.TRACKED_STOCKS_PAGE_SQL, [0, 100], set()),
+    ("tracked stocks by symbol", queries.TRACKED_STOCKS_IN_SQL, [("AAPL", "MSFT")], set()),
+    ("tracker state", queries.TRACKER_STATE_SQL, [], {"stock_tracker"}),
+    ("tracker state by symbol", queries.TRACKER_STATE_BY_SYMBOL_SQL, ["AAPL"], set()),
+    ("tracked symbols", queries.TRACKED_SYMBOLS_SQL, [], {"stock_tracker", "stock"}),
+    ("tracked stock ids", queries.TRACKED_STOCK_IDS_SQL, [], {"stock_tracker"}),
+    ("tracked stock ids by symbol", queries.TRACKED_STOCK_IDS_IN_SQL, [("AAPL", "MSFT")], set()),
+    ("replace tracked stock", queries.REPLACE_STOCK_TRACKER_SQL, [100, 5, 1, 1, 1], set()),
+    ("alert state", queries.ALERT_STATE_SQL, [], {"stock_alert_state"}),
+    ("alert state by stock", queries.ALERT_STATE_IN_SQL, [(1, 2)], set()),
+    ("stocks by symbol", queries.STOCKS_IN_SQL, [("AAPL", "MSFT")], set()),
+    ("profiles by symbol", queries.PROFILES_IN_SQL, [("AAPL", "MSFT")], set()),
+    ("stale profiles", queries.STALE_PROFILES_SQL, ["2026-01-01", 50], {"stock"}),
+    ("news coverage", queries.NEWS_COVERAGE_SQL, [("AAPL", "MSFT"), "2026-01-01", "2026-01-07"], set()),
+    ("news state", queries.NEWS_STATE_SQL, ["2026-01-01", "2026-01-07"], set()),
+    ("news state by symbol", queries.NEWS_STATE_BY_SYMBOL_SQL, ["2026-01-01", "2026-01-07", "AAPL"], set()),
+    ("stored news", queries.STORED_NEWS_SQL, [("AAPL", "MSFT"), 1767225600, 1767830400], set()),
+    ("quote history by symbol", queries.quote_points_sql(0, "AAPL"), [1767225600, 1767830400, "AAPL"], set()),
+    ("quote rollup by symbol", queries.quote_points_sql(60, "AAPL"), [60, 1767225600, 1767830400, "AAPL"], set()),
+    ("quote rollup range", queries.quote_points_sql(60), [60, 1767225600, 1767830400], set()),
+    ("quote rollup start", queries.QUOTE_ROLLUP_START_SQL, [60], set()),
+    ("quote rollup end", queries.QUOTE_ROLLUP_END_SQL, [60], set()),
+    ("quote history start", queries.QUOTE_HISTORY_START_SQL, [], set()),
+    ("alert workers", queries.ALERT_WORKERS_SQL, [], {"alert_worker"}),
+    ("alert shard leases", queries.SHARD_LEASES_SQL, [16], set()),
+]
+
+
+def sqlite_plan(db, sql, params, full_scans):
+    """
+    Tables SQLite reads row by row without an index, as in "SCAN stock", and the plan in one line
+    """
+    plan = db.query("EXPLAIN QUERY PLAN " + sql, params)
+    scans = []
+    for row in plan:
+        match = re.match(r"^SCAN (\w+)$", row["detail"])
+        if match and match.group(1) not in full_scans:
+            scans.append(match.group(1))
+    return scans, "; ".join(row["detail"] for row in plan)
+
+
+def check_query_plans(database=config.DATABASE):
+    """
+    EXPLAIN every checked query and report full table scans on tables not meant to be read in full
+    Returns the number of queries flagged
+    """
+    flagged = 0
+    with Database(database) as db:
+        for name, sql, params, full_scans in CHECKED_QUERIES:
+            if db.dialect == "sqlite":
+                scans, keys = sqlite_plan(db, sql, params, full_scans)
+            else:
+                plan = db.query("EXPLAIN " + sql, params)
+                scans = [row["table"] for row in plan if row.get("type") == "ALL" and row.get("table") not in full_scans]
+                keys = ", ".join("{}:{}".format(row.get("table"), row.get("key") or row.get("type")) for row in plan)
+            if scans:
+                flagged += 1
+                print("FULL SCAN {} on {} ({})".format(name, ", ".join(scans), keys))
+            else:
+                print("ok        {} ({})".format(name, keys))
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["status", "up", "down", "check"])
+    parser.add_argument("--to", type=int, help="target version, up defaults to the latest and down to one step back")
+    parser.add_argument("--database", default=config.DATABASE)
+    args = parser.parse_args()
+
+    if args.command == "up":
+        upgrade(args.database, args.to)
+    elif args.command == "down":
+        downgrade(args.database, args.to)
+    elif args.command == "check":
+        if check_query_plans(args.database):
+            sys.exit(1)
+    print("Schema version {}".format(current_version(args.database)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+DROP TABLE IF EXISTS stock_quote_rollup;
+DROP TABLE IF EXISTS stock_quote_history;
+DROP TABLE IF EXISTS stock_profile;
+DROP TABLE IF EXISTS stock_news_coverage;
+DROP TABLE IF EXISTS stock_news_symbol;
+DROP TABLE IF EXISTS stock_news;
+DROP TABLE IF EXISTS stock_alert_state;
+DROP TABLE IF EXISTS stock_tracker;
+DROP TABLE IF EXISTS stock;
@@ -0,0 +1,83 @@
+-- Schema created by database/setup.py before migrations, every table is created only when missing so existing databases are adopted as they are
+
+CREATE TABLE IF NOT EXISTS stock (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    symbol TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS stock_tracker (
+    id INTEGER PRIMARY KEY AUTO_INCREMENT,
+    avg_purchase_cost REAL NOT NULL,
+    percent REAL NOT NULL,
+    increase INTEGER,
+    decrease INTEGER,
+    last_modified TEXT DEFAULT CURRENT_TIMESTAMP(),
+    stock_id INTEGER NOT NULL UNIQUE,
+    FOREIGN KEY (stock_id) REFERENCES stock (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS stock_alert_state (
+    stock_id INTEGER PRIMARY KEY,
+    tracker_id INTEGER NOT NULL,
+    last_price REAL,
+    last_quote_time BIGINT,
+    last_direction VARCHAR(8),
+    FOREIGN KEY (stock_id) REFERENCES stock (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS stock_news (
+    id BIGINT PRIMARY KEY,
+    datetime BIGINT NOT NULL,
+    headline TEXT,
+    url TEXT,
+    source VARCHAR(255),
+    summary TEXT,
+    related VARCHAR(255),
+    category VARCHAR(64),
+    image TEXT
+);
+
+CREATE TABLE IF NOT EXISTS stock_news_symbol (
+    symbol VARCHAR(16) NOT NULL,
+    news_id BIGINT NOT NULL,
+    datetime BIGINT NOT NULL,
+    PRIMARY KEY (symbol, news_id),
+    INDEX symbol_datetime (symbol, datetime),
+    FOREIGN KEY (news_id) REFERENCES stock_news (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS stock_news_coverage (
+    symbol VARCHAR(16) NOT NULL,
+    day DATE NOT NULL,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (symbol, day)
+);
+
+CREATE TABLE IF NOT EXISTS stock_profile (
+    symbol VARCHAR(20) PRIMARY KEY,
+    profile JSON,
+    fetched_at DATETIME NOT NULL,
+    INDEX idx_stock_profile_fetched_at (fetched_at)
+);
+
+CREATE TABLE IF NOT EXISTS stock_quote_history (
+    symbol VARCHAR(20) NOT NULL,
+    t BIGINT NOT NULL,
+    price DOUBLE NOT NULL,
+    PRIMARY KEY (symbol, t),
+    INDEX idx_stock_quote_history_t (t)
+);
+
+CREATE TABLE IF NOT EXISTS stock_quote_rollup (
+    symbol VARCHAR(20) NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket BIGINT NOT NULL,
+    open DOUBLE NOT NULL,
+    high DOUBLE NOT NULL,
+    low DOUBLE NOT NULL,
+    close DOUBLE NOT NULL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (symbol, resolution, bucket),
+    INDEX idx_stock_quote_rollup_bucket (resolution, bucket)
+);
@@ -0,0 +1,10 @@
+DROP INDEX idx_stock_news_coverage_day ON stock_news_coverage;
+
+ALTER TABLE stock
+    DROP INDEX idx_stock_symbol_name,
+    DROP INDEX uq_stock_name,
+    DROP INDEX uq_stock_symbol,
+    MODIFY symbol TEXT NOT NULL,
+    MODIFY name TEXT NOT NULL,
+    ADD UNIQUE INDEX symbol (symbol),
+    ADD UNIQUE INDEX name (name);
@@ -0,0 +1,13 @@
+-- TEXT keys are enforced with a hash the optimizer cannot search, so every lookup by symbol scanned the stock table
+-- VARCHAR columns get B-tree keys, and (symbol, name) covers the symbol to id and name lookups
+ALTER TABLE stock
+    DROP INDEX symbol,
+    DROP INDEX name,
+    MODIFY symbol VARCHAR(20) NOT NULL,
+    MODIFY name VARCHAR(255) NOT NULL,
+    ADD UNIQUE INDEX uq_stock_symbol (symbol),
+    ADD UNIQUE INDEX uq_stock_name (name),
+    ADD INDEX idx_stock_symbol_name (symbol, name);
+
+-- News validators read coverage by day without a symbol
+CREATE INDEX idx_stock_news_coverage_day ON stock_news_coverage (day, symbol, fetched_at);
@@ -0,0 +1,2 @@
+DROP TABLE IF EXISTS alert_worker;
+DROP TABLE IF EXISTS alert_shard_lease;
@@ -0,0 +1,16 @@
+-- Shard leases for stocks/alert_worker.py: owner evaluates the shard's positions until expires_at (Unix seconds),
+-- token changes with every new owner so a worker that lost its lease cannot commit alert state,
+-- renewals changes with every write so a renewal within the same instant still counts as an affected row
+CREATE TABLE IF NOT EXISTS alert_shard_lease (
+    shard INTEGER PRIMARY KEY,
+    owner VARCHAR(255),
+    token BIGINT NOT NULL DEFAULT 0,
+    expires_at DOUBLE NOT NULL DEFAULT 0,
+    renewals BIGINT NOT NULL DEFAULT 0
+);
+
+-- Workers seen recently, each claims an even share of the shards
+CREATE TABLE IF NOT EXISTS alert_worker (
+    worker_id VARCHAR(255) PRIMARY KEY,
+    seen_at DOUBLE NOT NULL
+);
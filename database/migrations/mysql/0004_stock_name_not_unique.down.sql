@@ -0,0 +1,2 @@
+-- Fails while two stocks share a name, remove one of them first
+ALTER TABLE stock ADD UNIQUE INDEX uq_stock_name (name);
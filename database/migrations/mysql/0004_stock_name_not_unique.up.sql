@@ -0,0 +1,2 @@
+-- Share classes such as GOOG and GOOGL carry the same company name, only the symbol identifies a stock
+ALTER TABLE stock DROP INDEX uq_stock_name;
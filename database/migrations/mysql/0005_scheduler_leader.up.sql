@@ -0,0 +1,9 @@
+-- Scheduler leadership for stocks/scheduler.py: only owner runs exclusive jobs, it renews expires_at (Unix seconds) every tick
+-- and another process takes over once it lapses. renewals changes with every write so a renewal within the same instant
+-- still counts as an affected row
+CREATE TABLE IF NOT EXISTS scheduler_leader (
+    name VARCHAR(64) PRIMARY KEY,
+    owner VARCHAR(255),
+    expires_at DOUBLE NOT NULL DEFAULT 0,
+    renewals BIGINT NOT NULL DEFAULT 0
+);
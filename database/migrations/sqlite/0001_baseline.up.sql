@@ -0,0 +1,89 @@
+-- The MySQL baseline in SQLite types: INTEGER PRIMARY KEY is the rowid, JSON is kept as TEXT
+-- and DATE, DATETIME and TIMESTAMP columns are read back as Python dates by database/sqlite_database.py
+
+CREATE TABLE IF NOT EXISTS stock (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- AUTOINCREMENT never reuses an id, REPLACE INTO has to give a changed position a new one
+CREATE TABLE IF NOT EXISTS stock_tracker (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    avg_purchase_cost REAL NOT NULL,
+    percent REAL NOT NULL,
+    increase INTEGER,
+    decrease INTEGER,
+    last_modified TEXT DEFAULT CURRENT_TIMESTAMP,
+    stock_id INTEGER NOT NULL UNIQUE,
+    FOREIGN KEY (stock_id) REFERENCES stock (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS stock_alert_state (
+    stock_id INTEGER PRIMARY KEY,
+    tracker_id INTEGER NOT NULL,
+    last_price REAL,
+    last_quote_time BIGINT,
+    last_direction VARCHAR(8),
+    FOREIGN KEY (stock_id) REFERENCES stock (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS stock_news (
+    id BIGINT PRIMARY KEY,
+    datetime BIGINT NOT NULL,
+    headline TEXT,
+    url TEXT,
+    source VARCHAR(255),
+    summary TEXT,
+    related VARCHAR(255),
+    category VARCHAR(64),
+    image TEXT
+);
+
+CREATE TABLE IF NOT EXISTS stock_news_symbol (
+    symbol VARCHAR(16) NOT NULL,
+    news_id BIGINT NOT NULL,
+    datetime BIGINT NOT NULL,
+    PRIMARY KEY (symbol, news_id),
+    FOREIGN KEY (news_id) REFERENCES stock_news (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS symbol_datetime ON stock_news_symbol (symbol, datetime);
+
+CREATE TABLE IF NOT EXISTS stock_news_coverage (
+    symbol VARCHAR(16) NOT NULL,
+    day DATE NOT NULL,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (symbol, day)
+);
+
+CREATE TABLE IF NOT EXISTS stock_profile (
+    symbol VARCHAR(20) PRIMARY KEY,
+    profile TEXT,
+    fetched_at DATETIME NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_profile_fetched_at ON stock_profile (fetched_at);
+
+CREATE TABLE IF NOT EXISTS stock_quote_history (
+    symbol VARCHAR(20) NOT NULL,
+    t BIGINT NOT NULL,
+    price DOUBLE NOT NULL,
+    PRIMARY KEY (symbol, t)
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_quote_history_t ON stock_quote_history (t);
+
+CREATE TABLE IF NOT EXISTS stock_quote_rollup (
+    symbol VARCHAR(20) NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket BIGINT NOT NULL,
+    open DOUBLE NOT NULL,
+    high DOUBLE NOT NULL,
+    low DOUBLE NOT NULL,
+    close DOUBLE NOT NULL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (symbol, resolution, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_quote_rollup_bucket ON stock_quote_rollup (resolution, bucket);
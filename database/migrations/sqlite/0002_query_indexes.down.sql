@@ -0,0 +1,2 @@
+DROP INDEX idx_stock_news_coverage_day;
+DROP INDEX idx_stock_symbol_name;
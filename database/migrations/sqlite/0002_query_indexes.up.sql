@@ -0,0 +1,6 @@
+-- Same version as the MySQL migration, SQLite already keys TEXT columns with a B-tree so only the new indexes apply
+-- (symbol, name) covers the symbol to id and name lookups
+CREATE INDEX idx_stock_symbol_name ON stock (symbol, name);
+
+-- News validators read coverage by day without a symbol
+CREATE INDEX idx_stock_news_coverage_day ON stock_news_coverage (day, symbol, fetched_at);
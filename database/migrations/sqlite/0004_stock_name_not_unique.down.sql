@@ -0,0 +1,10 @@
+-- Fails while two stocks share a name, remove one of them first
+CREATE TABLE stock_rebuilt (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL UNIQUE
+);
+INSERT INTO stock_rebuilt (id, symbol, name) SELECT id, symbol, name FROM stock;
+DROP TABLE stock;
+ALTER TABLE stock_rebuilt RENAME TO stock;
+CREATE INDEX idx_stock_symbol_name ON stock (symbol, name);
@@ -0,0 +1,12 @@
+-- Share classes such as GOOG and GOOGL carry the same company name, only the symbol identifies a stock
+-- SQLite cannot drop an inline UNIQUE, so the table is rebuilt; database/migrate.py turns foreign keys off
+-- for the step, ids are copied so stock_tracker and stock_alert_state keep pointing at the same rows
+CREATE TABLE stock_rebuilt (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL
+);
+INSERT INTO stock_rebuilt (id, symbol, name) SELECT id, symbol, name FROM stock;
+DROP TABLE stock;
+ALTER TABLE stock_rebuilt RENAME TO stock;
+CREATE INDEX idx_stock_symbol_name ON stock (symbol, name);
@@ -0,0 +1,543 @@
+import json
+import config
+
+from database.database import Database
+from database.async_database import AsyncDatabase
+
+TRACKED_STOCKS_SQL = """
+    SELECT stock_tracker.id, stock_tracker.avg_purchase_cost, stock_tracker.percent,
+           stock_tracker.increase, stock_tracker.decrease, stock_tracker.last_modified,
+           stock_tracker.stock_id, stock.symbol, stock.name
+    FROM stock_tracker
+    JOIN stock ON stock.id = stock_tracker.stock_id
+"""
+
+TRACKER_STATE_SQL = """
+    SELECT COUNT(*) AS tracked, BIT_XOR(stock_tracker.id) AS ids,
+           UNIX_TIMESTAMP(MAX(stock_tracker.last_modified)) AS last_modified
+    FROM stock_tracker
+    JOIN stock ON stock.id = stock_tracker.stock_id
+"""
+
+# The statements below are EXPLAIN-checked by database.migrate check, which imports them
+TRACKED_STOCKS_BY_ID_SQL = TRACKED_STOCKS_SQL + " ORDER BY stock_tracker.id"
+TRACKED_STOCK_BY_SYMBOL_SQL = TRACKED_STOCKS_SQL + " WHERE stock.symbol=%s"
+TRACKED_STOCKS_PAGE_SQL = TRACKED_STOCKS_SQL + " WHERE stock_tracker.id > %s ORDER BY stock_tracker.id LIMIT %s"
+TRACKED_STOCKS_IN_SQL = TRACKED_STOCKS_SQL + " WHERE stock.symbol IN %s"
+TRACKER_STATE_BY_SYMBOL_SQL = TRACKER_STATE_SQL + " WHERE stock.symbol=%s"
+
+TRACKED_SYMBOLS_SQL = "SELECT DISTINCT stock.symbol FROM stock_tracker JOIN stock ON stock.id = stock_tracker.stock_id"
+TRACKED_STOCK_IDS_SQL = "SELECT stock.symbol, stock.id FROM stock_tracker JOIN stock ON stock.id = stock_tracker.stock_id"
+TRACKED_STOCK_IDS_IN_SQL = TRACKED_STOCK_IDS_SQL + " WHERE stock.symbol IN %s"
+
+REPLACE_STOCK_TRACKER_SQL = """
+    REPLACE INTO stock_tracker (avg_purchase_cost, percent, increase, decrease, stock_id) VALUES (%s, %s, %s, %s, %s)
+"""
+
+ALERT_STATE_SQL = "SELECT stock_id, tracker_id, last_price, last_quote_time, last_direction FROM stock_alert_state"
+ALERT_STATE_IN_SQL = ALERT_STATE_SQL + " WHERE stock_id IN %s"
+
+STOCKS_IN_SQL = "SELECT id, symbol, name FROM stock WHERE symbol IN %s"
+PROFILES_IN_SQL = "SELECT symbol, profile, fetched_at FROM stock_profile WHERE symbol IN %s"
+
+STALE_PROFILES_SQL = """
+    SELECT stock.symbol, stock_profile.fetched_at
+    FROM stock LEFT JOIN stock_profile ON stock_profile.symbol = stock.symbol
+    WHERE stock_profile.symbol IS NULL
+    UNION
+    SELECT symbol, fetched_at FROM stock_profile
+    WHERE profile IS NOT NULL AND fetched_at < %s
+    ORDER BY fetched_at
+    LIMIT %s
+"""
+
+NEWS_COVERAGE_SQL = "SELECT symbol, day FROM stock_news_coverage WHERE symbol IN %s AND day BETWEEN %s AND %s"
+
+NEWS_STATE_SQL = """
+    SELECT COUNT(*) AS days, UNIX_TIMESTAMP(MAX(fetched_at)) AS fetched_at
+    FROM stock_news_coverage WHERE day BETWEEN %s AND %s
+"""
+NEWS_STATE_BY_SYMBOL_SQL = NEWS_STATE_SQL + " AND symbol=%s"
+
+STORED_NEWS_SQL = """
+    SELECT stock_news_symbol.symbol, stock_news.*
+    FROM stock_news_symbol
+    JOIN stock_news ON stock_news.id = stock_news_symbol.news_id
+    WHERE stock_news_symbol.symbol IN %s
+      AND stock_news_symbol.datetime >= %s AND stock_news_symbol.datetime < %s
+    ORDER BY stock_news_symbol.symbol, stock_news_symbol.datetime DESC
+"""
+
+QUOTE_ROLLUP_POINTS_SQL = """
+    SELECT symbol, bucket, open, high, low, close, samples FROM stock_quote_rollup
+    WHERE resolution = %s AND bucket >= %s AND bucket < %s
+"""
+QUOTE_HISTORY_POINTS_SQL = """
+    SELECT symbol, t AS bucket, price AS open, price AS high, price AS low, price AS close, 1 AS samples
+    FROM stock_quote_history WHERE t >= %s AND t < %s
+"""
+QUOTE_ROLLUP_START_SQL = "SELECT MIN(bucket) AS bucket FROM stock_quote_rollup WHERE resolution = %s"
+QUOTE_HISTORY_START_SQL = "SELECT MIN(t) AS bucket FROM stock_quote_history"
+QUOTE_ROLLUP_END_SQL = "SELECT MAX(bucket) AS bucket FROM stock_quote_rollup WHERE resolution = %s"
+
+ALERT_WORKERS_SQL = "SELECT COUNT(*) AS workers FROM alert_worker"
+SHARD_LEASES_SQL = "SELECT shard, owner, token, expires_at FROM alert_shard_lease WHERE shard < %s ORDER BY shard"
+
+
+def fetch_tracked_stocks(symbol=None):
+    """
+    Load tracked stocks joined with their symbol and name in a single query
+    Returns [None] when a symbol is given but not tracked
+    """
+    with Database(config.DATABASE) as db:
+        if symbol:
+            db.execute(TRACKED_STOCK_BY_SYMBOL_SQL, [symbol])
+            return [db.fetchone()]
+        return db.query(TRACKED_STOCKS_BY_ID_SQL)
+
+
+def fetch_tracked_stocks_page(after_id, limit):
+    """
+    Up to limit tracked stocks with an id greater than after_id, in id order
+    Keyset pagination: each page is an index range scan on the primary key, however deep it is
+    """
+    with Database(config.DATABASE) as db:
+        return db.query(TRACKED_STOCKS_PAGE_SQL, [after_id or 0, limit])
+
+
+def stream_tracked_stocks(symbol=None):
+    """
+    Same rows as fetch_tracked_stocks, streamed from a server-side cursor
+    """
+    if symbol:
+        yield from fetch_tracked_stocks(symbol)
+        return
+
+    with Database(config.DATABASE) as db:
+        yield from db.stream(TRACKED_STOCKS_BY_ID_SQL)
+
+
+def fetch_tracked_symbols():
+    with Database(config.DATABASE) as db:
+        rows = db.query(TRACKED_SYMBOLS_SQL)
+    return [row["symbol"] for row in rows]
+
+
+def fetch_tracked_stock_ids(symbols=None):
+    """
+    {symbol: stock_id} of the tracked stocks, or of those among symbols
+    """
+    stock_ids = {}
+    with Database(config.DATABASE) as db:
+        if symbols is None:
+            return {row["symbol"]: row["id"] for row in db.query(TRACKED_STOCK_IDS_SQL)}
+        symbols = list(symbols)
+        for i in range(0, len(symbols), config.QUERY_IN_BATCH_SIZE):
+            batch = tuple(symbols[i:i + config.QUERY_IN_BATCH_SIZE])
+            for row in db.query(TRACKED_STOCK_IDS_IN_SQL, [batch]):
+                stock_ids[row["symbol"]] = row["id"]
+    return stock_ids
+
+
+def fetch_tracked_stocks_in(symbols):
+    """
+    Tracked stocks among symbols, in id order, looked up by symbol a batch at a time
+    """
+    symbols = list(symbols)
+    positions = []
+    with Database(config.DATABASE) as db:
+        for i in range(0, len(symbols), config.QUERY_IN_BATCH_SIZE):
+            batch = tuple(symbols[i:i + config.QUERY_IN_BATCH_SIZE])
+            positions.extend(db.query(TRACKED_STOCKS_IN_SQL, [batch]))
+    positions.sort(key=lambda position: position["id"])
+    return positions
+
+
+def fetch_alert_state(stock_ids=None):
+    """
+    Alert state of every position, or of the positions of stock_ids
+    """
+    with Database(config.DATABASE) as db:
+        if stock_ids is None:
+            return db.query(ALERT_STATE_SQL)
+        stock_ids = list(stock_ids)
+        rows = []
+        for i in range(0, len(stock_ids), config.QUERY_IN_BATCH_SIZE):
+            rows.extend(db.query(ALERT_STATE_IN_SQL, [tuple(stock_ids[i:i + config.QUERY_IN_BATCH_SIZE])]))
+        return rows
+
+
+def save_alert_state(rows):
+    """
+    Upsert (stock_id, tracker_id, last_price, last_quote_time, last_direction) rows in one batch
+    """
+    if not rows:
+        return
+    with Database(config.DATABASE) as db:
+        db.upsert("stock_alert_state", ["stock_id", "tracker_id", "last_price", "last_quote_time", "last_direction"], rows,
+                  keys=["stock_id"], update=["tracker_id", "last_price", "last_quote_time", "last_direction"])
+
+
+def save_shard_alert_state(rows, shard, worker_id, token, expires_at):
+    """
+    save_alert_state for a shard, committed only while worker_id still holds the lease it took with token,
+    which is extended to expires_at. Returns whether the state was saved
+    """
+    with Database(config.DATABASE) as db:
+        db.execute("""
+            UPDATE alert_shard_lease SET expires_at = %s, renewals = renewals + 1
+            WHERE shard = %s AND owner = %s AND token = %s
+        """, [expires_at, shard, worker_id, token])
+        if db.cursor.rowcount != 1:
+            return False
+        if rows:
+            db.upsert("stock_alert_state", ["stock_id", "tracker_id", "last_price", "last_quote_time", "last_direction"], rows,
+                      keys=["stock_id"], update=["tracker_id", "last_price", "last_quote_time", "last_direction"])
+        return True
+
+
+def register_alert_worker(worker_id, now, ttl):
+    """
+    Record worker_id as alive at now and forget workers not seen for ttl,
+    returns the number of live workers
+    """
+    with Database(config.DATABASE) as db:
+        db.upsert("alert_worker", ["worker_id", "seen_at"], [(worker_id, now)], keys=["worker_id"], update=["seen_at"])
+        db.execute("DELETE FROM alert_worker WHERE seen_at < %s", [now - ttl])
+        return db.query(ALERT_WORKERS_SQL)[0]["workers"]
+
+
+def remove_alert_worker(worker_id):
+    """
+    Drop a stopping worker and release its leases, so the others take its shards on their next run
+    """
+    with Database(config.DATABASE) as db:
+        db.execute("DELETE FROM alert_worker WHERE worker_id = %s", [worker_id])
+        db.execute("UPDATE alert_shard_lease SET owner = NULL, expires_at = 0, renewals = renewals + 1 WHERE owner = %s",
+                   [worker_id])
+
+
+def claim_alert_shards(worker_id, shards, share, now, expires_at, start=0):
+    """
+    Renew worker_id's leases and take free or expired shards until it holds share of them,
+    leases beyond share are given up for workers that joined since. Free shards are tried from start on
+    Every takeover is a compare and set on the token read, so two workers never both win a shard
+    Returns {shard: token} for the leases held
+    """
+    held = {}
+    with Database(config.DATABASE) as db:
+        db.insert_ignore("alert_shard_lease", ["shard"], [(shard,) for shard in range(shards)])
+        rows = db.query(SHARD_LEASES_SQL, [shards])
+
+        owned = [row for row in rows if row["owner"] == worker_id and row["expires_at"] >= now]
+        for row in owned[share:]:
+            db.execute("""
+                UPDATE alert_shard_lease SET owner = NULL, expires_at = 0, renewals = renewals + 1
+                WHERE shard = %s AND owner = %s AND token = %s
+            """, [row["shard"], worker_id, row["token"]])
+        for row in owned[:share]:
+            db.execute("""
+                UPDATE alert_shard_lease SET expires_at = %s, renewals = renewals + 1
+                WHERE shard = %s AND owner = %s AND token = %s
+            """, [expires_at, row["shard"], worker_id, row["token"]])
+            if db.cursor.rowcount == 1:
+                held[row["shard"]] = row["token"]
+
+        free = [row for row in rows if row["owner"] is None or row["expires_at"] < now]
+        start = start % len(free) if free else 0
+        for row in free[start:] + free[:start]:
+            if len(held) >= share:
+                break
+            db.execute("""
+                UPDATE alert_shard_lease SET owner = %s, token = token + 1, expires_at = %s, renewals = renewals + 1
+                WHERE shard = %s AND token = %s AND (owner IS NULL OR expires_at < %s)
+            """, [worker_id, expires_at, row["shard"], row["token"], now])
+            if db.cursor.rowcount == 1:
+                held[row["shard"]] = row["token"] + 1
+    return held
+
+
+def claim_scheduler_leader(name, owner, now, expires_at):
+    """
+    Take or renew the leadership of name for owner until expires_at, returns whether owner leads
+    A lapsed leadership is taken over with a compare and set, so two processes never both lead
+    """
+    with Database(config.DATABASE) as db:
+        db.insert_ignore("scheduler_leader", ["name"], [(name,)])
+        db.execute("""
+            UPDATE scheduler_leader SET owner = %s, expires_at = %s, renewals = renewals + 1
+            WHERE name = %s AND (owner = %s OR owner IS NULL OR expires_at < %s)
+        """, [owner, expires_at, name, owner, now])
+        return db.cursor.rowcount == 1
+
+
+def release_scheduler_leader(name, owner):
+    """
+    Give up the leadership of name, so another process takes it on its next tick
+    """
+    with Database(config.DATABASE) as db:
+        db.execute("""
+            UPDATE scheduler_leader SET owner = NULL, expires_at = 0, renewals = renewals + 1
+            WHERE name = %s AND owner = %s
+        """, [name, owner])
+
+
+NEWS_COLUMNS = ["id", "datetime", "headline", "url", "source", "summary", "related", "category", "image"]
+
+
+def fetch_news_coverage(symbols, from_date, to_date):
+    """
+    Days already fetched for each symbol within the range
+    """
+    coverage = {}
+    with Database(config.DATABASE) as db:
+        rows = db.query(NEWS_COVERAGE_SQL, [tuple(symbols), from_date, to_date])
+    for row in rows:
+        coverage.setdefault(row["symbol"], set()).add(row["day"])
+    return coverage
+
+
+def save_news(articles_by_symbol, covered_days):
+    """
+    Store articles once by id, link them to the symbols they were fetched for
+    and record the (symbol, day) pairs that are now complete, in one transaction
+    """
+    articles = {}
+    links = []
+    for symbol, symbol_articles in articles_by_symbol.items():
+        for article in symbol_articles:
+            articles[article["id"]] = [article.get(column) for column in NEWS_COLUMNS]
+            links.append((symbol, article["id"], article["datetime"]))
+
+    with Database(config.DATABASE) as db:
+        if articles:
+            db.upsert("stock_news", NEWS_COLUMNS, list(articles.values()), keys=["id"], update=NEWS_COLUMNS[1:])
+            db.insert_ignore("stock_news_symbol", ["symbol", "news_id", "datetime"], links)
+        if covered_days:
+            db.upsert("stock_news_coverage", ["symbol", "day"], covered_days, keys=["symbol", "day"], update=[],
+                      expressions={"fetched_at": "CURRENT_TIMESTAMP"})
+
+
+def fetch_stored_news(symbols, start_timestamp, end_timestamp):
+    """
+    Stored articles for each symbol published in [start_timestamp, end_timestamp), newest first
+    """
+    news = {symbol: [] for symbol in symbols}
+    with Database(config.DATABASE) as db:
+        rows = db.query(STORED_NEWS_SQL, [tuple(symbols), start_timestamp, end_timestamp])
+    for row in rows:
+        news[row.pop("symbol")].append(row)
+    return news
+
+
+def fetch_stocks_by_symbol(symbols):
+    """
+    Known stocks for the given symbols as {symbol: row}
+    """
+    stocks = {}
+    if not symbols:
+        return stocks
+    with Database(config.DATABASE) as db:
+        for i in range(0, len(symbols), config.QUERY_IN_BATCH_SIZE):
+            batch = tuple(symbols[i:i + config.QUERY_IN_BATCH_SIZE])
+            for row in db.query(STOCKS_IN_SQL, [batch]):
+                stocks[row["symbol"]] = row
+    return stocks
+
+
+def store_tracked_stocks(stock_rows, tracker_rows):
+    """
+    Insert missing stocks and replace their tracker rows in a single transaction
+    stock_rows are (symbol, name), tracker_rows are (symbol, avg_purchase_cost, percent, increase, decrease)
+    Nothing is written if any statement fails
+    Returns the symbols that have no stock row after the insert, their tracker rows are left out
+    """
+    with Database(config.DATABASE) as db:
+        if stock_rows:
+            db.insert_ignore("stock", ["symbol", "name"], stock_rows)
+
+        symbols = list(dict.fromkeys(row[0] for row in tracker_rows))
+        stock_ids = {}
+        for i in range(0, len(symbols), config.QUERY_IN_BATCH_SIZE):
+            batch = tuple(symbols[i:i + config.QUERY_IN_BATCH_SIZE])
+            for row in db.query(STOCKS_IN_SQL, [batch]):
+                stock_ids[row["symbol"]] = row["id"]
+
+        rows = [row[1:] + (stock_ids[row[0]],) for row in tracker_rows if row[0] in stock_ids]
+        if rows:
+            db.executemany(REPLACE_STOCK_TRACKER_SQL, rows)
+    return [symbol for symbol in symbols if symbol not in stock_ids]
+
+
+def fetch_profiles(symbols):
+    """
+    Stored profiles as {symbol: (profile, fetched_at)}, profile is None for symbols without one
+    Stocks tracked before profiles were stored fall back to their name with fetched_at None
+    """
+    profiles = {}
+    if not symbols:
+        return profiles
+    with Database(config.DATABASE) as db:
+        for i in range(0, len(symbols), config.QUERY_IN_BATCH_SIZE):
+            batch = tuple(symbols[i:i + config.QUERY_IN_BATCH_SIZE])
+            for row in db.query(PROFILES_IN_SQL, [batch]):
+                profiles[row["symbol"]] = (json.loads(row["profile"]) if row["profile"] else None, row["fetched_at"])
+            for row in db.query(STOCKS_IN_SQL, [batch]):
+                profiles.setdefault(row["symbol"], ({"ticker": row["symbol"], "name": row["name"]}, None))
+    return profiles
+
+
+def save_profiles(rows):
+    """
+    Upsert (symbol, profile, fetched_at) rows, profile None records a symbol without a profile
+    """
+    with Database(config.DATABASE) as db:
+        db.upsert("stock_profile", ["symbol", "profile", "fetched_at"], [(symbol, json.dumps(profile) if profile is not None else None, fetched_at) for symbol, profile, fetched_at in rows],
+                  keys=["symbol"], update=["profile", "fetched_at"])
+
+
+def fetch_stale_profile_symbols(fetched_before, limit):
+    """
+    Tracked or stored symbols whose profile is missing or older than fetched_before,
+    missing ones first since MySQL and SQLite sort NULL before any date
+    """
+    with Database(config.DATABASE) as db:
+        rows = db.query(STALE_PROFILES_SQL, [fetched_before, limit])
+    return [row["symbol"] for row in rows]
+
+
+def save_quote_history(rows):
+    """
+    Append (symbol, t, price) rows, a quote already stored for the same trade time is skipped
+    """
+    with Database(config.DATABASE) as db:
+        db.insert_ignore("stock_quote_history", ["symbol", "t", "price"], rows)
+
+
+def stream_quote_points(resolution, start, end, symbol=None):
+    """
+    OHLC points with bucket in [start, end) ordered by symbol and time, streamed from a server-side cursor
+    resolution 0 reads raw quotes, where every price is its own point
+    """
+    params = [resolution, start, end] if resolution else [start, end]
+    if symbol:
+        params.append(symbol)
+    with Database(config.DATABASE) as db:
+        yield from db.stream(quote_points_sql(resolution, symbol), params)
+
+
+def quote_points_sql(resolution, symbol=None):
+    """
+    Statement for stream_quote_points, which takes (resolution,) start, end (, symbol)
+    """
+    sql = QUOTE_ROLLUP_POINTS_SQL if resolution else QUOTE_HISTORY_POINTS_SQL
+    if symbol:
+        sql += " AND symbol = %s"
+    return sql + " ORDER BY symbol, bucket"
+
+
+def save_quote_rollups(resolution, rows):
+    """
+    Upsert (symbol, bucket, open, high, low, close, samples) rows for a resolution
+    """
+    resolution = int(resolution)
+    with Database(config.DATABASE) as db:
+        db.upsert("stock_quote_rollup", ["symbol", "resolution", "bucket", "open", "high", "low", "close", "samples"],
+                  [(row[0], resolution) + tuple(row[1:]) for row in rows],
+                  keys=["symbol", "resolution", "bucket"], update=["open", "high", "low", "close", "samples"])
+
+
+def fetch_quote_points_start(resolution):
+    """
+    Earliest bucket stored at a resolution, resolution 0 reads raw quotes, None when there are none
+    """
+    with Database(config.DATABASE) as db:
+        if resolution:
+            row = db.query(QUOTE_ROLLUP_START_SQL, [resolution])[0]
+        else:
+            row = db.query(QUOTE_HISTORY_START_SQL)[0]
+    return row["bucket"]
+
+
+def fetch_last_rollup_bucket(resolution):
+    with Database(config.DATABASE) as db:
+        row = db.query(QUOTE_ROLLUP_END_SQL, [resolution])[0]
+    return row["bucket"]
+
+
+def delete_quote_points_before(resolution, before, limit):
+    """
+    Delete up to limit points older than before, returns the number of rows deleted
+    SQLite has no DELETE ... LIMIT, it picks the rows by rowid instead
+    """
+    if resolution:
+        table, where, params = "stock_quote_rollup", "resolution = %s AND bucket < %s", [resolution, before, limit]
+    else:
+        table, where, params = "stock_quote_history", "t < %s", [before, limit]
+    with Database(config.DATABASE) as db:
+        if db.dialect == "sqlite":
+            db.execute("DELETE FROM {0} WHERE rowid IN (SELECT rowid FROM {0} WHERE {1} LIMIT %s)".format(table, where), params)
+        else:
+            db.execute("DELETE FROM {} WHERE {} LIMIT %s".format(table, where), params)
+        return db.cursor.rowcount
+
+
+def fetch_tracker_state(symbol=None):
+    """
+    Cheap fingerprint of the tracked stocks for HTTP validators
+    REPLACE INTO gives a changed position a new id, so the XOR of ids changes along with the count
+    """
+    with Database(config.DATABASE) as db:
+        if symbol:
+            return db.query(TRACKER_STATE_BY_SYMBOL_SQL, [symbol])[0]
+        return db.query(TRACKER_STATE_SQL)[0]
+
+
+def fetch_news_state(from_date, to_date, symbol=None):
+    """
+    Fingerprint of the stored news coverage for the date range
+    """
+    with Database(config.DATABASE) as db:
+        if symbol:
+            return db.query(NEWS_STATE_BY_SYMBOL_SQL, [from_date, to_date, symbol])[0]
+        return db.query(NEWS_STATE_SQL, [from_date, to_date])[0]
+
+
+async def fetch_tracked_stocks_async(symbol=None):
+    """
+    fetch_tracked_stocks for the async serving mode
+    """
+    async with AsyncDatabase(config.DATABASE) as db:
+        if symbol:
+            rows = await db.query(TRACKED_STOCK_BY_SYMBOL_SQL, [symbol])
+            return [rows[0] if rows else None]
+        return await db.query(TRACKED_STOCKS_BY_ID_SQL)
+
+
+async def stream_tracked_stocks_async(symbol=None):
+    """
+    stream_tracked_stocks for the async serving mode, an untracked symbol yields no rows
+    """
+    async with AsyncDatabase(config.DATABASE) as db:
+        if symbol:
+            rows = db.stream(TRACKED_STOCK_BY_SYMBOL_SQL, [symbol])
+        else:
+            rows = db.stream(TRACKED_STOCKS_BY_ID_SQL)
+        try:
+            async for row in rows:
+                yield row
+        finally:
+            # Close the cursor before the transaction ends, also when the reader stops early
+            await rows.aclose()
+
+
+async def fetch_tracked_stocks_page_async(after_id, limit):
+    async with AsyncDatabase(config.DATABASE) as db:
+        return await db.query(TRACKED_STOCKS_PAGE_SQL, [after_id or 0, limit])
+
+
+async def fetch_tracker_state_async(symbol=None):
+    async with AsyncDatabase(config.DATABASE) as db:
+        if symbol:
+            return (await db.query(TRACKER_STATE_BY_SYMBOL_SQL, [symbol]))[0]
+        return (await db.query(TRACKER_STATE_SQL))[0]
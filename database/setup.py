@@ -1,17 +1,23 @@
+"""
+Create the database and bring its schema to the latest migration
+Run with: python -m database.setup, see database/migrate.py to move between schema versions
+With DB_BACKEND=sqlite the database file is created on first connection, only the migrations run
+"""
 import pymysql
 import pymysql.cursors
 import os
+import config
 
 from pymysql import Error
 from dotenv import load_dotenv
+from database.migrate import upgrade
 
 load_dotenv()
 
-PATH = os.path.dirname(os.path.realpath(__file__))
 STOCKS_DB_PASSWORD = os.getenv("STOCKS_DB_PASSWORD")
 
 def create_database(conn, database):
-    sql_statement = "CREATE DATABASE IF NOT EXISTS " + database  
+    sql_statement = "CREATE DATABASE IF NOT EXISTS " + database
     try:
         c = conn.cursor()
         c.execute(sql_statement)
@@ -23,8 +29,8 @@ def create_database(conn, database):
     return conn
 
 def create_connection(database):
-    """ 
-    Create a database connection to the SQLite database specified by db_file
+    """
+    Create a database connection, to the server only when database is None
     """
     conn = None
     try:
@@ -42,41 +48,18 @@ def create_connection(database):
     return conn
 
 
-def create_tables(conn, sql_file_name):
-    """ 
-    Create a table from the create_table_sql statement
-    """
-    try:
-        c = conn.cursor()
-        execute_script_from_file(c, sql_file_name)
-    except Error as e:
-        print("create table error")
-        print(e)
-
-
-def execute_script_from_file(c, filename):
-    sql_file = open(filename, "r")
-    command = sql_file.read()
-    sql_file.close()
-
-    try:
-        c.execute(command)
-    except Error:
-        print("Command skipped: {}".format(command))
-
-
-def main():
-    database = "stocks"
-    create_stock_table_file = PATH + "/create_stock_table.sql" 
-    create_stock_tracker_file = PATH + "/create_stock_tracker_table.sql" 
+def main(database=config.DATABASE):
+    if config.DB_BACKEND == "sqlite":
+        upgrade(database)
+        return
 
-    conn = create_connection(database)
+    conn = create_connection(None)
     if conn is None:
         print("Error! cannot create the database connection.")
     else:
         create_database(conn, database)
-        create_tables(conn, create_stock_table_file)
-        create_tables(conn, create_stock_tracker_file)
+        conn.close()
+        upgrade(database)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,164 @@
+"""
+Embedded SQLite backend, selected with DB_BACKEND=sqlite
+Runs the same statements as MySQL: %s placeholders are rewritten, and the MySQL functions the queries
+use are registered on every connection. File databases use WAL so readers never wait for the writer,
+SQLITE_PATH=:memory: keeps each database in memory for the life of the process, for tests and benchmarks
+"""
+import datetime
+import os
+import sqlite3
+import config
+
+from database.database import ConnectionPool
+
+
+def adapt_datetime(value):
+    return value.isoformat(" ")
+
+
+def convert_datetime(value):
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+def convert_date(value):
+    return datetime.date.fromisoformat(value.decode())
+
+
+# Stored the way MySQL prints them, so they compare as text in the same order as in time
+sqlite3.register_adapter(datetime.datetime, adapt_datetime)
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_converter("DATETIME", convert_datetime)
+sqlite3.register_converter("TIMESTAMP", convert_datetime)
+sqlite3.register_converter("DATE", convert_date)
+
+
+def dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def unix_timestamp(value):
+    """
+    UNIX_TIMESTAMP(value) for timestamps stored as UTC text
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    moment = datetime.datetime.fromisoformat(value)
+    return int(moment.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+class BitXor:
+    """
+    BIT_XOR aggregate, 0 for no rows like MySQL
+    """
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= int(value)
+
+    def finalize(self):
+        return self.value
+
+
+class SQLiteConnectionPool(ConnectionPool):
+    """
+    ConnectionPool over one SQLite database, sqlite3 caches each connection's prepared statements
+    An in-memory database lives as long as one of its connections, so the pool keeps one open for good
+    """
+    dialect = "sqlite"
+    Error = sqlite3.Error
+
+    def __init__(self, name, path=None, **options):
+        super().__init__(name, **options)
+        path = path or config.SQLITE_PATH.format(database=name)
+        self.in_memory = path == ":memory:"
+        if self.in_memory:
+            # memdb is shared by every connection of the process that opens the same name
+            self.uri = "file:/{}?vfs=memdb".format(name)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.uri = "file:{}".format(path)
+        self._statements = {}
+        self._keep_alive = self._connect() if self.in_memory else None
+
+    def _connect(self):
+        con = sqlite3.connect(self.uri, uri=True, timeout=config.SQLITE_BUSY_TIMEOUT,
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                              cached_statements=config.SQLITE_STATEMENT_CACHE)
+        con.row_factory = dict_row
+        if not self.in_memory:
+            con.execute("PRAGMA journal_mode=WAL")
+            # With WAL a crash can lose the last commits but never corrupts the file
+            con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA foreign_keys=ON")
+        con.create_function("UNIX_TIMESTAMP", 1, unix_timestamp, deterministic=True)
+        con.create_aggregate("BIT_XOR", 1, BitXor)
+        return con
+
+    def _is_open(self, con):
+        try:
+            con.total_changes
+            return True
+        except sqlite3.ProgrammingError:
+            return False
+
+    def _is_healthy(self, con):
+        return self._is_open(con)
+
+    def prepare(self, sql, params):
+        """
+        %s placeholders become ?, one per item for a tuple or list parameter
+        The rewritten statement is cached per parameter shape, so each shape is parsed once
+        """
+        if not params:
+            return self.prepare_many(sql), ()
+        shape = tuple(len(param) if isinstance(param, (tuple, list)) else None for param in params)
+        key = (sql, shape)
+        statement = self._statements.get(key)
+        if statement is None:
+            parts = sql.split("%s")
+            if len(parts) - 1 != len(shape):
+                raise sqlite3.ProgrammingError("{} placeholders for {} parameters".format(len(parts) - 1, len(shape)))
+            pieces = [parts[0]]
+            for size, part in zip(shape, parts[1:]):
+                pieces.append("?" if size is None else "(" + ", ".join(["?"] * size) + ")")
+                pieces.append(part)
+            statement = self._cache_statement(key, "".join(pieces))
+        values = []
+        for param in params:
+            if isinstance(param, (tuple, list)):
+                values.extend(param)
+            else:
+                values.append(param)
+        return statement, values
+
+    def prepare_many(self, sql):
+        statement = self._statements.get(sql)
+        if statement is None:
+            statement = self._cache_statement(sql, sql.replace("%s", "?"))
+        return statement
+
+    def _cache_statement(self, key, statement):
+        if len(self._statements) >= config.SQLITE_STATEMENT_CACHE * 4:
+            self._statements.clear()
+        self._statements[key] = statement
+        return statement
+
+    def stream_cursor(self, con):
+        # SQLite steps through the result as it is read, any cursor streams
+        return con.cursor()
+
+    def insert_ignore_sql(self, table, columns):
+        return "INSERT OR IGNORE INTO {} ({}) VALUES ({})".format(table, ", ".join(columns), ", ".join(["%s"] * len(columns)))
+
+    def upsert_sql(self, table, columns, keys, update, expressions=None):
+        assignments = ["{0}=excluded.{0}".format(column) for column in update]
+        assignments += ["{}={}".format(column, expression) for column, expression in (expressions or {}).items()]
+        return "INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}) DO UPDATE SET {}".format(
+            table, ", ".join(columns), ", ".join(["%s"] * len(columns)), ", ".join(keys), ", ".join(assignments))
+
+    def table_names_sql(self):
+        return "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
@@ -1,30 +1,249 @@
+import atexit
+import contextvars
+import datetime
+import json
 import logging
+import os
+import queue
+import random
+import threading
 import config
 
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import TimedRotatingFileHandler, BaseRotatingHandler
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+_adapters = {}
+_listener = None
+_configure_lock = threading.Lock()
+
+# Argument types formatted the same later as now, anything else may change before the writer gets to it
+SCALAR_TYPES = (str, int, float, bool, bytes, type(None), datetime.date, datetime.time)
+
+
+class TruncatingFormatter(logging.Formatter):
+    """
+    Cuts messages longer than max_length, so one large payload cannot stall the writer
+    """
+    def __init__(self, fmt=None, max_length=config.LOG_MAX_MESSAGE_LENGTH):
+        super().__init__(fmt)
+        self.max_length = max_length
+
+    def message(self, record):
+        message = record.getMessage()
+        if self.max_length and len(message) > self.max_length:
+            message = "{}... ({} more characters)".format(message[:self.max_length], len(message) - self.max_length)
+        return message
+
+    def format(self, record):
+        record.message = self.message(record)
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        s = self.formatMessage(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            s = s + "\n" + record.exc_text
+        if record.stack_info:
+            s = s + "\n" + self.formatStack(record.stack_info)
+        return s
+
+
+class JsonFormatter(TruncatingFormatter):
+    """
+    One JSON object per line
+    """
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "function": record.funcName,
+            "line": record.lineno,
+            "identifier": getattr(record, "identifier", ""),
+            "request_id": getattr(record, "request_id", None),
+            "message": self.message(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class EnqueueHandler(logging.Handler):
+    """
+    Hands records to the background writer without formatting them, the calling thread never touches a file
+    The request ID is captured here since the writer runs outside the request's context
+    When the queue is full records are dropped and counted rather than blocking the caller
+    INFO and DEBUG records are kept at sample_rate, warnings and errors always
+    Arguments that are not scalars are formatted into the message here, like QueueHandler.prepare,
+    so a list or dict changed after the call is logged as it was
+    """
+    def __init__(self, records, sample_rate=config.LOG_INFO_SAMPLE_RATE):
+        super().__init__()
+        self.records = records
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def emit(self, record):
+        if record.levelno <= logging.INFO and self.sample_rate < 1 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return
+        if not hasattr(record, "identifier"):
+            record.identifier = ""
+        record.request_id = request_id.get() or "-"
+        if record.args:
+            args = record.args.values() if isinstance(record.args, dict) else record.args
+            if not all(isinstance(arg, SCALAR_TYPES) for arg in args):
+                try:
+                    record.msg = record.getMessage()
+                except Exception:
+                    self.handleError(record)
+                    return
+                record.args = None
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter:
+    """
+    Background thread writing queued records in batches: one write and flush per handler per batch
+    """
+    def __init__(self, records, handlers, batch_size=config.LOG_BATCH_SIZE):
+        self.records = records
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._stop = object()
+        self._thread = threading.Thread(target=self._loop, name="log-writer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """
+        Write what is queued and stop
+        """
+        try:
+            self.records.put(self._stop, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _loop(self):
+        while True:
+            batch = [self.records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._stop in batch
+            self.write([record for record in batch if record is not self._stop])
+            if stop:
+                return
+
+    def write(self, records):
+        for handler in self.handlers:
+            records_for_handler = [record for record in records if record.levelno >= handler.level]
+            if not records_for_handler:
+                continue
+            lines = []
+            for record in records_for_handler:
+                try:
+                    lines.append(handler.format(record) + handler.terminator)
+                except Exception:
+                    handler.handleError(record)
+            handler.acquire()
+            try:
+                if isinstance(handler, BaseRotatingHandler) and handler.shouldRollover(records_for_handler[0]):
+                    handler.doRollover()
+                handler.stream.write("".join(lines))
+                handler.stream.flush()
+            except Exception:
+                handler.handleError(records_for_handler[0])
+            finally:
+                handler.release()
+
 
 def configure_logger():
     """
     Abstract logger setup
+    Records are queued by the calling thread and written to the log file and stderr by a background writer
+    LOG_FORMAT=json writes one JSON object per line instead of text
     """
-    logging.root.setLevel(config.LOGGER_LEVEL)
-    
-    file_handler = TimedRotatingFileHandler(config.LOG_FILE_PATH, when="W0", interval=7, backupCount=4)
-    stream_handler = logging.StreamHandler()
-    
-    formatter = logging.Formatter("[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] [%(identifier)s] %(message)s")
-    file_handler.setFormatter(formatter)
-    stream_handler.setFormatter(formatter)
-    
+    global _listener
     logger = logging.getLogger(__name__)
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
+    with _configure_lock:
+        if _listener is not None:
+            return logger
+        logging.root.setLevel(config.LOGGER_LEVEL)
+
+        os.makedirs(os.path.dirname(config.LOG_FILE_PATH) or ".", exist_ok=True)
+        file_handler = TimedRotatingFileHandler(config.LOG_FILE_PATH, when="W0", interval=7, backupCount=4)
+        stream_handler = logging.StreamHandler()
 
+        if config.LOG_FORMAT == "json":
+            formatter = JsonFormatter()
+        else:
+            formatter = TruncatingFormatter("[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] [%(identifier)s] [%(request_id)s] %(message)s")
+        file_handler.setFormatter(formatter)
+        stream_handler.setFormatter(formatter)
+
+        records = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+        _listener = LogWriter(records, [file_handler, stream_handler])
+        _listener.start()
+        atexit.register(_stop_writer)
+
+        enqueue_handler = EnqueueHandler(records)
+        logger.addHandler(enqueue_handler)
+        logger.propagate = False
     return logger
- 
+
+
+def _stop_writer():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_writer():
+    """
+    A forked child has no writer thread, give it its own queue and writer over the same handlers
+    Records the parent had queued but not written stay with the parent
+    """
+    global _listener, _configure_lock
+    _configure_lock = threading.Lock()
+    if _listener is None:
+        return
+    records = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    _listener = LogWriter(records, _listener.handlers, _listener.batch_size)
+    _listener.start()
+    for handler in logging.getLogger(__name__).handlers:
+        if isinstance(handler, EnqueueHandler):
+            handler.records = records
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_writer)
+
+
+def get_log_stats():
+    """
+    Records dropped because the queue was full and INFO records left out by sampling
+    """
+    logger = logging.getLogger(__name__)
+    for handler in logger.handlers:
+        if isinstance(handler, EnqueueHandler):
+            return {"queued": handler.records.qsize(), "dropped": handler.dropped, "sampled_out": handler.sampled_out}
+    return None
+
 
 def get_logger_with_context(identifier):
-    extra = {
-        "identifier" : identifier
-    }
-    return logging.LoggerAdapter(logging.getLogger(__name__), extra)  
\ No newline at end of file
+    adapter = _adapters.get(identifier)
+    if adapter is None:
+        extra = {
+            "identifier" : identifier
+        }
+        adapter = _adapters.setdefault(identifier, logging.LoggerAdapter(logging.getLogger(__name__), extra))
+    return adapter
@@ -0,0 +1,171 @@
+"""
+In-process metrics rendered in the Prometheus text format on /api/metrics
+Every worker process keeps its own values, so scrape each worker or run a single process
+"""
+import bisect
+import re
+import threading
+import time
+
+from contextlib import contextmanager
+
+# Seconds, from a cached lookup to a request that ran into its deadline
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_metrics = []
+_collectors = []
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join("{}=\"{}\"".format(name, escape(value)) for name, value in pairs) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name + format_labels(self.labels, key), value
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.description), "# TYPE {} {}".format(self.name, self.type)]
+        lines.extend("{} {}".format(sample, format_value(value)) for sample, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """
+        For totals counted elsewhere, such as cache stats, copied in at scrape time
+        """
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, seconds, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                value = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                value[0][index] += 1
+            value[1] += seconds
+            value[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket" + format_labels(self.labels, key, [("le", format_value(bound))]), cumulative
+            yield self.name + "_bucket" + format_labels(self.labels, key, [("le", "+Inf")]), count
+            yield self.name + "_sum" + format_labels(self.labels, key), total
+            yield self.name + "_count" + format_labels(self.labels, key), count
+
+
+def register_collector(collect):
+    """
+    collect() runs before every scrape, to copy stats kept elsewhere into gauges and counters
+    """
+    _collectors.append(collect)
+
+
+def render():
+    for collect in _collectors:
+        collect()
+    return "\n".join(metric.render() for metric in _metrics) + "\n"
+
+
+_statement_names = {}
+
+
+def statement_name(sql):
+    """
+    Label for a SQL statement: its text with whitespace collapsed, parameters are never part of it
+    """
+    name = _statement_names.get(sql)
+    if name is None:
+        name = _statement_names[sql] = re.sub(r"\s+", " ", sql).strip()
+    return name
+
+
+http_request_duration = Histogram("http_request_duration_seconds", "Time to build an API response, streamed bodies excluded",
+                                  ["route", "method", "status"])
+finnhub_request_duration = Histogram("finnhub_request_duration_seconds", "Finnhub call latency including retries and their rate limit waits",
+                                     ["endpoint"])
+finnhub_responses = Counter("finnhub_responses_total", "Finnhub responses by final status", ["endpoint", "status"])
+upstream_retries = Counter("upstream_retries_total", "Upstream attempts retried, by status or error", ["reason"])
+upstream_throttled = Counter("upstream_throttled_total", "Upstream 429 Too Many Requests responses, retried or not")
+db_query_duration = Histogram("db_query_duration_seconds", "SQL statement latency", ["statement"])
+alert_run_duration = Histogram("alert_run_duration_seconds", "Tracked stock alert run duration",
+                               buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+alert_shard_runs = Counter("alert_shard_runs_total", "Alert shard runs by outcome", ["result"])
+alert_shards_held = Gauge("alert_shards_held", "Alert shards leased by this worker")
+cache_requests = Counter("cache_requests_total", "Cache lookups by result", ["cache", "result"])
+db_pool_connections = Gauge("db_pool_connections", "Pooled database connections by state", ["pool", "state"])
+db_pool_wait_timeouts = Counter("db_pool_wait_timeouts_total", "Checkouts that gave up waiting for a connection", ["pool"])
+circuit_open = Gauge("finnhub_circuit_open", "1 while an endpoint's circuit breaker rejects calls", ["endpoint"])
+log_records_dropped = Counter("log_records_dropped_total", "Log records dropped because the log writer queue was full")
+slow_requests_profiled = Counter("slow_requests_profiled_total", "Slow requests whose sampled stacks were saved", ["route"])
@@ -0,0 +1,260 @@
+"""
+Sharded alert runs for large tracker tables
+Positions are split into config.ALERT_SHARDS shards by stock_id. Every worker leases an even share of the shards,
+evaluates the due positions of each of them in its own process with its own quotes and alert state, and merges what
+crossed a threshold into one message from trigger_alert. Workers on several nodes split the shards between them the same way
+Shards are worked out from stock ids in the worker, so every query looks positions and state up by key
+Run with: python -m stocks.alert_worker [--processes N] [--interval SECONDS] [--once],
+or set ALERT_SHARDING=true to have the scheduler's tracking job run the shards this node leases
+"""
+import argparse
+import datetime
+import math
+import multiprocessing
+import os
+import socket
+import time
+import uuid
+import zlib
+import config
+
+from concurrent.futures import ProcessPoolExecutor
+from api.ratelimit import request_priority, CRON
+from stocks.alerts import AlertEngine
+from stocks.fetcher import chunked, Deadline
+from stocks.news import NewsSchedule
+from database.queries import (fetch_tracked_stock_ids, fetch_tracked_stocks_in, fetch_alert_state, save_shard_alert_state,
+                              register_alert_worker, remove_alert_worker, claim_alert_shards)
+from logger import configure_logger, get_logger_with_context
+from metrics import alert_run_duration, alert_shard_runs, alert_shards_held
+
+
+def shard_of(stock_id, shards):
+    return stock_id % shards
+
+
+class ShardState:
+    """
+    Alert state of one shard's positions for AlertEngine, saved only while the lease it was evaluated under is still held
+    """
+    def __init__(self, shard, worker_id, token, lease_ttl):
+        self.shard = shard
+        self.worker_id = worker_id
+        self.token = token
+        self.lease_ttl = lease_ttl
+        self.saved = True
+
+    def load(self, stock_ids):
+        return fetch_alert_state(stock_ids)
+
+    def save(self, rows):
+        self.saved = save_shard_alert_state(rows, self.shard, self.worker_id, self.token, time.time() + self.lease_ttl)
+
+
+def init_shard_process(calls_per_minute, burst):
+    """
+    Runs first in every pool process, before stocks.stocks creates the Finnhub rate limiter
+    """
+    config.FINNHUB_CALLS_PER_MINUTE = calls_per_minute
+    config.FINNHUB_BURST = burst
+    configure_logger()
+
+
+def run_shard(shard, worker_id, token, lease_ttl, symbols, news_symbols=()):
+    """
+    Fetch quotes for the positions of symbols, which all fall in shard, evaluate their thresholds
+    and load the news of those among news_symbols
+    Returns {"increased", "decreased", "news"} for trigger_alert, or None when the lease was lost during the run,
+    in which case the new owner alerts instead
+    """
+    # Imported here so pool processes create the rate limiter after init_shard_process
+    from stocks.stocks import calculate_percent_change, get_stock_quotes, construct_tracked_stocks_news
+
+    positions = fetch_tracked_stocks_in(symbols)
+
+    state = ShardState(shard, worker_id, token, lease_ttl)
+    alert_engine = AlertEngine(calculate_percent_change, load_state=state.load, save_state=state.save)
+    stocks_increased = []
+    stocks_decreased = []
+    with request_priority(CRON):
+        deadline = Deadline()
+        for chunk in chunked(positions, config.FETCH_CHUNK_SIZE):
+            results = get_stock_quotes([position["symbol"] for position in chunk], timeout=deadline.remaining())
+            quotes = {result.key: result.value for result in results if result.error is None}
+            increased, decreased = alert_engine.evaluate(chunk, quotes)
+            stocks_increased.extend(increased)
+            stocks_decreased.extend(decreased)
+        alert_engine.flush()
+        if not state.saved:
+            return None
+
+        today = datetime.date.today()
+        news_symbols = set(news_symbols)
+        news = construct_tracked_stocks_news([position for position in positions if position["symbol"] in news_symbols],
+                                             True, today, today)
+    return {"increased": stocks_increased, "decreased": stocks_decreased, "news": news}
+
+
+class AlertWorker:
+    """
+    Leases shards and runs them on a pool of processes, one shard per process at a time
+    The Finnhub quota is split between the processes unless RATE_LIMIT_URL already shares it. Next to the API,
+    serving_limiter is the API's own limiter: the processes split quota_share of the quota and it keeps the rest
+    Lease expiry compares clocks across nodes, which are assumed to be within a small part of lease_ttl
+    """
+    def __init__(self, processes=config.ALERT_WORKER_PROCESSES, shards=config.ALERT_SHARDS,
+                 lease_ttl=config.ALERT_LEASE_TTL, worker_id=None, serving_limiter=None, quota_share=config.ALERT_WORKER_QUOTA_SHARE):
+        # An in-memory SQLite database is not shared with other processes
+        if config.DB_BACKEND == "sqlite" and config.SQLITE_PATH == ":memory:":
+            processes = 1
+        self.processes = max(processes, 1)
+        self.shards = shards
+        self.lease_ttl = lease_ttl
+        self.worker_id = worker_id or "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self.serving_limiter = serving_limiter
+        self.quota_share = quota_share
+        self.leases = {}
+        self.last_run = None
+        self.news = NewsSchedule()
+
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            calls_per_minute, burst = config.FINNHUB_CALLS_PER_MINUTE, config.FINNHUB_BURST
+            if not config.RATE_LIMIT_URL:
+                if self.serving_limiter is not None:
+                    self.serving_limiter.resize(max(calls_per_minute * (1 - self.quota_share), 1),
+                                                max(int(burst * (1 - self.quota_share)), 1))
+                    calls_per_minute, burst = calls_per_minute * self.quota_share, int(burst * self.quota_share)
+                calls_per_minute = max(calls_per_minute // self.processes, 1)
+                burst = max(burst // self.processes, 1)
+            # spawn rather than fork: the parent runs threads, whose locks a forked child would inherit held
+            self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=init_shard_process, initargs=(calls_per_minute, burst))
+        return self._executor
+
+    def claim(self):
+        """
+        Announce this worker and lease an even share of the shards, returns {shard: token}
+        """
+        now = time.time()
+        workers = register_alert_worker(self.worker_id, now, self.lease_ttl)
+        share = math.ceil(self.shards / max(workers, 1))
+        self.leases = claim_alert_shards(self.worker_id, self.shards, share, now, now + self.lease_ttl,
+                                         start=zlib.crc32(self.worker_id.encode()))
+        alert_shards_held.set(len(self.leases))
+        return self.leases
+
+    def run(self, symbols=None):
+        """
+        Alert on the leased shards' positions, limited to symbols when given, and return one alert message
+        Only shards owning one of the symbols are run
+        """
+        logger = get_logger_with_context("alert_worker")
+        with alert_run_duration.time():
+            leases = self.claim()
+            due = {}
+            if leases:
+                for symbol, stock_id in fetch_tracked_stock_ids(symbols).items():
+                    shard = shard_of(stock_id, self.shards)
+                    if shard in leases:
+                        due.setdefault(shard, []).append(symbol)
+            news_due = set(self.news.due([symbol for shard_symbols in due.values() for symbol in shard_symbols]))
+            tasks = [(shard, self.worker_id, leases[shard], self.lease_ttl, due[shard],
+                      [symbol for symbol in due[shard] if symbol in news_due]) for shard in sorted(due)]
+            if self.processes == 1:
+                outcomes = [self._run_inline(task) for task in tasks]
+            else:
+                futures = [self._pool().submit(run_shard, *task) for task in tasks]
+                outcomes = [self._result(future) for future in futures]
+
+        stocks_increased = []
+        stocks_decreased = []
+        tracked_stocks_news_list = []
+        for (shard, *_), outcome in zip(tasks, outcomes):
+            if outcome is None:
+                alert_shard_runs.inc(result="lease_lost")
+                logger.warning("Lease on alert shard %s was lost during the run, its alerts are left to the new owner", shard)
+                continue
+            if isinstance(outcome, Exception):
+                alert_shard_runs.inc(result="error")
+                logger.error("Alert shard %s failed: %s", shard, outcome)
+                continue
+            alert_shard_runs.inc(result="ok")
+            stocks_increased.extend(outcome["increased"])
+            stocks_decreased.extend(outcome["decreased"])
+            tracked_stocks_news_list.extend(outcome["news"])
+        # News of failed or lost shards and of symbols whose fetch failed stays due for the next run
+        self.news.loaded([stock_news["symbol"] for stock_news in tracked_stocks_news_list if "error" not in stock_news])
+        self.last_run = time.time()
+
+        # Shards finish in any order, list alerts by symbol so the message is stable
+        stocks_increased.sort(key=lambda stock: stock["symbol"])
+        stocks_decreased.sort(key=lambda stock: stock["symbol"])
+        tracked_stocks_news_list.sort(key=lambda stock: stock["symbol"])
+
+        from stocks.stocks import trigger_alert
+        return trigger_alert(stocks_increased, stocks_decreased, tracked_stocks_news_list)
+
+    def _run_inline(self, task):
+        try:
+            return run_shard(*task)
+        except Exception as error:
+            return error
+
+    def _result(self, future):
+        try:
+            return future.result()
+        except Exception as error:
+            return error
+
+    def status(self):
+        return {
+            "worker_id": self.worker_id,
+            "processes": self.processes,
+            "shards": self.shards,
+            "leased": sorted(self.leases),
+            "last_run": datetime.datetime.fromtimestamp(self.last_run).isoformat(timespec="seconds") if self.last_run else None,
+        }
+
+    def close(self):
+        """
+        Stop the processes and hand the leases back
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            if self.serving_limiter is not None and not config.RATE_LIMIT_URL:
+                self.serving_limiter.resize(config.FINNHUB_CALLS_PER_MINUTE, config.FINNHUB_BURST)
+        remove_alert_worker(self.worker_id)
+        self.leases = {}
+        alert_shards_held.set(0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=config.ALERT_WORKER_PROCESSES)
+    parser.add_argument("--interval", type=float, default=60, help="seconds between runs")
+    parser.add_argument("--once", action="store_true", help="run the leased shards once and exit")
+    args = parser.parse_args()
+
+    configure_logger()
+    logger = get_logger_with_context("alert_worker")
+    worker = AlertWorker(processes=args.processes)
+    try:
+        while True:
+            started = time.monotonic()
+            message = worker.run()
+            logger.info("Alert run over shards %s: %s", sorted(worker.leases), message)
+            if args.once:
+                break
+            time.sleep(max(args.interval - (time.monotonic() - started), 0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import threading
+import config
+
+from database.queries import fetch_alert_state, save_alert_state
+
+try:
+    from stocks.vectorized import load_columns, evaluate_thresholds
+except ImportError:
+    evaluate_thresholds = None
+
+INCREASE = "increase"
+DECREASE = "decrease"
+
+
+def alert_direction(percent_difference, percent, increase, decrease):
+    """
+    Which alert threshold a position is past, None when it is inside both
+    """
+    if increase and percent_difference >= percent and percent_difference > 0:
+        return INCREASE
+    if decrease and abs(percent_difference) >= percent and percent_difference < 0:
+        return DECREASE
+    return None
+
+
+class AlertEngine:
+    """
+    Keeps the last price, quote time and alert direction of every tracked position,
+    so each run only re-evaluates positions whose quote changed and only alerts
+    when a position crosses into a threshold it was not already past
+    State is persisted in stock_alert_state so a restart does not fire the same alerts again
+    Call reload() at the start of every run: another process may have evaluated and saved the same positions since,
+    state is then read again for the positions each run evaluates
+    """
+    def __init__(self, percent_change, load_state=fetch_alert_state, save_state=save_alert_state):
+        self.percent_change = percent_change
+        self.load_state = load_state
+        self.save_state = save_state
+
+        self._lock = threading.Lock()
+        self._state = {}
+        self._loaded = set()
+        self._dirty = set()
+
+    def reload(self):
+        """
+        Forget the cached state, so the next evaluate reads what other processes saved
+        State not flushed yet is dropped
+        """
+        with self._lock:
+            self._state = {}
+            self._loaded = set()
+            self._dirty.clear()
+
+    def _ensure_loaded(self, positions):
+        stock_ids = [position["stock_id"] for position in positions if position["stock_id"] not in self._loaded]
+        if not stock_ids:
+            return
+        for row in self.load_state(stock_ids):
+            self._state[row["stock_id"]] = [row["tracker_id"], row["last_price"], row["last_quote_time"], row["last_direction"]]
+        self._loaded.update(stock_ids)
+
+    def evaluate(self, positions, quotes):
+        """
+        positions are tracked stock rows, quotes map symbol to quote
+        Returns (stocks_increased, stocks_decreased) for positions that crossed a threshold this run
+        """
+        stocks_increased = []
+        stocks_decreased = []
+        with self._lock:
+            self._ensure_loaded(positions)
+            changed = []
+            for position in positions:
+                quote = quotes.get(position["symbol"])
+                if not quote:
+                    continue
+
+                state = self._state.get(position["stock_id"])
+                # A replaced tracker row gets a new id, its thresholds may have changed
+                if state is None or state[0] != position["id"]:
+                    self._state[position["stock_id"]] = [position["id"], None, None, None]
+                elif state[1] == quote.get("c") and state[2] == quote.get("t"):
+                    continue
+                changed.append(position)
+
+            for position, percent_difference, direction in self._directions(changed, quotes):
+                state = self._state[position["stock_id"]]
+                if direction is not None and direction != state[3]:
+                    if direction == INCREASE:
+                        stocks_increased.append({"symbol": position["symbol"], "name": position["name"], "percent_increase": percent_difference})
+                    else:
+                        stocks_decreased.append({"symbol": position["symbol"], "name": position["name"], "percent_decrease": percent_difference})
+
+                quote = quotes[position["symbol"]]
+                state[1] = quote.get("c")
+                state[2] = quote.get("t")
+                state[3] = direction
+                self._dirty.add(position["stock_id"])
+
+        return stocks_increased, stocks_decreased
+
+    def _directions(self, positions, quotes):
+        """
+        (position, percent_difference, direction) for each position,
+        large batches are evaluated with NumPy in one pass
+        """
+        if evaluate_thresholds is not None and len(positions) >= config.VECTORIZE_MIN_POSITIONS:
+            columns, quoted = load_columns(positions, quotes)
+            percent_differences, increased, decreased = evaluate_thresholds(columns)
+            directions = [INCREASE if up else DECREASE if down else None
+                          for up, down in zip(increased.tolist(), decreased.tolist())]
+            return zip(quoted, percent_differences.tolist(), directions)
+
+        evaluated = []
+        for position in positions:
+            percent_difference = self.percent_change(quotes[position["symbol"]], position["avg_purchase_cost"])
+            direction = alert_direction(percent_difference, position["percent"], position["increase"], position["decrease"])
+            evaluated.append((position, percent_difference, direction))
+        return evaluated
+
+    def flush(self):
+        """
+        Persist the state of positions evaluated since the last flush
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            rows = [[stock_id] + self._state[stock_id] for stock_id in self._dirty if stock_id in self._state]
+            self.save_state(rows)
+            self._dirty.clear()
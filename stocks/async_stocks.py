@@ -0,0 +1,135 @@
+import asyncio
+import weakref
+import config
+
+from database.queries import fetch_tracked_stocks_async, fetch_tracked_stocks_page_async
+from stocks.stocks import (FINNHUB_TOKEN, STOCK_QUOTE_URL, QUOTE_FALLBACK_ERRORS, quote_cache, finnhub_limiter,
+                           upstream_guards, finnhub_response, quote_response, get_live_quote, tracked_stock_response)
+from stocks.fetcher import FetchResult, FetchDeadlineExceeded, Deadline, achunked
+from api.adapters import DEFAULT_TIMEOUT, retries
+from api.resilience import remaining_time
+from metrics import finnhub_request_duration
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Clients and their connection pools belong to the event loop that created them
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http():
+    if httpx is None:
+        raise RuntimeError("The httpx package is required for the async serving mode")
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(max_connections=config.ASYNC_HTTP_MAX_CONNECTIONS,
+                              max_keepalive_connections=config.ASYNC_HTTP_MAX_KEEPALIVE)
+        client = _clients[loop] = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=limits)
+    return client
+
+
+async def close_async_http():
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def finnhub_get_async(endpoint, url):
+    """
+    finnhub_get for coroutines, sharing its rate limiter, retry policy and circuit breakers
+    """
+    async def attempt():
+        await finnhub_limiter.acquire_async(timeout=remaining_time())
+        return await get_async_http().get(url, timeout=attempt_timeout())
+
+    async def send():
+        with finnhub_request_duration.time(endpoint=endpoint):
+            r = await retries.send_async(attempt, url)
+        return finnhub_response(endpoint, r)
+
+    return await upstream_guards[endpoint].call_async(send)
+
+
+def attempt_timeout():
+    remaining = remaining_time()
+    return DEFAULT_TIMEOUT if remaining is None else min(DEFAULT_TIMEOUT, remaining)
+
+
+async def fetch_stock_quote_async(symbol):
+    r = await finnhub_get_async("quote", STOCK_QUOTE_URL.format(token=FINNHUB_TOKEN, symbol=symbol))
+    return quote_response(symbol, r)
+
+
+async def get_stock_quote_async(symbol):
+    """
+    get_stock_quote for coroutines: the same quote cache, shared backend, coalescing and stale fallback,
+    with the upstream call awaited on the event loop
+    """
+    live_quote = get_live_quote(symbol)
+    if live_quote is not None:
+        return live_quote
+    return await quote_cache.get_or_load_async(symbol, fetch_stock_quote_async, stale_on=QUOTE_FALLBACK_ERRORS)
+
+
+async def get_stock_quotes_async(symbols, timeout=None):
+    """
+    get_stock_quotes for coroutines: every fetch overlaps on the event loop, results come back in input order
+    """
+    timeout = config.FETCH_DEADLINE if timeout is None else timeout
+    live_quotes = {symbol: get_live_quote(symbol) for symbol in symbols}
+    tasks = {symbol: asyncio.ensure_future(get_stock_quote_async(symbol))
+             for symbol in dict.fromkeys(symbols) if live_quotes[symbol] is None}
+    if tasks:
+        _, pending = await asyncio.wait(tasks.values(), timeout=max(timeout, 0))
+        for task in pending:
+            task.cancel()
+
+    results = []
+    for symbol in symbols:
+        task = tasks.get(symbol)
+        if task is None:
+            results.append(FetchResult(symbol, live_quotes[symbol], None))
+        elif task.cancelled() or not task.done():
+            results.append(FetchResult(symbol, None, FetchDeadlineExceeded(f"No response for {symbol} within {timeout}s")))
+        elif task.exception() is not None:
+            results.append(FetchResult(symbol, None, task.exception()))
+        else:
+            results.append(FetchResult(symbol, task.result(), None))
+    return results
+
+
+async def generate_tracked_stocks_response_async(tracked_stocks, detailed):
+    """
+    generate_tracked_stocks_response for coroutines, tracked_stocks may also be rows streamed from AsyncDatabase
+    """
+    deadline = Deadline()
+    async for chunk in achunked(tracked_stocks, config.FETCH_CHUNK_SIZE):
+        if any(stock is None for stock in chunk):
+            return
+
+        if detailed:
+            results = await get_stock_quotes_async([stock_details.get("symbol") for stock_details in chunk],
+                                                   timeout=deadline.remaining())
+        else:
+            results = [None] * len(chunk)
+
+        for stock_details, result in zip(chunk, results):
+            yield tracked_stock_response(stock_details, result, detailed)
+
+
+async def get_tracked_stocks_details_async(detailed, symbol=None):
+    tracked_stocks = await fetch_tracked_stocks_async(symbol)
+    return [stock async for stock in generate_tracked_stocks_response_async(tracked_stocks, detailed)]
+
+
+async def get_tracked_stocks_page_async(detailed, after_id, limit, symbol=None):
+    if symbol:
+        tracked_stocks, next_after_id = await fetch_tracked_stocks_async(symbol), None
+    else:
+        tracked_stocks = await fetch_tracked_stocks_page_async(after_id, limit + 1)
+        next_after_id = tracked_stocks[limit - 1]["id"] if len(tracked_stocks) > limit else None
+        tracked_stocks = tracked_stocks[:limit]
+    return [stock async for stock in generate_tracked_stocks_response_async(tracked_stocks, detailed)], next_after_id
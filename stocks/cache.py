@@ -0,0 +1,248 @@
+import asyncio
+import json
+import threading
+import time
+import config
+
+from collections import OrderedDict
+from concurrent.futures import Future
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class RedisCacheBackend:
+    """
+    Shared cache so several worker processes reuse each other's upstream responses
+    """
+    def __init__(self, url, prefix="quote:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for a shared cache backend")
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, json.dumps(value), px=int(ttl * 1000))
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries are fresh for ttl seconds
+    Concurrent misses for the same key, from threads or coroutines, are coalesced into a single call to the loader
+    """
+    def __init__(self, ttl, max_size, backend=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.backend = backend
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._shared_hits = 0
+        self._evictions = 0
+        self._backend_errors = 0
+        self._stale_hits = 0
+
+    def get(self, key):
+        """
+        Fresh value for key or None, without loading it
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            return None
+
+    def get_or_load(self, key, loader, stale_on=()):
+        """
+        Fresh value for key, loading it on a miss; errors listed in stale_on are answered
+        with the last stored value when there is one
+        """
+        try:
+            return self._get_or_load(key, loader)
+        except stale_on:
+            stale = self.get_stale(key)
+            if stale is None:
+                raise
+            return stale
+
+    async def get_or_load_async(self, key, loader, stale_on=()):
+        """
+        get_or_load for a coroutine loader, sharing entries, the backend and in-flight loads with threads
+        """
+        try:
+            return await self._get_or_load_async(key, loader)
+        except stale_on:
+            stale = self.get_stale(key)
+            if stale is None:
+                raise
+            return stale
+
+    def _claim(self, key):
+        """
+        (fresh value, None, False) on a hit, else (None, future of the load, whether the caller must run it)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0], None, False
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+            return None, future, leader
+
+    def _get_or_load(self, key, loader):
+        value, future, leader = self._claim(key)
+        if future is None:
+            return value
+        if not leader:
+            return future.result()
+
+        try:
+            value = self._load(key, loader)
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def _get_or_load_async(self, key, loader):
+        value, future, leader = self._claim(key)
+        if future is None:
+            return value
+        if leader:
+            task = asyncio.ensure_future(self._lead_async(key, loader, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        # Shielded so one caller giving up does not cancel the load for the others
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def _lead_async(self, key, loader, future):
+        try:
+            value = await self._load_async(key, loader)
+            self.set(key, value)
+            future.set_result(value)
+        except Exception as error:
+            future.set_exception(error)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _load(self, key, loader):
+        value = self._shared_get(key)
+        if value is not None:
+            return value
+        value = loader(key)
+        self._shared_set(key, value)
+        return value
+
+    async def _load_async(self, key, loader):
+        """
+        _load for a coroutine loader, the blocking backend client runs in a worker thread
+        """
+        if self.backend is not None:
+            value = await asyncio.to_thread(self._shared_get, key)
+            if value is not None:
+                return value
+        value = await loader(key)
+        if self.backend is not None:
+            await asyncio.to_thread(self._shared_set, key, value)
+        return value
+
+    def _shared_get(self, key):
+        """
+        Value from the shared backend or None, the backend is called without the lock and counted under it
+        """
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            with self._lock:
+                self._backend_errors += 1
+            return None
+        if value is not None:
+            with self._lock:
+                self._shared_hits += 1
+        return value
+
+    def _shared_set(self, key, value):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception:
+            with self._lock:
+                self._backend_errors += 1
+
+    def get_stale(self, key):
+        """
+        Last stored value regardless of age, for serving while upstream is unhealthy
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._stale_hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "shared_hits": self._shared_hits,
+                "evictions": self._evictions,
+                "backend_errors": self._backend_errors,
+                "stale_hits": self._stale_hits,
+                "hit_ratio": round((self._hits + self._coalesced) / lookups, 4) if lookups else 0,
+            }
+
+
+def create_quote_cache():
+    backend = RedisCacheBackend(config.QUOTE_CACHE_URL) if config.QUOTE_CACHE_URL else None
+    return TTLCache(config.QUOTE_CACHE_TTL, config.QUOTE_CACHE_MAX_SIZE, backend)
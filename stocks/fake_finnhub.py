@@ -0,0 +1,216 @@
+"""
+Local stand-in for the Finnhub REST endpoints the app calls (quote, stock/profile2, company-news)
+Latency, server errors and 429s are injected at configurable rates, and every call is counted
+Run with: python -m stocks.fake_finnhub --port 8766 --latency 0.08 --error-rate 0.01 --throttle-rate 0.02
+then point the app at it with FINNHUB_API_URL=http://127.0.0.1:8766
+"""
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+import zlib
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+ENDPOINTS = {"/quote": "quote", "/stock/profile2": "profile", "/company-news": "news"}
+
+
+def symbol_seed(symbol):
+    # Stable across processes, unlike hash()
+    return zlib.crc32(symbol.encode())
+
+
+def fake_quote(symbol, now):
+    rng = random.Random(symbol_seed(symbol))
+    previous_close = round(rng.uniform(5, 500), 2)
+    # Each symbol drifts on its own slow cycle, so thresholds are crossed now and then
+    drift = rng.uniform(0.02, 0.12) * ((now / 60 + rng.random() * 60) % 60 / 30 - 1)
+    current = round(previous_close * (1 + drift), 2)
+    return {
+        "c": current,
+        "h": round(max(current, previous_close) * 1.01, 2),
+        "l": round(min(current, previous_close) * 0.99, 2),
+        "o": previous_close,
+        "pc": previous_close,
+        "t": int(now),
+    }
+
+
+def fake_profile(symbol):
+    rng = random.Random(symbol_seed(symbol))
+    return {
+        "country": "US",
+        "currency": "USD",
+        "exchange": "NASDAQ NMS - GLOBAL MARKET",
+        "ipo": "2004-08-19",
+        "marketCapitalization": round(rng.uniform(100, 2000000), 2),
+        "name": "{} Corp".format(symbol),
+        "shareOutstanding": round(rng.uniform(10, 10000), 2),
+        "ticker": symbol,
+        "weburl": "https://example.com/{}".format(symbol.lower()),
+    }
+
+
+def fake_news(symbol, from_date, to_date, articles_per_day):
+    news = []
+    day = from_date
+    while day <= to_date:
+        published = int(datetime.datetime(day.year, day.month, day.day, 14, tzinfo=datetime.timezone.utc).timestamp())
+        for i in range(articles_per_day):
+            article_id = symbol_seed("{}:{}:{}".format(symbol, day.isoformat(), i))
+            news.append({
+                "category": "company news",
+                "datetime": published + i * 600,
+                "headline": "{} update {} for {}".format(symbol, i + 1, day.isoformat()),
+                "id": article_id,
+                "image": "",
+                "related": symbol,
+                "source": "Fake Wire",
+                "summary": "Synthetic article {} about {}".format(article_id, symbol),
+                "url": "https://example.com/news/{}".format(article_id),
+            })
+        day += datetime.timedelta(days=1)
+    return news
+
+
+class FakeFinnhubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if url.path == "/fake/stats":
+            return self._send(200, self.server.stats())
+
+        endpoint = ENDPOINTS.get(url.path)
+        if endpoint is None:
+            return self._send(404, {"error": "Not found"})
+        status = self.server.roll()
+        time.sleep(self.server.delay())
+        self.server.count(endpoint, status)
+        if status == 429:
+            return self._send(429, {"error": "API limit reached. Please try again later."}, {"Retry-After": "1"})
+        if status == 500:
+            return self._send(500, {"error": "Internal server error"})
+
+        symbol = params.get("symbol", "").upper()
+        if endpoint == "quote":
+            return self._send(200, fake_quote(symbol, time.time()))
+        if endpoint == "profile":
+            return self._send(200, fake_profile(symbol))
+        try:
+            from_date = datetime.date.fromisoformat(params["from"])
+            to_date = datetime.date.fromisoformat(params["to"])
+        except (KeyError, ValueError):
+            return self._send(422, {"error": "Wrong date format"})
+        return self._send(200, fake_news(symbol, from_date, to_date, self.server.articles_per_day))
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeFinnhubServer(ThreadingHTTPServer):
+    """
+    latency and jitter are seconds, error_rate and throttle_rate the share of calls answered with 500 and 429
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency=0.05, jitter=0.02, error_rate=0.0, throttle_rate=0.0,
+                 articles_per_day=3, seed=None):
+        super().__init__(address, FakeFinnhubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.articles_per_day = articles_per_day
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._calls = Counter()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def roll(self):
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.throttle_rate:
+            return 429
+        if roll < self.throttle_rate + self.error_rate:
+            return 500
+        return 200
+
+    def delay(self):
+        with self._lock:
+            return max(self._rng.gauss(self.latency, self.jitter), 0)
+
+    def count(self, endpoint, status):
+        with self._lock:
+            self._calls[(endpoint, status)] += 1
+
+    def stats(self):
+        """
+        {endpoint: {"calls": n, "429": n, "500": n}}
+        """
+        with self._lock:
+            calls = dict(self._calls)
+        stats = {}
+        for (endpoint, status), count in calls.items():
+            endpoint_stats = stats.setdefault(endpoint, {"calls": 0, "429": 0, "500": 0})
+            endpoint_stats["calls"] += count
+            if status != 200:
+                endpoint_stats[str(status)] += count
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+
+
+def start_fake_finnhub(host="127.0.0.1", port=0, **options):
+    """
+    Serve a FakeFinnhubServer from a daemon thread, port 0 picks a free port
+    """
+    server = FakeFinnhubServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="fake-finnhub", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--articles-per-day", type=int, default=3)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    server = FakeFinnhubServer((args.host, args.port), latency=args.latency, jitter=args.jitter,
+                               error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                               articles_per_day=args.articles_per_day, seed=args.seed)
+    print("Fake Finnhub on {}, call counts at {}/fake/stats".format(server.url, server.url))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
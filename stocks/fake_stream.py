@@ -0,0 +1,127 @@
+"""
+Local stand-in for Finnhub's trade WebSocket, for testing the quote stream without a token
+Run with: python -m stocks.fake_stream --port 8765 --ticks-per-second 50
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socketserver
+import struct
+import threading
+import time
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def read_frame(sock_file):
+    """
+    Read one client frame, returns (opcode, payload) or None when the client went away
+    """
+    header = sock_file.read(2)
+    if len(header) < 2:
+        return None
+    opcode = header[0] & 0x0F
+    length = header[1] & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", sock_file.read(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", sock_file.read(8))[0]
+    mask = sock_file.read(4) if header[1] & 0x80 else b"\x00\x00\x00\x00"
+    payload = bytearray(sock_file.read(length))
+    for i in range(len(payload)):
+        payload[i] ^= mask[i % 4]
+    return opcode, bytes(payload)
+
+
+def encode_frame(payload, opcode=0x1):
+    header = bytes([0x80 | opcode])
+    if len(payload) < 126:
+        header += bytes([len(payload)])
+    elif len(payload) < 65536:
+        header += bytes([126]) + struct.pack(">H", len(payload))
+    else:
+        header += bytes([127]) + struct.pack(">Q", len(payload))
+    return header + payload
+
+
+class FakeTradeHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        key = None
+        while True:
+            line = self.rfile.readline().decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            if name.lower() == "sec-websocket-key":
+                key = value.strip()
+        if key is None:
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.wfile.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          "Sec-WebSocket-Accept: {}\r\n\r\n".format(accept)).encode())
+
+        subscribed = set()
+        lock = threading.Lock()
+        closed = threading.Event()
+        threading.Thread(target=self._send_trades, args=(subscribed, lock, closed), daemon=True).start()
+        try:
+            while True:
+                frame = read_frame(self.rfile)
+                if frame is None or frame[0] == 0x8:
+                    break
+                if frame[0] != 0x1:
+                    continue
+                message = json.loads(frame[1])
+                with lock:
+                    if message.get("type") == "subscribe":
+                        subscribed.add(message["symbol"])
+                    elif message.get("type") == "unsubscribe":
+                        subscribed.discard(message["symbol"])
+        finally:
+            closed.set()
+
+    def _send_trades(self, subscribed, lock, closed):
+        prices = {}
+        interval = 1 / self.server.ticks_per_second
+        while not closed.is_set():
+            with lock:
+                symbols = list(subscribed)
+            if symbols:
+                symbol = random.choice(symbols)
+                price = prices.get(symbol, random.uniform(5, 500))
+                prices[symbol] = price = round(max(price * random.uniform(0.995, 1.005), 0.01), 2)
+                message = {"type": "trade", "data": [{"s": symbol, "p": price, "t": int(time.time() * 1000), "v": random.randint(1, 500)}]}
+            else:
+                message = {"type": "ping"}
+            try:
+                self.wfile.write(encode_frame(json.dumps(message).encode()))
+            except OSError:
+                return
+            closed.wait(interval)
+
+
+class FakeTradeServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, ticks_per_second=10):
+        super().__init__(address, FakeTradeHandler)
+        self.ticks_per_second = ticks_per_second
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ticks-per-second", type=float, default=10)
+    args = parser.parse_args()
+
+    server = FakeTradeServer((args.host, args.port), args.ticks_per_second)
+    print("Fake trade stream on ws://{}:{}".format(args.host, args.port))
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import contextvars
+import itertools
+import time
+import config
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from api.profiler import profiler
+
+FetchResult = namedtuple("FetchResult", ["key", "value", "error"])
+
+
+class FetchDeadlineExceeded(Exception):
+    pass
+
+
+def fetch_all(fetch, keys, max_workers=None, timeout=None):
+    """
+    Call fetch(key) for every key with bounded concurrency
+    Results come back in input order as FetchResult(key, value, error),
+    keys that raised or did not finish before the timeout carry an error instead of a value
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+    max_workers = max_workers or config.FETCH_MAX_WORKERS
+    timeout = config.FETCH_DEADLINE if timeout is None else timeout
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(keys)))
+    try:
+        # Copy the caller's context so per-request state (priority, deadline, profile) follows each fetch
+        futures = [executor.submit(contextvars.copy_context().run, profiler.follow, fetch, key) for key in keys]
+        done, _ = wait(futures, timeout=max(timeout, 0))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for key, future in zip(keys, futures):
+        if future not in done:
+            future.cancel()
+            results.append(FetchResult(key, None, FetchDeadlineExceeded(f"No response for {key} within {timeout}s")))
+        elif future.exception() is not None:
+            results.append(FetchResult(key, None, future.exception()))
+        else:
+            results.append(FetchResult(key, future.result(), None))
+    return results
+
+
+class Deadline:
+    """
+    Overall time budget shared by several fetch_all calls
+    """
+    def __init__(self, seconds=None):
+        self.expires_at = time.monotonic() + (config.FETCH_DEADLINE if seconds is None else seconds)
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0)
+
+
+def chunked(iterable, size):
+    """
+    Yield lists of up to size items, so streamed rows are fanned out a batch at a time
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def achunked(iterable, size):
+    """
+    chunked for coroutines, iterable may be an async iterator such as rows streamed from AsyncDatabase
+    """
+    if not hasattr(iterable, "__aiter__"):
+        for chunk in chunked(iterable, size):
+            yield chunk
+        return
+    chunk = []
+    async for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,197 @@
+import atexit
+import threading
+import time
+import config
+
+from itertools import groupby
+from operator import itemgetter
+from database.queries import (save_quote_history, stream_quote_points, save_quote_rollups, fetch_quote_points_start,
+                              fetch_last_rollup_bucket, delete_quote_points_before)
+from logger import get_logger_with_context
+
+RAW = 0
+
+
+class QuoteHistoryWriter:
+    """
+    Buffers fetched quotes and appends them to stock_quote_history in batches
+    A background thread writes the buffer every flush_interval seconds, or as soon as a batch is full
+    """
+    def __init__(self, save=save_quote_history, batch_size=config.QUOTE_HISTORY_BATCH_SIZE,
+                 flush_interval=config.QUOTE_HISTORY_FLUSH_INTERVAL):
+        self.save = save
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Quotes kept while the database is unavailable before the oldest are dropped
+        self.max_buffered = batch_size * 20
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        self._written = 0
+        self._dropped = 0
+        self._errors = 0
+
+    def record(self, symbol, quote):
+        price = quote.get("c")
+        trade_time = quote.get("t")
+        # Finnhub answers unknown symbols with zeroes
+        if not price or not trade_time:
+            return
+        with self._lock:
+            self._buffer.append((symbol, int(trade_time), float(price)))
+            overflow = len(self._buffer) - self.max_buffered
+            if overflow > 0:
+                del self._buffer[:overflow]
+                self._dropped += overflow
+            full = len(self._buffer) >= self.batch_size
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wake.set()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._loop, name="quote-history", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            for i in range(0, len(rows), self.batch_size):
+                batch = rows[i:i + self.batch_size]
+                try:
+                    self.save(batch)
+                    self._written += len(batch)
+                except Exception:
+                    self._errors += 1
+                    self._dropped += len(batch)
+                    get_logger_with_context("quote_history").exception("Could not write %s quotes", len(batch))
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "buffered": buffered,
+            "written": self._written,
+            "dropped": self._dropped,
+            "errors": self._errors,
+        }
+
+
+def downsample(points, resolution):
+    """
+    Merge OHLC points of one symbol, ordered by time, into buckets of resolution seconds
+    """
+    bucket = None
+    for point in points:
+        start = point["bucket"] - point["bucket"] % resolution
+        if bucket is not None and bucket["t"] == start:
+            bucket["high"] = max(bucket["high"], point["high"])
+            bucket["low"] = min(bucket["low"], point["low"])
+            bucket["close"] = point["close"]
+            bucket["samples"] += point["samples"]
+            continue
+        if bucket is not None:
+            yield bucket
+        bucket = {"t": start, "open": point["open"], "high": point["high"], "low": point["low"],
+                  "close": point["close"], "samples": point["samples"]}
+    if bucket is not None:
+        yield bucket
+
+
+def retention_periods():
+    """
+    (source resolution, seconds kept) from raw quotes to the coarsest rollup, None keeps forever
+    """
+    return [(RAW, config.QUOTE_HISTORY_RAW_RETENTION)] + sorted(config.QUOTE_ROLLUP_RETENTION.items())
+
+
+def history_source(start, resolution, now=None):
+    """
+    Finest stored resolution that still covers start, preferring ones that divide the requested resolution
+    Returns (source, effective resolution), the effective one is coarser when only a coarser rollup reaches back to start
+    """
+    now = now or time.time()
+    covering = [source for source, retention in retention_periods() if retention is None or start >= now - retention]
+    for source in covering:
+        if source == RAW or (source <= resolution and resolution % source == 0):
+            return source, resolution
+    source = covering[0]
+    return source, max(source, resolution)
+
+
+def get_quote_history(symbol, start, end, resolution):
+    """
+    OHLC buckets for a symbol over [start, end), downsampled while streaming from the finest covering source
+    Returns (effective resolution, buckets)
+    """
+    source, resolution = history_source(start, resolution)
+    start -= start % resolution
+    return resolution, list(downsample(stream_quote_points(source, start, end, symbol), resolution))
+
+
+def rollup_quote_history(now=None):
+    """
+    Aggregate raw quotes into the finest rollup and each rollup into the next coarser one, up to the last complete bucket
+    Buckets inside the lookback window are rebuilt every run, since a quote's time is its last trade and can arrive late
+    """
+    now = int(now or time.time())
+    written = {}
+    source = RAW
+    for resolution in sorted(config.QUOTE_ROLLUP_RETENTION):
+        end = now - now % resolution
+        start = fetch_last_rollup_bucket(resolution)
+        if start is None:
+            start = fetch_quote_points_start(source)
+        else:
+            start = min(start, end - config.QUOTE_ROLLUP_LOOKBACK)
+
+        count = 0
+        if start is not None:
+            start -= start % resolution
+            rows = []
+            for symbol, points in groupby(stream_quote_points(source, start, end), key=itemgetter("symbol")):
+                for bucket in downsample(points, resolution):
+                    rows.append((symbol, bucket["t"], bucket["open"], bucket["high"], bucket["low"], bucket["close"], bucket["samples"]))
+                    if len(rows) >= config.QUOTE_HISTORY_BATCH_SIZE:
+                        save_quote_rollups(resolution, rows)
+                        count += len(rows)
+                        rows = []
+            if rows:
+                save_quote_rollups(resolution, rows)
+                count += len(rows)
+        if count:
+            written[resolution] = count
+        source = resolution
+    return written or None
+
+
+def expire_quote_history(now=None):
+    """
+    Delete raw quotes and rollups older than their retention, in batches
+    """
+    now = int(now or time.time())
+    deleted = {}
+    for resolution, retention in retention_periods():
+        if retention is None:
+            continue
+        count = 0
+        while True:
+            rows = delete_quote_points_before(resolution, now - retention, config.QUOTE_RETENTION_BATCH)
+            count += rows
+            if rows < config.QUOTE_RETENTION_BATCH:
+                break
+        if count:
+            deleted[resolution] = count
+    return deleted or None
@@ -0,0 +1,29 @@
+import datetime
+import config
+
+from zoneinfo import ZoneInfo
+
+MARKET_TIMEZONE = ZoneInfo(config.MARKET_TIMEZONE)
+
+REGULAR = "regular"
+EXTENDED = "extended"
+CLOSED = "closed"
+
+
+def market_session(now=None):
+    """
+    Which trading session the market is in: regular hours, pre or after hours, or closed
+    Weekends and exchange holidays are closed all day
+    """
+    now = (now or datetime.datetime.now(datetime.timezone.utc)).astimezone(MARKET_TIMEZONE)
+    if now.weekday() >= 5 or now.date().isoformat() in config.MARKET_HOLIDAYS:
+        return CLOSED
+
+    current = now.time()
+    regular_open, regular_close = (datetime.time.fromisoformat(value) for value in config.MARKET_REGULAR_HOURS)
+    extended_open, extended_close = (datetime.time.fromisoformat(value) for value in config.MARKET_EXTENDED_HOURS)
+    if regular_open <= current < regular_close:
+        return REGULAR
+    if extended_open <= current < extended_close:
+        return EXTENDED
+    return CLOSED
@@ -0,0 +1,95 @@
+import datetime
+import threading
+import time
+import config
+
+from database.queries import fetch_news_coverage, save_news, fetch_stored_news
+from stocks.fetcher import fetch_all
+
+
+def date_range(from_date, to_date):
+    day = from_date
+    while day <= to_date:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+def contiguous_ranges(days):
+    """
+    Collapse sorted days into (start, end) ranges, so each gap costs one upstream call
+    """
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] + datetime.timedelta(days=1) == day:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(day_range) for day_range in ranges]
+
+
+def utc_timestamp(day):
+    return int(datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc).timestamp())
+
+
+def load_news(symbols, from_date, to_date, fetch_news, timeout=None):
+    """
+    News per symbol for the date range, served from the news store
+    Only days not fetched before are requested upstream, and today is always refreshed
+    Returns ({symbol: [articles]}, {symbol: error}) for symbols whose missing days could not be fetched
+    """
+    if not symbols:
+        return {}, {}
+    today = datetime.date.today()
+    coverage = fetch_news_coverage(symbols, from_date, to_date)
+
+    requests = []
+    for symbol in symbols:
+        covered = coverage.get(symbol, set())
+        missing = [day for day in date_range(from_date, min(to_date, today)) if day == today or day not in covered]
+        requests.extend((symbol, start, end) for start, end in contiguous_ranges(missing))
+
+    errors = {}
+    fetched = {}
+    covered_days = []
+    for result in fetch_all(lambda request: fetch_news(*request), requests, timeout=timeout):
+        symbol, start, end = result.key
+        if result.error is not None:
+            errors[symbol] = result.error
+            continue
+        fetched.setdefault(symbol, []).extend(article for article in result.value if article.get("id"))
+        covered_days.extend((symbol, day) for day in date_range(start, end) if day < today)
+    if fetched or covered_days:
+        save_news(fetched, covered_days)
+
+    news = fetch_stored_news(symbols, utc_timestamp(from_date), utc_timestamp(to_date + datetime.timedelta(days=1)))
+    return news, errors
+
+
+class NewsSchedule:
+    """
+    Decides which symbols' news goes into alert runs, each symbol at most once per interval,
+    so frequent quote polls do not refetch today's news every time
+    A symbol counts as loaded only once its news was, a failed load is retried on the next run
+    """
+    def __init__(self, interval=config.ALERT_NEWS_INTERVAL):
+        self.interval = interval
+        self._loaded_at = {}
+        self._lock = threading.Lock()
+
+    def due(self, symbols):
+        """
+        The symbols whose news is due
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [symbol for symbol in symbols
+                    if symbol not in self._loaded_at or now - self._loaded_at[symbol] >= self.interval]
+
+    def loaded(self, symbols):
+        """
+        Mark symbols whose news was loaded, they are not due again for interval
+        """
+        now = time.monotonic()
+        with self._lock:
+            for symbol in symbols:
+                self._loaded_at[symbol] = now
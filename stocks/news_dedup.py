@@ -0,0 +1,96 @@
+import re
+import config
+
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+SOURCE_SUFFIX = re.compile(r"\s+[-|–—]\s+([^-|–—]{1,40})$")
+NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_url(url):
+    """
+    Same article behind different schemes, hosts with www, trailing slashes or tracking parameters
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query) if not key.lower().startswith("utm_")])
+    return host + parts.path.rstrip("/") + ("?" + query if query else "")
+
+
+def normalize_text(text):
+    return NON_WORD.sub(" ", text.lower()).strip()
+
+
+def normalize_headline(headline, source=None):
+    """
+    Syndicated copies of a headline differ in case, punctuation and a trailing source name
+    The trailing " - Name" is only dropped when it names the article's own source, other endings are part of the headline
+    """
+    headline = headline.strip()
+    match = SOURCE_SUFFIX.search(headline)
+    if match and source and normalize_text(match.group(1)) == normalize_text(source):
+        headline = headline[:match.start()]
+    return normalize_text(headline)
+
+
+def same_story(article, other, window=config.NEWS_NEAR_DUPLICATE_WINDOW):
+    """
+    Articles with the same normalized headline are one story when they share a source or were published within window
+    """
+    if article.get("source") and normalize_text(article["source"]) == normalize_text(other.get("source") or ""):
+        return True
+    if article.get("datetime") is None or other.get("datetime") is None:
+        return False
+    return abs(int(article["datetime"]) - int(other["datetime"])) <= window
+
+
+class NewsIndex:
+    """
+    Hash index that keeps one entry per article across every symbol it is returned for
+    Articles match on id, url or exact headline, and when near_duplicates is set on normalized headline
+    from the same source or published close together
+    Each add is a constant number of dict lookups, plus a look at the few entries sharing a normalized headline,
+    so indexing n articles is linear
+    """
+    def __init__(self, near_duplicates=config.NEWS_NEAR_DUPLICATES):
+        self.near_duplicates = near_duplicates
+        self._entries = {}
+        self._near = {}
+        self._by_symbol = {}
+
+    def _keys(self, article):
+        keys = []
+        if article.get("id"):
+            keys.append(("id", article["id"]))
+        if article.get("url"):
+            keys.append(("url", normalize_url(article["url"])))
+        if article.get("headline"):
+            keys.append(("headline", article["headline"]))
+        return keys
+
+    def add(self, symbol, article):
+        keys = self._keys(article)
+        entry = next((self._entries[key] for key in keys if key in self._entries), None)
+        near_key = None
+        if self.near_duplicates and article.get("headline"):
+            near_key = normalize_headline(article["headline"], article.get("source"))
+            if entry is None:
+                entry = next((near for near in self._near.get(near_key, []) if same_story(article, near["article"])), None)
+        if entry is None:
+            entry = {"article": article, "symbols": []}
+        for key in keys:
+            self._entries.setdefault(key, entry)
+        if near_key is not None:
+            near_entries = self._near.setdefault(near_key, [])
+            if not any(near is entry for near in near_entries):
+                near_entries.append(entry)
+
+        if symbol not in entry["symbols"]:
+            entry["symbols"].append(symbol)
+            self._by_symbol.setdefault(symbol, []).append(entry)
+        return entry
+
+    def entries(self, symbol):
+        return self._by_symbol.get(symbol, [])
@@ -0,0 +1,141 @@
+import datetime
+import threading
+import config
+
+from database.queries import fetch_profiles, save_profiles, fetch_stale_profile_symbols
+from stocks.cache import TTLCache
+from stocks.fetcher import fetch_all, FetchResult
+from api.ratelimit import request_priority, BACKFILL
+from api.resilience import remaining_time
+
+
+def utcnow():
+    # stock_profile.fetched_at is a naive UTC DATETIME
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+class ProfileCache:
+    """
+    Read-through company profiles: in-memory LRU first, then the database, then Finnhub
+    Symbols without a profile are cached as {} so invalid symbols are not looked up again until negative_ttl passes
+    Stored profiles are served however old they are, refresh_stale updates them in the background
+    """
+    def __init__(self, fetch_profile, ttl=config.PROFILE_TTL, negative_ttl=config.PROFILE_NEGATIVE_TTL, memory=None):
+        self.fetch_profile = fetch_profile
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = memory or TTLCache(config.PROFILE_CACHE_TTL, config.PROFILE_CACHE_MAX_SIZE)
+
+        self._lock = threading.Lock()
+        self._stored_hits = 0
+        self._upstream_fetches = 0
+        self._refreshed = 0
+        self._refresh_errors = 0
+
+    def get(self, symbol):
+        """
+        Profile for symbol, {} when Finnhub has none
+        """
+        return self.memory.get_or_load(symbol, lambda key: self._load([key])[key])
+
+    def get_many(self, symbols, timeout=None):
+        """
+        Profiles for several symbols with one database lookup and concurrent upstream fetches for the rest
+        Returns FetchResult(symbol, profile, error) in input order
+        """
+        symbols = list(symbols)
+        found = {}
+        for symbol in dict.fromkeys(symbols):
+            profile = self.memory.get(symbol)
+            if profile is not None:
+                found[symbol] = FetchResult(symbol, profile, None)
+
+        missing = [symbol for symbol in dict.fromkeys(symbols) if symbol not in found]
+        for symbol, result in self._load(missing, timeout=timeout, errors=True).items():
+            found[symbol] = result
+        return [found[symbol] for symbol in symbols]
+
+    def _load(self, symbols, timeout=None, errors=False):
+        """
+        Look symbols up in the database, fetch the rest upstream and store what was fetched
+        With errors=False the first upstream error is raised, otherwise each symbol gets a FetchResult
+        """
+        if not symbols:
+            return {}
+        now = utcnow()
+        stored = fetch_profiles(symbols)
+
+        results = {}
+        unknown = []
+        for symbol in symbols:
+            profile, fetched_at = stored.get(symbol, (None, None))
+            if profile is not None:
+                results[symbol] = FetchResult(symbol, profile, None)
+            elif fetched_at is not None and (now - fetched_at).total_seconds() < self.negative_ttl:
+                results[symbol] = FetchResult(symbol, {}, None)
+            else:
+                unknown.append(symbol)
+        with self._lock:
+            self._stored_hits += len(results)
+            self._upstream_fetches += len(unknown)
+
+        if timeout is None:
+            timeout = remaining_time()
+        rows = []
+        for result in fetch_all(self.fetch_profile, unknown, timeout=timeout):
+            if result.error is None:
+                profile = result.value if result.value and result.value.get("name") else {}
+                rows.append((result.key, profile or None, now))
+                result = FetchResult(result.key, profile, None)
+            elif not errors:
+                raise result.error
+            results[result.key] = result
+        if rows:
+            save_profiles(rows)
+
+        for result in results.values():
+            if result.error is None:
+                self.memory.set(result.key, result.value)
+        return results if errors else {symbol: result.value for symbol, result in results.items()}
+
+    def refresh_stale(self, limit=config.PROFILE_REFRESH_BATCH):
+        """
+        Refetch the oldest stored profiles and fill in stocks that have none yet
+        A symbol that now returns no profile keeps its previous one, tracked stocks are not invalidated here
+        """
+        fetched_before = utcnow() - datetime.timedelta(seconds=self.ttl)
+        symbols = fetch_stale_profile_symbols(fetched_before, limit)
+        if not symbols:
+            return None
+
+        previous = fetch_profiles(symbols)
+        with request_priority(BACKFILL):
+            results = fetch_all(self.fetch_profile, symbols)
+        now = utcnow()
+        rows = []
+        for result in results:
+            if result.error is not None:
+                continue
+            profile = result.value if result.value and result.value.get("name") else previous.get(result.key, (None, None))[0]
+            # Stored again even when unchanged, so the symbol waits a full ttl before its next refresh
+            if profile:
+                rows.append((result.key, profile, now))
+        if rows:
+            save_profiles(rows)
+        for symbol, profile, _ in rows:
+            self.memory.set(symbol, profile)
+
+        with self._lock:
+            self._refreshed += len(rows)
+            self._refresh_errors += sum(1 for result in results if result.error is not None)
+        return {"refreshed": len(rows), "stale": len(symbols)}
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "stored_hits": self._stored_hits,
+                "upstream_fetches": self._upstream_fetches,
+                "refreshed": self._refreshed,
+                "refresh_errors": self._refresh_errors,
+            }
+        return dict(self.memory.stats(), **stats)
@@ -0,0 +1,252 @@
+import datetime
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+import config
+
+from concurrent.futures import ThreadPoolExecutor
+from database.queries import fetch_tracked_symbols, claim_scheduler_leader, release_scheduler_leader
+from stocks.stocks import get_tracked_stocks, profile_cache, finnhub_limiter
+from stocks.alert_worker import AlertWorker
+from stocks.history import rollup_quote_history, expire_quote_history
+from stocks.market import market_session
+from logger import get_logger_with_context
+
+LEADER_NAME = "stock_market_bot.scheduler"
+
+
+def isoformat(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat()
+
+
+class Job:
+    """
+    A function run every intervals[session] seconds, paused in sessions without an interval
+    An exclusive job only runs in the process leading the schedulers, other jobs run in every process
+    """
+    def __init__(self, name, fn, intervals, exclusive=True):
+        self.name = name
+        self.fn = fn
+        self.intervals = intervals
+        self.exclusive = exclusive
+
+        self.running = False
+        self.next_run = None
+        self.last_started = None
+        self.last_duration = None
+        self.last_error = None
+        self.runs = 0
+        self.skipped_overlaps = 0
+
+    def status(self, session):
+        return {
+            "name": self.name,
+            "interval": self.intervals.get(session),
+            "running": self.running,
+            "next_run": isoformat(self.next_run),
+            "last_started": isoformat(self.last_started),
+            "last_duration_ms": round(self.last_duration * 1000, 3) if self.last_duration is not None else None,
+            "last_error": self.last_error,
+            "runs": self.runs,
+            "skipped_overlaps": self.skipped_overlaps,
+        }
+
+
+class Scheduler:
+    """
+    In-process scheduler for tracking and alert runs
+    A job never overlaps itself: a run that is still going when the next one is due is skipped
+    With leader election every worker process runs a scheduler, but only the one holding the scheduler_leader lease
+    runs exclusive jobs, so their schedule lives in one process. It renews the lease every tick,
+    and when it stops renewing another process takes over once leader_ttl has passed
+    """
+    def __init__(self, tick=config.SCHEDULER_TICK, leader_election=config.SCHEDULER_LEADER_ELECTION,
+                 leader_ttl=config.SCHEDULER_LEADER_TTL, worker_id=None):
+        self.tick = tick
+        self.leader_election = leader_election
+        self.leader_ttl = leader_ttl
+        self.worker_id = worker_id or "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self.leader = not leader_election
+        self.jobs = {}
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._executor = None
+        self._thread = None
+
+    def add_job(self, name, fn, intervals, exclusive=True):
+        with self._lock:
+            self.jobs[name] = Job(name, fn, intervals, exclusive)
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.jobs), 1), thread_name_prefix="scheduler")
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self.leader_election and self.leader:
+            self.leader = False
+            release_scheduler_leader(LEADER_NAME, self.worker_id)
+
+    def elect(self, now):
+        """
+        Take or renew the leadership, returns whether this scheduler leads
+        """
+        try:
+            leader = claim_scheduler_leader(LEADER_NAME, self.worker_id, now, now + self.leader_ttl)
+        except Exception:
+            get_logger_with_context("scheduler").exception("Scheduler leader election failed")
+            leader = False
+        if leader != self.leader:
+            get_logger_with_context("scheduler").info("Scheduler %s %s leader", self.worker_id, "became" if leader else "is no longer")
+        self.leader = leader
+        return leader
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self.run_pending()
+            self._stopped.wait(self.tick)
+
+    def run_pending(self):
+        session = market_session()
+        now = time.time()
+        if self.leader_election:
+            self.elect(now)
+        with self._lock:
+            for job in self.jobs.values():
+                interval = job.intervals.get(session)
+                # A new leader starts exclusive jobs afresh, staggered as on startup
+                if interval is None or (job.exclusive and not self.leader):
+                    job.next_run = None
+                    continue
+                if job.next_run is None:
+                    # Spread first runs so jobs started together don't all fire on the same tick
+                    job.next_run = now + stagger_offset(job.name, interval)
+                if job.next_run > now:
+                    continue
+
+                job.next_run = now + interval
+                if job.running:
+                    job.skipped_overlaps += 1
+                    continue
+                job.running = True
+                self._executor.submit(self._run, job, session)
+
+    def _run(self, job, session):
+        logger = get_logger_with_context("scheduler")
+        job.last_started = time.time()
+        start = time.monotonic()
+        try:
+            result = job.fn(session)
+            job.last_error = None
+            job.runs += 1
+            if result:
+                logger.info("Scheduled job %s: %s", job.name, result)
+        except Exception as error:
+            job.last_error = str(error)
+            logger.exception("Scheduled job %s failed", job.name)
+        finally:
+            job.last_duration = time.monotonic() - start
+            job.running = False
+
+    def status(self):
+        session = market_session()
+        with self._lock:
+            jobs = [job.status(session) for job in self.jobs.values()]
+        status = {"session": session, "worker_id": self.worker_id, "leader": self.leader, "jobs": jobs}
+        tracking = self.jobs.get("tracking")
+        if tracking is not None and isinstance(tracking.fn, TrackingJob):
+            status["tracking"] = tracking.fn.schedule()
+        return status
+
+
+def stagger_offset(key, interval):
+    """
+    Stable offset within the interval, so polls for different keys are spread evenly
+    """
+    return (zlib.crc32(key.encode()) % 1000) / 1000 * interval
+
+
+class TrackingJob:
+    """
+    Polls each tracked symbol on its own staggered interval for the current session,
+    then runs alerts only for the symbols that came due
+    """
+    def __init__(self, run_alerts, symbols_loader=fetch_tracked_symbols):
+        self.run_alerts = run_alerts
+        self.symbols_loader = symbols_loader
+        self._next_due = {}
+
+    def __call__(self, session):
+        interval = config.TRACKING_INTERVALS.get(session)
+        if interval is None:
+            return None
+
+        now = time.time()
+        due = set()
+        next_due = {}
+        for symbol in self.symbols_loader():
+            due_at = self._next_due.get(symbol)
+            if due_at is None:
+                due_at = now + stagger_offset(symbol, interval)
+            # Pull polls forward when the session switches to a shorter interval
+            due_at = min(due_at, now + interval)
+            if due_at <= now:
+                due.add(symbol)
+                due_at = now + interval
+            next_due[symbol] = due_at
+        self._next_due = next_due
+
+        if not due:
+            return None
+        return self.run_alerts(due)
+
+    def schedule(self):
+        next_due = self._next_due
+        upcoming = sorted(next_due.items(), key=lambda item: item[1])[:config.SCHEDULER_STATUS_UPCOMING]
+        return {
+            "symbols": len(next_due),
+            "upcoming": [{"symbol": symbol, "next_poll": isoformat(due_at)} for symbol, due_at in upcoming],
+        }
+
+
+scheduler = None
+alert_worker = None
+
+
+def start_scheduler():
+    global scheduler, alert_worker
+    if scheduler is None:
+        scheduler = Scheduler()
+        tracking_intervals = {session: config.SCHEDULER_TICK for session, interval in config.TRACKING_INTERVALS.items() if interval}
+        if config.ALERT_SHARDING:
+            # Shard leases keep workers apart, every worker runs its own share
+            alert_worker = AlertWorker(serving_limiter=finnhub_limiter)
+            scheduler.add_job("tracking", TrackingJob(alert_worker.run), tracking_intervals, exclusive=False)
+        else:
+            scheduler.add_job("tracking", TrackingJob(get_tracked_stocks), tracking_intervals)
+        scheduler.add_job("profiles", lambda session: profile_cache.refresh_stale(),
+                          {session: config.PROFILE_REFRESH_INTERVAL for session in config.TRACKING_INTERVALS})
+        scheduler.add_job("quote_rollup", lambda session: rollup_quote_history(),
+                          {session: config.QUOTE_ROLLUP_INTERVAL for session in config.TRACKING_INTERVALS})
+        scheduler.add_job("quote_retention", lambda session: expire_quote_history(),
+                          {session: config.QUOTE_RETENTION_INTERVAL for session in config.TRACKING_INTERVALS})
+        scheduler.start()
+    return scheduler
+
+
+def get_scheduler_status():
+    if scheduler is None:
+        return {"enabled": False, "session": market_session()}
+    status = dict(scheduler.status(), enabled=True)
+    if alert_worker is not None:
+        status["alert_worker"] = alert_worker.status()
+    return status
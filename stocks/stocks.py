@@ -7,22 +7,79 @@ import datetime
 from flask import Blueprint, request, jsonify
 from dotenv import load_dotenv
 from database.database import Database
-from api.adapters import TimeoutHTTPAdapter, retries
+from database.queries import (fetch_tracked_stocks, fetch_tracked_stocks_page, stream_tracked_stocks, fetch_tracked_stocks_in,
+                              REPLACE_STOCK_TRACKER_SQL)
+from stocks.fetcher import fetch_all, chunked, Deadline, FetchResult
+from stocks.cache import create_quote_cache
+from stocks.profiles import ProfileCache
+from stocks.history import QuoteHistoryWriter
+from stocks.stream import live_prices
+from stocks.alerts import AlertEngine
+from stocks.news import load_news, NewsSchedule
+from stocks.news_dedup import NewsIndex
+from api.adapters import TimeoutHTTPAdapter, UPSTREAM_ERRORS, retries
+from api.ratelimit import create_finnhub_limiter, request_priority, CRON, RateLimitExceeded
+from api.resilience import UpstreamGuard, CircuitOpenError, remaining_time
+from metrics import finnhub_request_duration, finnhub_responses, alert_run_duration
 
 load_dotenv()
 
 FINNHUB_TOKEN = os.getenv("FINNHUB_TOKEN")
 
-STOCK_QUOTE_URL = "https://finnhub.io/api/v1/quote?token={token}&symbol={symbol}"
-STOCK_PROFILE_URL = "https://finnhub.io/api/v1/stock/profile2?token={token}&symbol={symbol}"
-STOCK_NEWS_URL = "https://finnhub.io/api/v1/company-news?symbol={symbol}&from={from_date}&to={to_date}&token={token}"
+STOCK_QUOTE_URL = config.FINNHUB_API_URL + "/quote?token={token}&symbol={symbol}"
+STOCK_PROFILE_URL = config.FINNHUB_API_URL + "/stock/profile2?token={token}&symbol={symbol}"
+STOCK_NEWS_URL = config.FINNHUB_API_URL + "/company-news?symbol={symbol}&from={from_date}&to={to_date}&token={token}"
 
 http = requests.Session()
-http.mount("https://", TimeoutHTTPAdapter(max_retries=retries))
+http.mount("https://", TimeoutHTTPAdapter(pool_maxsize=config.FETCH_MAX_WORKERS))
+# Plain HTTP only reaches local stand-ins such as stocks.fake_finnhub
+http.mount("http://", TimeoutHTTPAdapter(pool_maxsize=config.FETCH_MAX_WORKERS))
+
+quote_cache = create_quote_cache()
+quote_history = QuoteHistoryWriter()
+finnhub_limiter = create_finnhub_limiter()
+
+
+# Failures answered with the last cached quote, in both serving modes
+QUOTE_FALLBACK_ERRORS = (CircuitOpenError, RateLimitExceeded) + UPSTREAM_ERRORS
+
+upstream_guards = {
+    endpoint: UpstreamGuard(endpoint, hedge=endpoint in config.HEDGE_ENDPOINTS, ignored=(RateLimitExceeded,))
+    for endpoint in ("quote", "profile", "news")
+}
+
+
+def finnhub_get(endpoint, url):
+    """
+    Every Finnhub call goes through the endpoint's circuit breaker and
+    waits for a rate limit token at the caller's priority before going upstream, retries included
+    """
+    def attempt():
+        finnhub_limiter.acquire(timeout=remaining_time())
+        return http.get(url)
+
+    def send():
+        with finnhub_request_duration.time(endpoint=endpoint):
+            r = retries.send(attempt, url)
+        return finnhub_response(endpoint, r)
+
+    return upstream_guards[endpoint].call(send)
+
+
+def finnhub_response(endpoint, r):
+    """
+    Count a Finnhub response after retries, server errors are raised so they count against the circuit breaker
+    """
+    finnhub_responses.inc(endpoint=endpoint, status=r.status_code)
+    if r.status_code >= 500:
+        r.raise_for_status()
+    return r
+
 
 def get_stock_quote(symbol):
     """
-    Get real-time quote data for a given stock symbol
+    Get real-time quote data for a given stock symbol, served from the streamed price or the quote cache
+    while fresh and from the last cached quote while Finnhub is unhealthy
     response = {
         "c": 261.74,
         "h": 263.31,
@@ -32,18 +89,76 @@ def get_stock_quote(symbol):
         "t": 1582641000 
     }
     """
-    r = http.get(STOCK_QUOTE_URL.format(token=FINNHUB_TOKEN, symbol=symbol))
+    live_quote = get_live_quote(symbol)
+    if live_quote is not None:
+        return live_quote
+    return quote_cache.get_or_load(symbol, fetch_stock_quote, stale_on=QUOTE_FALLBACK_ERRORS)
+
+
+def get_live_quote(symbol):
+    """
+    Quote from the streamed last trade, None when the stream has no fresh price for the symbol
+    """
+    live_price = live_prices.get(symbol, config.STREAM_MAX_AGE)
+    if live_price is None:
+        return None
+    price, trade_time = live_price
+    return {"c": price, "t": trade_time // 1000}
+
+
+def get_stock_quotes(symbols, timeout=None):
+    """
+    Quotes for many symbols in input order as FetchResults,
+    only symbols without a fresh streamed price are fetched, concurrently
+    """
+    live_quotes = {symbol: get_live_quote(symbol) for symbol in symbols}
+    missing = [symbol for symbol in symbols if live_quotes[symbol] is None]
+    fetched = {result.key: result for result in fetch_all(get_stock_quote, missing, timeout=timeout)}
+    return [fetched.get(symbol) or FetchResult(symbol, live_quotes[symbol], None) for symbol in symbols]
+
+
+def fetch_stock_quote(symbol):
+    """
+    Get a quote from Finnhub, bypassing the quote cache, and append it to the quote history
+    """
+    r = finnhub_get("quote", STOCK_QUOTE_URL.format(token=FINNHUB_TOKEN, symbol=symbol))
+    return quote_response(symbol, r)
+
+
+def quote_response(symbol, r):
+    """
+    Quote from a Finnhub response, appended to the quote history
+    """
     response = r.json()
+    if config.QUOTE_HISTORY_ENABLED:
+        quote_history.record(symbol, response)
     return response
 
 
+def fetch_stock_profile(symbol):
+    """
+    Get a company profile from Finnhub, bypassing the profile cache
+    """
+    r = finnhub_get("profile", STOCK_PROFILE_URL.format(token=FINNHUB_TOKEN, symbol=symbol))
+    response = r.json()
+    return response
+
+
+profile_cache = ProfileCache(fetch_stock_profile)
+
+
+def get_stock_profile(symbol):
+    """
+    Company profile from the profile cache, {} for symbols Finnhub has no profile for
+    """
+    return profile_cache.get(symbol)
+
+
 def get_stock_name(symbol):
     """
     Make sure symbol is trackable
     """
-    r = http.get(STOCK_PROFILE_URL.format(token=FINNHUB_TOKEN, symbol=symbol))
-    response = r.json()
-    return response.get("name")
+    return get_stock_profile(symbol).get("name")
 
 
 def get_stock_related_news(symbol, from_date, to_date):
@@ -63,7 +178,7 @@ def get_stock_related_news(symbol, from_date, to_date):
         }
     ] 
     """
-    r = http.get(STOCK_NEWS_URL.format(token=FINNHUB_TOKEN, symbol=symbol, from_date=from_date, to_date=to_date))
+    r = finnhub_get("news", STOCK_NEWS_URL.format(token=FINNHUB_TOKEN, symbol=symbol, from_date=from_date, to_date=to_date))
     response = r.json()
     return response
 
@@ -78,104 +193,168 @@ def calculate_percent_change(response, avg_purchase_cost):
     return percent_difference
     
 
+alert_engine = AlertEngine(calculate_percent_change)
+alert_news = NewsSchedule()
+
+
 def insert_stock_tracker(stock_id, avg_purchase_cost, percent, increase, decrease):
     """
     Insert tracked stock average cost, percent, increase, decrease into database
     """
     with Database(config.DATABASE) as db:
-        db.execute("REPLACE INTO stock_tracker (avg_purchase_cost, percent, increase, decrease, stock_id) VALUES(%s,%s,%s,%s,%s)", (avg_purchase_cost, percent, increase, decrease, stock_id))
+        db.execute(REPLACE_STOCK_TRACKER_SQL, (avg_purchase_cost, percent, increase, decrease, stock_id))
 
 
-def get_list_of_tracked_stocks(symbol):
-    with Database(config.DATABASE) as db:
-        if symbol:
-            db.execute("SELECT * FROM stock_tracker JOIN stock ON stock.id = stock_tracker.stock_id WHERE stock.symbol=%s", [symbol]) 
-            tracked_stocks = [db.fetchone()]
-        else:
-            db.execute("SELECT * FROM stock_tracker")
-            tracked_stocks = db.fetchall()
-    
-    return tracked_stocks
+def get_list_of_tracked_stocks(symbol, stream=False):
+    """
+    Tracked stocks joined with their symbol and name
+    With stream=True rows are yielded from a server-side cursor instead of loaded at once
+    """
+    if stream:
+        return stream_tracked_stocks(symbol)
+    return fetch_tracked_stocks(symbol)
+
+
+def render_news_article(entry, detailed):
+    """
+    Response dict for an indexed article, built once and shared by every symbol it is linked to
+    """
+    if "rendered" not in entry:
+        news = entry["article"]
+        current_news_dict = {"headline": news.get("headline"), "url": news.get("url"), "symbols": entry["symbols"]}
+        if detailed:
+            current_news_dict["datetime"] = datetime.datetime.fromtimestamp(int(news.get("datetime"))).strftime('%Y-%m-%d %H:%M:%S')
+            current_news_dict["source"] = news.get("source")
+            current_news_dict["summary"] = news.get("summary")
+            current_news_dict["related"] = news.get("related")
+        entry["rendered"] = current_news_dict
+    return entry["rendered"]
+
+
+def generate_tracked_stocks_news(tracked_stocks, detailed, from_date, to_date, news_index=None):
+    """
+    News for every tracked stock a chunk at a time, served from the news store
+    Days missing from the store are fetched concurrently within one overall deadline
+    Articles shared by several symbols are kept once in a NewsIndex and linked to each of them,
+    without a news_index each chunk gets its own so memory stays bounded by the chunk size
+    """
+    deadline = Deadline()
+    for chunk in chunked(tracked_stocks, config.FETCH_CHUNK_SIZE):
+        if any(stock is None for stock in chunk):
+            return
+
+        chunk_index = news_index if news_index is not None else NewsIndex()
+        news, errors = load_news([stock_details.get("symbol") for stock_details in chunk], from_date, to_date,
+                                 get_stock_related_news, timeout=deadline.remaining())
+        for stock_details in chunk:
+            symbol = stock_details.get("symbol")
+            for article in news.get(symbol, []):
+                chunk_index.add(symbol, article)
+            tracked_stock_news_dict = {"symbol": symbol, "name": stock_details.get("name"),
+                                       "news_articles": [render_news_article(entry, detailed) for entry in chunk_index.entries(symbol)]}
+            if symbol in errors:
+                tracked_stock_news_dict["error"] = f"News unavailable: {errors[symbol]}"
+            yield tracked_stock_news_dict
 
 
 def construct_tracked_stocks_news(tracked_stocks, detailed, from_date, to_date):
-    if any(stock is None for stock in tracked_stocks):
-        return 
-
-    tracked_stocks_news_list = []
-    for stock_details in tracked_stocks:
-        with Database(config.DATABASE) as db:
-            db.execute("SELECT symbol, name FROM stock WHERE id=%s", [stock_details.get("stock_id")]) 
-            stock_profile = db.fetchone()
-
-        symbol = stock_profile.get("symbol")
-        name = stock_profile.get("name")
-        
-        stock_related_news = get_stock_related_news(symbol, from_date, to_date)
-        specific_stock_news = []
-        for news in stock_related_news:
-            if not any(stock_news.get("headline", None) == news.get("headline") for stock_news in specific_stock_news):
-                current_news_dict = {"headline": news.get("headline"), "url": news.get("url")}
-            
-                if detailed:
-                    current_news_dict["datetime"] = datetime.datetime.fromtimestamp(int(news.get("datetime"))).strftime('%Y-%m-%d %H:%M:%S')
-                    current_news_dict["source"] = news.get("source")
-                    current_news_dict["summary"] = news.get("summary")
-                    current_news_dict["related"] = news.get("related")
-                specific_stock_news.append(current_news_dict)
-
-        tracked_stock_news_dict = {"symbol": symbol, "name": name, "news_articles": specific_stock_news}
-        tracked_stocks_news_list.append(tracked_stock_news_dict)
-
-    return tracked_stocks_news_list
+    return list(generate_tracked_stocks_news(tracked_stocks, detailed, from_date, to_date, NewsIndex()))
 
 
-def construct_tracked_stocks_response(tracked_stocks, detailed):
-    if any(stock is None for stock in tracked_stocks):
-        return 
+def generate_tracked_stocks_response(tracked_stocks, detailed):
+    """
+    Tracked stocks with their percent difference when detailed,
+    quotes are fetched concurrently a chunk at a time within one overall deadline
+    """
+    deadline = Deadline()
+    for chunk in chunked(tracked_stocks, config.FETCH_CHUNK_SIZE):
+        if any(stock is None for stock in chunk):
+            return
 
-    tracked_stocks_list = []
-    for stock_details in tracked_stocks:
-        with Database(config.DATABASE) as db:
-            db.execute("SELECT symbol, name FROM stock WHERE id=%s", [stock_details.get("stock_id")]) 
-            stock_profile = db.fetchone()
+        if detailed:
+            results = get_stock_quotes([stock_details.get("symbol") for stock_details in chunk],
+                                       timeout=deadline.remaining())
+        else:
+            results = [None] * len(chunk)
+
+        for stock_details, result in zip(chunk, results):
+            yield tracked_stock_response(stock_details, result, detailed)
+
+
+def tracked_stock_response(stock_details, result, detailed):
+    """
+    Response dict for one tracked stock, result is its quote FetchResult when detailed
+    """
+    tracked_stock_dict = {"symbol": stock_details.get("symbol"), "name": stock_details.get("name")}
 
-        symbol = stock_profile.get("symbol")
-        name = stock_profile.get("name")
+    if detailed:
         avg_purchase_cost = stock_details.get("avg_purchase_cost")
-        percent = stock_details.get("percent")
-        increase = bool(stock_details.get("increase"))
-        decrease = bool(stock_details.get("decrease"))
-        last_modified = stock_details.get("last_modified")
-
-        response = get_stock_quote(symbol)
-        tracked_stock_dict = {"symbol": symbol, "name": name}
-        
-        if detailed:
-            percent_difference = calculate_percent_change(response, avg_purchase_cost)
-            tracked_stock_dict["percent_difference"] = percent_difference
-            tracked_stock_dict["last_modified"] = last_modified
-            tracked_stock_dict["alert_on_increase"] = increase
-            tracked_stock_dict["alert_on_decrease"] = decrease
-            tracked_stock_dict["avg_purchase_cost"] = avg_purchase_cost
-            tracked_stock_dict["percent_to_track_threshold"] = percent
+        if result.error is not None:
+            tracked_stock_dict["error"] = f"Quote unavailable: {result.error}"
+        else:
+            tracked_stock_dict["percent_difference"] = calculate_percent_change(result.value, avg_purchase_cost)
+        tracked_stock_dict["last_modified"] = stock_details.get("last_modified")
+        tracked_stock_dict["alert_on_increase"] = bool(stock_details.get("increase"))
+        tracked_stock_dict["alert_on_decrease"] = bool(stock_details.get("decrease"))
+        tracked_stock_dict["avg_purchase_cost"] = avg_purchase_cost
+        tracked_stock_dict["percent_to_track_threshold"] = stock_details.get("percent")
 
-        tracked_stocks_list.append(tracked_stock_dict)
+    return tracked_stock_dict
 
-    return tracked_stocks_list
+
+def construct_tracked_stocks_response(tracked_stocks, detailed):
+    return list(generate_tracked_stocks_response(tracked_stocks, detailed))
 
 
-def get_tracked_stocks_details(detailed, symbol=None):
-    tracked_stocks = get_list_of_tracked_stocks(symbol)
+def get_tracked_stocks_details(detailed, symbol=None, stream=False):
+    """
+    Tracked stocks as a list, or with stream=True as a generator fed from a server-side cursor
+    """
+    tracked_stocks = get_list_of_tracked_stocks(symbol, stream)
+    if stream:
+        return generate_tracked_stocks_response(tracked_stocks, detailed)
     tracked_stocks_response = construct_tracked_stocks_response(tracked_stocks, detailed)
     return tracked_stocks_response
 
-def get_tracked_stocks_news_details(detailed, from_date, to_date, symbol=None):
-    tracked_stocks = get_list_of_tracked_stocks(symbol)
+def get_tracked_stocks_news_details(detailed, from_date, to_date, symbol=None, stream=False):
+    """
+    News per tracked stock as a list, or with stream=True as a generator fed from a server-side cursor
+    """
+    tracked_stocks = get_list_of_tracked_stocks(symbol, stream)
+    if stream:
+        return generate_tracked_stocks_news(tracked_stocks, detailed, from_date, to_date)
     tracked_stocks_list_news = construct_tracked_stocks_news(tracked_stocks, detailed, from_date, to_date)
     return tracked_stocks_list_news
 
 
+def get_tracked_stocks_page(detailed, after_id, limit, symbol=None):
+    """
+    Up to limit tracked stocks with an id after after_id, in id order
+    Returns (tracked stocks, id to continue after), the id is None on the last page
+    """
+    tracked_stocks, next_after_id = get_tracked_stocks_rows_page(after_id, limit, symbol)
+    return construct_tracked_stocks_response(tracked_stocks, detailed), next_after_id
+
+
+def get_tracked_stocks_news_page(detailed, from_date, to_date, after_id, limit, symbol=None):
+    """
+    News for up to limit tracked stocks with an id after after_id, in id order
+    Returns (news per tracked stock, id to continue after), the id is None on the last page
+    """
+    tracked_stocks, next_after_id = get_tracked_stocks_rows_page(after_id, limit, symbol)
+    return construct_tracked_stocks_news(tracked_stocks, detailed, from_date, to_date), next_after_id
+
+
+def get_tracked_stocks_rows_page(after_id, limit, symbol=None):
+    if symbol:
+        return fetch_tracked_stocks(symbol), None
+    # One extra row tells whether another page follows, so the last page never points at an empty one
+    tracked_stocks = fetch_tracked_stocks_page(after_id, limit + 1)
+    if len(tracked_stocks) > limit:
+        return tracked_stocks[:limit], tracked_stocks[limit - 1]["id"]
+    return tracked_stocks, None
+
+
 def trigger_alert(stocks_increased, stocks_decreased, tracked_stocks_news_list):
     """
     Trigger alert given tracked stocks that increased or decreased and news list
@@ -203,34 +382,71 @@ def trigger_alert(stocks_increased, stocks_decreased, tracked_stocks_news_list):
         return increase_alert_message + "\n" + decrease_alert_message 
     
     stocks_news_message = "Stock News: \n"
+    rendered_articles = set()
     for stock in tracked_stocks_news_list:
         for news_article in stock.get("news_articles"):
-            stocks_news_message = (stocks_news_message + 
-                                    "[{symbol}]{name} - {headline}\n".format(
-                                    symbol=stock.get("symbol"), name=stock.get("name"), 
-                                    headline=news_article.get("headline")))
+            # Articles linked to several symbols are listed once with all of them
+            article_key = (news_article.get("headline"), news_article.get("url"))
+            if article_key in rendered_articles:
+                continue
+            rendered_articles.add(article_key)
+            symbols = news_article.get("symbols") or [stock.get("symbol")]
+            if len(symbols) > 1:
+                stocks_news_message = (stocks_news_message +
+                                        "[{symbols}] - {headline}\n".format(
+                                        symbols=", ".join(symbols), headline=news_article.get("headline")))
+            else:
+                stocks_news_message = (stocks_news_message + 
+                                        "[{symbol}]{name} - {headline}\n".format(
+                                        symbol=stock.get("symbol"), name=stock.get("name"), 
+                                        headline=news_article.get("headline")))
 
     return increase_alert_message + "\n" + decrease_alert_message + "\n" + stocks_news_message
 
 
-def get_tracked_stocks():
+def get_tracked_stocks(symbols=None):
     """
     Run calculation of percent change for each tracked stock
     Trigger alert if increase or decrease is enabled and percent threshold is met
-    Cron will call this function
+    Cron or the scheduler will call this function, its upstream calls yield to interactive API requests
+    symbols limits the run to those tracked symbols
     """
-    tracked_stocks_list = get_tracked_stocks_details(detailed=True)
-    
-    stocks_increased = []
-    stocks_decreased = []
-    for stock_detail in tracked_stocks_list:
-        if stock_detail.get("alert_on_increase"):
-            if stock_detail.get("percent_difference") >= stock_detail.get("percent_to_track_threshold") and stock_detail.get("percent_difference") > 0:
-                stocks_increased.append({"symbol": stock_detail.get("symbol"), "name": stock_detail.get("name"), "percent_increase": stock_detail.get("percent_difference")})
-        if stock_detail.get("alert_on_decrease"):
-            if abs(stock_detail.get("percent_difference")) >= stock_detail.get("percent_to_track_threshold") and stock_detail.get("percent_difference") < 0:
-                stocks_decreased.append({"symbol": stock_detail.get("symbol"), "name": stock_detail.get("name"), "percent_decrease": stock_detail.get("percent_difference")})
+    with request_priority(CRON), alert_run_duration.time():
+        return run_tracked_stocks_alert(symbols)
+
+
+def get_list_of_tracked_stocks_in(symbols):
+    """
+    Every tracked stock streamed, or those among symbols looked up by symbol
+    """
+    if symbols is None:
+        return get_list_of_tracked_stocks(None, stream=True)
+    return fetch_tracked_stocks_in(symbols)
 
 
-    tracked_stocks_news_list = get_tracked_stocks_news_details(True, datetime.date.today(), datetime.date.today())
-    return trigger_alert(stocks_increased, stocks_decreased, tracked_stocks_news_list)
\ No newline at end of file
+def run_tracked_stocks_alert(symbols=None):
+    """
+    Quotes are fetched a chunk of positions at a time and handed to the alert engine,
+    which only reports positions that crossed a threshold since the last run
+    News is only loaded for positions alert_news says are due, from the same single pass over the positions
+    """
+    # Runs move between processes, start from what the last one saved
+    alert_engine.reload()
+    deadline = Deadline()
+    stocks_increased = []
+    stocks_decreased = []
+    news_stocks = []
+    for chunk in chunked(get_list_of_tracked_stocks_in(symbols), config.FETCH_CHUNK_SIZE):
+        results = get_stock_quotes([stock_details.get("symbol") for stock_details in chunk], timeout=deadline.remaining())
+        quotes = {result.key: result.value for result in results if result.error is None}
+        increased, decreased = alert_engine.evaluate(chunk, quotes)
+        stocks_increased.extend(increased)
+        stocks_decreased.extend(decreased)
+        news_due = set(alert_news.due([stock_details.get("symbol") for stock_details in chunk]))
+        news_stocks.extend({"symbol": stock_details.get("symbol"), "name": stock_details.get("name")}
+                           for stock_details in chunk if stock_details.get("symbol") in news_due)
+    alert_engine.flush()
+
+    tracked_stocks_news_list = construct_tracked_stocks_news(news_stocks, True, datetime.date.today(), datetime.date.today())
+    alert_news.loaded([stock_news["symbol"] for stock_news in tracked_stocks_news_list if "error" not in stock_news])
+    return trigger_alert(stocks_increased, stocks_decreased, tracked_stocks_news_list)
@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+import config
+
+from collections import deque
+from database.queries import fetch_tracked_symbols
+from logger import get_logger_with_context
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+
+class LivePriceStore:
+    """
+    Last traded price per symbol
+    Writers replace a whole tuple per symbol so readers never need a lock
+    """
+    def __init__(self):
+        self._prices = {}
+
+    def update(self, symbol, price, trade_time):
+        current = self._prices.get(symbol)
+        if current is None or trade_time >= current[1]:
+            self._prices[symbol] = (price, trade_time, time.monotonic())
+
+    def get(self, symbol, max_age=None):
+        """
+        (price, trade time in ms) for the symbol, None when missing or older than max_age seconds
+        """
+        entry = self._prices.get(symbol)
+        if entry is None:
+            return None
+        if max_age is not None and time.monotonic() - entry[2] > max_age:
+            return None
+        return entry[0], entry[1]
+
+    def discard(self, symbol):
+        self._prices.pop(symbol, None)
+
+    def __len__(self):
+        return len(self._prices)
+
+
+class QuoteStream:
+    """
+    Keeps a LivePriceStore current from Finnhub's trade WebSocket
+    One thread receives frames into a bounded queue, a second parses them into the store,
+    and a third keeps the subscriptions in step with the stock_tracker table
+    When ticks arrive faster than they are parsed the oldest frames are dropped,
+    since only the latest price per symbol matters
+    """
+    def __init__(self, url, store, queue_size=config.STREAM_QUEUE_SIZE,
+                 resubscribe_interval=config.STREAM_RESUBSCRIBE_INTERVAL, symbols_loader=fetch_tracked_symbols):
+        if websocket is None:
+            raise RuntimeError("The websocket-client package is required for quote streaming")
+        self.url = url
+        self.store = store
+        self.resubscribe_interval = resubscribe_interval
+        self.symbols_loader = symbols_loader
+
+        self._ws = None
+        self._subscribed = set()
+        self._subscription_lock = threading.Lock()
+        self._frames = deque(maxlen=queue_size)
+        self._frames_ready = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads = []
+
+        self._received = 0
+        self._dropped = 0
+        self._trades = 0
+        self._reconnects = 0
+
+    def start(self):
+        for target, name in ((self._receive_loop, "quote-stream-receive"),
+                             (self._apply_loop, "quote-stream-apply"),
+                             (self._resubscribe_loop, "quote-stream-resubscribe")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopped.set()
+        with self._frames_ready:
+            self._frames_ready.notify_all()
+        if self._ws is not None:
+            self._ws.close()
+
+    def _connect(self):
+        ws = websocket.create_connection(self.url, timeout=config.STREAM_RECEIVE_TIMEOUT)
+        with self._subscription_lock:
+            self._ws = ws
+            for symbol in self._subscribed:
+                ws.send(json.dumps({"type": "subscribe", "symbol": symbol}))
+        return ws
+
+    def _receive_loop(self):
+        logger = get_logger_with_context("quote-stream")
+        backoff = 1
+        while not self._stopped.is_set():
+            try:
+                ws = self._connect()
+                backoff = 1
+                while not self._stopped.is_set():
+                    try:
+                        frame = ws.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    if not frame:
+                        break
+                    with self._frames_ready:
+                        if len(self._frames) == self._frames.maxlen:
+                            self._dropped += 1
+                        self._frames.append(frame)
+                        self._received += 1
+                        self._frames_ready.notify()
+            except Exception as error:
+                logger.warning("Quote stream disconnected: %s", error)
+            with self._subscription_lock:
+                if self._ws is not None:
+                    self._ws.close()
+                self._ws = None
+            if self._stopped.is_set():
+                return
+            self._reconnects += 1
+            self._stopped.wait(backoff)
+            backoff = min(backoff * 2, config.STREAM_MAX_BACKOFF)
+
+    def _apply_loop(self):
+        while not self._stopped.is_set():
+            with self._frames_ready:
+                while not self._frames and not self._stopped.is_set():
+                    self._frames_ready.wait()
+                frames = list(self._frames)
+                self._frames.clear()
+
+            latest = {}
+            for frame in frames:
+                try:
+                    message = json.loads(frame)
+                except ValueError:
+                    continue
+                if message.get("type") != "trade":
+                    continue
+                for trade in message.get("data", []):
+                    self._trades += 1
+                    latest[trade["s"]] = trade
+            for symbol, trade in latest.items():
+                self.store.update(symbol, trade["p"], trade["t"])
+
+    def _resubscribe_loop(self):
+        logger = get_logger_with_context("quote-stream")
+        while not self._stopped.is_set():
+            try:
+                self.resubscribe(set(self.symbols_loader()))
+            except Exception as error:
+                logger.warning("Quote stream resubscribe failed: %s", error)
+            self._stopped.wait(self.resubscribe_interval)
+
+    def resubscribe(self, symbols):
+        """
+        Subscribe to newly tracked symbols and drop the ones no longer tracked
+        """
+        with self._subscription_lock:
+            added = symbols - self._subscribed
+            removed = self._subscribed - symbols
+            self._subscribed = symbols
+            ws = self._ws
+            if ws is not None:
+                # A failed send is repaired on reconnect, which subscribes to the full set again
+                try:
+                    for symbol in added:
+                        ws.send(json.dumps({"type": "subscribe", "symbol": symbol}))
+                    for symbol in removed:
+                        ws.send(json.dumps({"type": "unsubscribe", "symbol": symbol}))
+                except websocket.WebSocketException:
+                    pass
+        for symbol in removed:
+            self.store.discard(symbol)
+
+    def stats(self):
+        return {
+            "subscribed": len(self._subscribed),
+            "symbols_with_prices": len(self.store),
+            "frames_received": self._received,
+            "frames_dropped": self._dropped,
+            "queued_frames": len(self._frames),
+            "trades": self._trades,
+            "reconnects": self._reconnects,
+        }
+
+
+live_prices = LivePriceStore()
+quote_stream = None
+
+
+def start_quote_stream(url=None):
+    global quote_stream
+    if quote_stream is None:
+        quote_stream = QuoteStream(url or config.STREAM_URL, live_prices)
+        quote_stream.start()
+    return quote_stream
+
+
+def get_quote_stream_stats():
+    if quote_stream is None:
+        return {"enabled": False}
+    return dict(quote_stream.stats(), enabled=True)
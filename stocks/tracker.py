@@ -0,0 +1,74 @@
+from database.queries import fetch_stocks_by_symbol, store_tracked_stocks
+from stocks.stocks import profile_cache
+from api.resilience import remaining_time
+
+STORED = "stored"
+SUPERSEDED = "superseded"
+INVALID = "invalid"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+def resolve_stock_names(symbols, timeout=None):
+    """
+    Names for the given symbols, read from the stock table first
+    Only symbols the table does not know go to the profile cache, which fetches the ones it lacks concurrently
+    Returns ({symbol: name} stored, {symbol: name} fetched, {symbol: error}),
+    where error is None for symbols that have no profile
+    """
+    symbols = list(dict.fromkeys(symbols))
+    stored = {symbol: row["name"] for symbol, row in fetch_stocks_by_symbol(symbols).items()}
+
+    fetched = {}
+    errors = {}
+    unknown = [symbol for symbol in symbols if symbol not in stored]
+    if timeout is None:
+        timeout = remaining_time()
+    for result in profile_cache.get_many(unknown, timeout=timeout):
+        if result.error is not None:
+            errors[result.key] = result.error
+        elif not result.value.get("name"):
+            errors[result.key] = None
+        else:
+            fetched[result.key] = result.value["name"]
+    return stored, fetched, errors
+
+
+def store_positions(positions, timeout=None, all_or_nothing=False):
+    """
+    Store validated positions with their stocks in one transaction
+    A symbol listed more than once keeps its last position, earlier ones are reported as superseded
+    With all_or_nothing, one invalid or failed symbol means nothing is stored and the rest are skipped
+    Returns (outcomes, new_stocks), one outcome dict per position in input order
+    """
+    positions = [dict(position, symbol=position["symbol"].upper()) for position in positions]
+    last_index = {position["symbol"]: i for i, position in enumerate(positions)}
+    stored, fetched, errors = resolve_stock_names(list(last_index), timeout=timeout)
+    names = dict(stored, **fetched)
+
+    outcomes = []
+    tracker_rows = []
+    for i, position in enumerate(positions):
+        symbol = position["symbol"]
+        if symbol in errors:
+            if errors[symbol] is None:
+                outcomes.append({"symbol": symbol, "status": INVALID, "error": f"You entered an invalid stock symbol: {symbol}"})
+            else:
+                outcomes.append({"symbol": symbol, "status": FAILED, "error": f"Profile unavailable: {errors[symbol]}"})
+        elif last_index[symbol] != i:
+            outcomes.append({"symbol": symbol, "status": SUPERSEDED})
+        else:
+            outcomes.append({"symbol": symbol, "status": STORED, "name": names[symbol]})
+            tracker_rows.append((symbol, float(position["avg_purchase_cost"]), position["percent"],
+                                 1 if position["increase"] else 0, 1 if position["decrease"] else 0))
+
+    if all_or_nothing and errors:
+        return [dict(outcome, status=SKIPPED) if outcome["status"] == STORED else outcome for outcome in outcomes], 0
+
+    stock_rows = list(fetched.items())
+    if tracker_rows:
+        missing = set(store_tracked_stocks(stock_rows, tracker_rows))
+        if missing:
+            outcomes = [dict(outcome, status=FAILED, error="Stock could not be stored")
+                        if outcome["status"] == STORED and outcome["symbol"] in missing else outcome for outcome in outcomes]
+    return outcomes, len(stock_rows)
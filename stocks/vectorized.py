@@ -0,0 +1,47 @@
+import numpy as np
+
+from operator import itemgetter
+
+
+def load_columns(positions, quotes):
+    """
+    Columnar arrays for positions that have a quote, plus the positions they came from
+    """
+    quoted = [position for position in positions if quotes.get(position["symbol"])]
+    columns = {
+        "avg_purchase_cost": np.array(list(map(itemgetter("avg_purchase_cost"), quoted)), dtype=np.float64),
+        "percent": np.array(list(map(itemgetter("percent"), quoted)), dtype=np.float64),
+        "increase": np.array(list(map(itemgetter("increase"), quoted)), dtype=bool),
+        "decrease": np.array(list(map(itemgetter("decrease"), quoted)), dtype=bool),
+        "price": np.array([quotes[symbol]["c"] for symbol in map(itemgetter("symbol"), quoted)], dtype=np.float64),
+    }
+    return columns, quoted
+
+
+def percent_changes(price, avg_purchase_cost):
+    """
+    Same values as calculate_percent_change for every element
+    np.round scales by 100 before rounding, which can land on the other side of a .5 tie than
+    Python's correctly rounded round(), so values that close to a tie are redone with round()
+    """
+    raw = (price - avg_purchase_cost) / avg_purchase_cost * 100
+    scaled = raw * 100
+    rounded = np.rint(scaled) / 100
+
+    # raw * 100 is off by at most half an ulp, so only values this close to a tie can round differently
+    near_tie = np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) <= 1e-13 * (1 + np.abs(scaled)))
+    if near_tie.size:
+        rounded[near_tie] = [round(value, 2) for value in raw[near_tie].tolist()]
+    return rounded
+
+
+def evaluate_thresholds(columns):
+    """
+    Percent difference and increase/decrease alert masks for every position in one pass
+    """
+    percent_difference = percent_changes(columns["price"], columns["avg_purchase_cost"])
+    increased = columns["increase"] & (percent_difference >= columns["percent"]) & (percent_difference > 0)
+    decreased = (columns["decrease"] & ~increased & (np.abs(percent_difference) >= columns["percent"])
+                 & (percent_difference < 0))
+    return percent_difference, increased, decreased
+
@@ -0,0 +1,47 @@
+"""
+Tests run against the embedded SQLite backend with in-memory databases, set before config is imported
+Importing the app starts the logger, which writes to a temporary directory rather than logs/ in the checkout
+"""
+import os
+import sys
+import tempfile
+
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = ":memory:"
+os.environ["STOCKS_DB_NAME"] = "test_stocks"
+os.environ.setdefault("FINNHUB_TOKEN", "test")
+os.environ["LOG_FILE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="stock_market_bot-logs-"), "stock_market_bot.log")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import pytest
+import config
+
+from database.database import Database
+from database.migrate import upgrade
+
+
+@pytest.fixture
+def db():
+    """
+    The test database at the latest schema version, with every table emptied
+    """
+    upgrade(config.DATABASE)
+    with Database(config.DATABASE) as database:
+        for table in database.table_names():
+            if table not in ("schema_migrations", "sqlite_sequence"):
+                database.execute("DELETE FROM {}".format(table))
+    return config.DATABASE
+
+
+@pytest.fixture
+def tracked(db):
+    """
+    Ten tracked positions, stock ids 1 to 10 bought at 100
+    """
+    with Database(db) as database:
+        for stock_id in range(1, 11):
+            database.execute("INSERT INTO stock (id, symbol, name) VALUES (%s, %s, %s)",
+                             [stock_id, "S{}".format(stock_id), "Stock {}".format(stock_id)])
+            database.execute("INSERT INTO stock_tracker (avg_purchase_cost, percent, increase, decrease, stock_id) VALUES (100, 5, 1, 1, %s)",
+                             [stock_id])
+    return db
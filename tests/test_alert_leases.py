@@ -0,0 +1,83 @@
+import pytest
+
+from database.database import Database
+from database.queries import claim_alert_shards, register_alert_worker, remove_alert_worker, save_shard_alert_state
+
+SHARDS = 8
+TTL = 300
+
+
+def claim(worker_id, now, workers=None):
+    """
+    One claim round for worker_id at now, as AlertWorker.claim does it
+    """
+    live = register_alert_worker(worker_id, now, TTL)
+    share = -(-SHARDS // (workers or live))
+    return claim_alert_shards(worker_id, SHARDS, share, now, now + TTL)
+
+
+@pytest.fixture
+def stock(db):
+    with Database(db) as database:
+        database.execute("INSERT INTO stock (id, symbol, name) VALUES (1, 'AAPL', 'Apple Inc')")
+    return db
+
+
+def state_row(stock_id):
+    return (stock_id, stock_id, 110.0, 1, "up")
+
+
+def test_an_expired_lease_is_taken_over(db):
+    held = claim("a", 1000)
+    assert sorted(held) == list(range(SHARDS))
+
+    # a stops renewing, b can only take its shards once they expire
+    assert claim("b", 1000 + TTL - 1, workers=1) == {}
+    taken = claim("b", 1000 + TTL + 1, workers=1)
+    assert sorted(taken) == list(range(SHARDS))
+    assert all(taken[shard] == held[shard] + 1 for shard in taken)
+
+
+def test_a_stale_token_cannot_save(stock):
+    held = claim("a", 1000)
+    taken = claim("b", 1000 + TTL + 1, workers=1)
+
+    assert not save_shard_alert_state([state_row(1)], 1, "a", held[1], 2000 + TTL)
+    assert save_shard_alert_state([state_row(1)], 1, "b", taken[1], 2000 + TTL)
+
+
+def test_a_worker_that_lost_its_lease_and_retook_it_cannot_save_with_the_old_token(stock):
+    held = claim("a", 1000)
+    claim("b", 1000 + TTL + 1, workers=1)
+    remove_alert_worker("b")
+    retaken = claim("a", 1000 + 2 * TTL + 2, workers=1)
+
+    assert retaken[1] != held[1]
+    assert not save_shard_alert_state([state_row(1)], 1, "a", held[1], 3000)
+    assert save_shard_alert_state([state_row(1)], 1, "a", retaken[1], 3000)
+
+
+def test_shards_are_rebalanced_when_a_worker_joins_and_leaves(db):
+    assert len(claim("a", 1000)) == SHARDS
+
+    # b joins: it gets what a gives up on a's next renewal
+    assert claim("b", 1001) == {}
+    a_held = claim("a", 1002)
+    b_held = claim("b", 1003)
+    assert len(a_held) == len(b_held) == SHARDS // 2
+    assert not set(a_held) & set(b_held)
+
+    # b leaves: its leases are handed back and a takes them on its next run
+    remove_alert_worker("b")
+    assert sorted(claim("a", 1005)) == list(range(SHARDS))
+
+
+def test_shards_of_a_worker_that_stopped_renewing_are_rebalanced(db):
+    claim("a", 1000)
+    claim("b", 1001)
+    a_held = claim("a", 1002)
+    claim("b", 1003)
+
+    # b stops without handing its leases back: a keeps its half until b is forgotten and its leases expire
+    assert claim("a", 1003 + TTL - 1) == a_held
+    assert sorted(claim("a", 1003 + TTL + 1)) == list(range(SHARDS))
@@ -0,0 +1,77 @@
+import pytest
+import stocks.stocks
+
+from database.database import Database
+from database.migrate import check_query_plans
+from stocks.alert_worker import AlertWorker, shard_of
+from stocks.fetcher import FetchResult
+
+
+@pytest.fixture
+def quoted(monkeypatch):
+    """
+    Every quote is 110, the symbols quoted are recorded
+    """
+    requested = []
+
+    def get_stock_quotes(symbols, timeout=None):
+        requested.extend(symbols)
+        return [FetchResult(symbol, {"c": 110, "t": 1}, None) for symbol in symbols]
+
+    monkeypatch.setattr(stocks.stocks, "get_stock_quotes", get_stock_quotes)
+    monkeypatch.setattr(stocks.stocks, "construct_tracked_stocks_news", lambda positions, *args: [])
+    monkeypatch.setattr(stocks.stocks, "trigger_alert", lambda increased, decreased, news: [stock["symbol"] for stock in increased])
+    return requested
+
+
+def test_only_shards_owning_a_due_symbol_are_run(tracked, quoted):
+    worker = AlertWorker(processes=1, shards=4, worker_id="a")
+    try:
+        alerted = worker.run(["S2", "S6"])
+    finally:
+        worker.close()
+
+    assert sorted(quoted) == ["S2", "S6"]
+    assert alerted == ["S2", "S6"]
+    with Database(tracked) as database:
+        rows = database.query("SELECT stock_id FROM stock_alert_state ORDER BY stock_id")
+    assert [row["stock_id"] for row in rows] == [2, 6]
+    assert {shard_of(2, 4), shard_of(6, 4)} == {2}
+
+
+def test_a_full_run_covers_every_position(tracked, quoted):
+    worker = AlertWorker(processes=1, shards=4, worker_id="a")
+    try:
+        worker.run()
+    finally:
+        worker.close()
+    assert sorted(quoted) == sorted("S{}".format(stock_id) for stock_id in range(1, 11))
+
+
+def test_checked_queries_use_indexes(tracked):
+    assert check_query_plans(tracked) == 0
+
+
+def test_shard_processes_share_the_quota_with_the_serving_process(monkeypatch):
+    import config
+    import stocks.alert_worker
+    from api.ratelimit import LocalTokenStore, RateLimiter
+
+    started = {}
+
+    class Executor:
+        def __init__(self, max_workers, mp_context, initializer, initargs):
+            started.update(processes=max_workers, initargs=initargs)
+
+        def shutdown(self):
+            pass
+
+    monkeypatch.setattr(stocks.alert_worker, "ProcessPoolExecutor", Executor)
+    monkeypatch.setattr(config, "RATE_LIMIT_URL", None)
+    monkeypatch.setattr(config, "SQLITE_PATH", "unused.sqlite3")
+    serving = RateLimiter("finnhub", 60, 30, {}, LocalTokenStore(), 1)
+    worker = AlertWorker(processes=3, worker_id="a", serving_limiter=serving, quota_share=0.5)
+    worker._pool()
+
+    assert serving.rate * 60 == 30 and serving.capacity == 15
+    assert started["initargs"] == (10, 5)
@@ -0,0 +1,58 @@
+from database.database import Database
+from database.queries import fetch_tracked_stocks
+from stocks.alerts import AlertEngine, INCREASE
+from stocks.stocks import calculate_percent_change
+
+
+def quotes(price, t):
+    return {"S{}".format(stock_id): {"c": price, "t": t} for stock_id in range(1, 11)}
+
+
+def alerted(engine, positions, price, t):
+    increased, decreased = engine.evaluate(positions, quotes(price, t))
+    engine.flush()
+    return [stock["symbol"] for stock in increased], [stock["symbol"] for stock in decreased]
+
+
+def test_a_crossing_alerts_once(tracked):
+    positions = fetch_tracked_stocks("S1")
+    engine = AlertEngine(calculate_percent_change)
+
+    assert alerted(engine, positions, 103, 1) == ([], [])
+    assert alerted(engine, positions, 106, 2) == (["S1"], [])
+    # Still past the threshold, and an unchanged quote is not evaluated again
+    assert alerted(engine, positions, 108, 3) == ([], [])
+    assert alerted(engine, positions, 108, 3) == ([], [])
+    # Back inside, then past the other threshold and back past the first one
+    assert alerted(engine, positions, 100, 4) == ([], [])
+    assert alerted(engine, positions, 94, 5) == ([], ["S1"])
+    assert alerted(engine, positions, 106, 6) == (["S1"], [])
+
+
+def test_a_crossing_saved_by_another_process_is_not_fired_again(tracked):
+    positions = fetch_tracked_stocks("S1")
+    first = AlertEngine(calculate_percent_change)
+    second = AlertEngine(calculate_percent_change)
+    assert alerted(second, positions, 100, 1) == ([], [])
+
+    # first runs next and alerts, then the run moves back to second, which still holds the state of t=1
+    assert alerted(first, positions, 106, 2) == (["S1"], [])
+    second.reload()
+    assert alerted(second, positions, 107, 3) == ([], [])
+
+    restarted = AlertEngine(calculate_percent_change)
+    assert alerted(restarted, positions, 107, 3) == ([], [])
+    assert restarted._state[positions[0]["stock_id"]][3] == INCREASE
+
+
+def test_a_replaced_position_is_evaluated_against_its_new_thresholds(tracked):
+    positions = fetch_tracked_stocks("S1")
+    engine = AlertEngine(calculate_percent_change)
+    assert alerted(engine, positions, 106, 1) == (["S1"], [])
+
+    with Database(tracked) as database:
+        database.execute("REPLACE INTO stock_tracker (avg_purchase_cost, percent, increase, decrease, stock_id) VALUES (100, 10, 1, 1, 1)")
+    engine.reload()
+    positions = fetch_tracked_stocks("S1")
+    assert alerted(engine, positions, 106, 1) == ([], [])
+    assert alerted(engine, positions, 111, 2) == (["S1"], [])
@@ -0,0 +1,64 @@
+import asyncio
+import io
+import json
+import pytest
+import config
+
+from flask import Flask
+from api.api import api_bp
+
+
+def chunked_body(size):
+    """
+    A JSON body of about size bytes sent without Content-Length
+    """
+    body = json.dumps({"stocks": [{"symbol": "F", "avg_purchase_cost": 5, "percent": 5, "padding": "x" * size}]}).encode()
+    for i in range(0, len(body), 4096):
+        yield body[i:i + 4096]
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    return app.test_client()
+
+
+def test_chunked_batch_over_the_limit_is_rejected(client):
+    response = client.post("/api/stocks/difference/batch", input_stream=io.BytesIO(b"".join(chunked_body(config.BATCH_MAX_PAYLOAD_BYTES))),
+                           headers={"Content-Type": "application/json", "Transfer-Encoding": "chunked"},
+                           environ_overrides={"wsgi.input_terminated": True})
+    assert response.status_code == 413
+
+
+def test_batch_over_the_limit_is_rejected(client):
+    response = client.post("/api/stocks/difference/batch", data=b"".join(chunked_body(config.BATCH_MAX_PAYLOAD_BYTES)),
+                           content_type="application/json")
+    assert response.status_code == 413
+
+
+def test_chunked_batch_over_the_limit_is_rejected_in_async_mode():
+    quart = pytest.importorskip("quart")
+    from api.async_api import async_api_bp
+
+    async def post():
+        app = quart.Quart(__name__)
+        app.register_blueprint(async_api_bp, url_prefix="/api")
+        async with app.test_client().request("/api/stocks/difference/batch", method="POST",
+                                             headers={"Content-Type": "application/json"}) as connection:
+            for data in chunked_body(config.BATCH_MAX_PAYLOAD_BYTES):
+                await connection.send(data)
+            await connection.send_complete()
+        return connection.status_code
+
+    assert asyncio.run(post()) == 413
+
+
+def test_chunked_batch_at_the_limit_is_read(client, monkeypatch):
+    monkeypatch.setattr(config, "BATCH_MAX_PAYLOAD_BYTES", 64)
+    body = json.dumps({"stocks": []}).encode().ljust(64)
+    response = client.post("/api/stocks/difference/batch", input_stream=io.BytesIO(body),
+                           headers={"Content-Type": "application/json", "Transfer-Encoding": "chunked"},
+                           environ_overrides={"wsgi.input_terminated": True})
+    assert response.status_code == 400
+    assert "stocks" in response.get_json()["error"]
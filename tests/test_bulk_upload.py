@@ -0,0 +1,78 @@
+import json
+import pytest
+import config
+import stocks.tracker
+
+from flask import Flask
+from api.api import api_bp
+from database.queries import fetch_tracked_stocks
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """
+    Bulk uploads stored two rows at a time, every symbol known upstream as "<symbol> Inc"
+    Returns the client and the chunks of symbols resolved
+    """
+    resolved = []
+
+    def resolve_stock_names(symbols, timeout=None):
+        resolved.append(list(symbols))
+        return {}, {symbol: symbol + " Inc" for symbol in symbols}, {}
+
+    monkeypatch.setattr(stocks.tracker, "resolve_stock_names", resolve_stock_names)
+    monkeypatch.setattr(config, "BULK_CHUNK_SIZE", 2)
+    app = Flask(__name__)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    return app.test_client(), resolved
+
+
+def tracked_symbols():
+    return sorted(stock["symbol"] for stock in fetch_tracked_stocks())
+
+
+def test_csv_rows_are_stored_a_chunk_at_a_time(client):
+    client, resolved = client
+    body = "symbol,avg_purchase_cost,percent,increase,decrease\nA,1,5,true,true\nB,1,5,true,true\nC,x,5,true,true\nD,1,5,true,true\n"
+    response = client.post("/api/stocks/tracker/bulk", data=body, content_type="text/csv")
+
+    assert response.status_code == 200
+    result = json.loads(response.get_data())
+    assert [row["status"] for row in result["rows"]] == ["stored", "stored", "invalid", "stored"]
+    assert result["summary"] == {"stored": 3, "superseded": 0, "invalid": 1, "failed": 0, "total": 4, "new_stocks": 3}
+    assert resolved == [["A", "B"], ["D"]]
+    assert tracked_symbols() == ["A", "B", "D"]
+
+
+def test_json_rows_are_parsed_as_they_arrive(client):
+    client, resolved = client
+    stocks = [{"symbol": symbol, "avg_purchase_cost": 1, "percent": 5, "increase": True, "decrease": False}
+              for symbol in ("A", "B", "C")]
+    response = client.post("/api/stocks/tracker/bulk", json={"note": {"ignored": [1, 2]}, "stocks": stocks})
+
+    assert response.status_code == 200
+    result = json.loads(response.get_data())
+    assert [row["row"] for row in result["rows"]] == [1, 2, 3]
+    assert result["summary"]["stored"] == 3
+    assert resolved == [["A", "B"], ["C"]]
+
+
+@pytest.mark.parametrize("body", ["[]", '{"stocks": {}}', '{"stocks": [,'])
+def test_an_unreadable_json_upload_is_rejected(client, body):
+    client, _ = client
+    response = client.post("/api/stocks/tracker/bulk", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert tracked_symbols() == []
+
+
+def test_an_upload_failing_midway_keeps_the_stored_chunks(client, monkeypatch):
+    client, _ = client
+    monkeypatch.setattr(config, "BULK_MAX_ROWS", 3)
+    body = "".join(json.dumps({"symbol": symbol, "avg_purchase_cost": 1, "percent": 5, "increase": True, "decrease": True}) + "\n"
+                   for symbol in ("A", "B", "C", "D"))
+    response = client.post("/api/stocks/tracker/bulk", data=body, content_type="application/x-ndjson")
+
+    result = json.loads(response.get_data())
+    assert result["error"] == "Uploads are limited to 3 rows"
+    assert result["summary"]["total"] == 2
+    assert tracked_symbols() == ["A", "B"]
@@ -0,0 +1,64 @@
+import sqlite3
+import pytest
+import database.database
+
+from database.database import Database
+
+
+class BrokenConnection:
+    def cursor(self):
+        raise RuntimeError("connection lost")
+
+
+class RecordingPool:
+    def __init__(self):
+        self.released = []
+
+    def acquire(self):
+        return BrokenConnection()
+
+    def release(self, con, discard=False):
+        self.released.append((con, discard))
+
+
+def test_a_connection_that_cannot_open_a_cursor_is_released(monkeypatch):
+    pool = RecordingPool()
+    monkeypatch.setattr(database.database, "get_pool", lambda name: pool)
+    with pytest.raises(RuntimeError):
+        Database("test")
+    assert len(pool.released) == 1
+    assert pool.released[0][1] is True
+
+
+def test_sqlite_placeholders_expand_per_parameter_shape(db):
+    pool = database.database.get_pool(db)
+    assert pool.prepare("SELECT * FROM stock WHERE symbol IN %s AND id > %s", [("A", "B"), 1]) == (
+        "SELECT * FROM stock WHERE symbol IN (?, ?) AND id > ?", ["A", "B", 1])
+    assert pool.prepare("SELECT * FROM stock WHERE symbol IN %s AND id > %s", [["A", "B", "C"], 1]) == (
+        "SELECT * FROM stock WHERE symbol IN (?, ?, ?) AND id > ?", ["A", "B", "C", 1])
+    assert pool.prepare_many("INSERT INTO stock (symbol, name) VALUES (%s, %s)") == "INSERT INTO stock (symbol, name) VALUES (?, ?)"
+    with pytest.raises(sqlite3.ProgrammingError):
+        pool.prepare("SELECT * FROM stock WHERE id = %s", [1, 2])
+
+
+def test_sqlite_in_queries_take_a_tuple(tracked):
+    with Database(tracked) as db:
+        rows = db.query("SELECT symbol FROM stock WHERE symbol IN %s AND id > %s ORDER BY id", [("S1", "S2", "S3"), 1])
+    assert [row["symbol"] for row in rows] == ["S2", "S3"]
+
+
+def test_sqlite_upsert_updates_the_conflicting_row(db):
+    with Database(db) as database:
+        database.upsert("stock_profile", ["symbol", "profile", "fetched_at"], [("AAPL", "{}", "2026-01-01 00:00:00")],
+                        keys=["symbol"], update=["profile", "fetched_at"])
+        database.upsert("stock_profile", ["symbol", "profile", "fetched_at"], [("AAPL", '{"name": "Apple"}', "2026-01-02 00:00:00")],
+                        keys=["symbol"], update=["profile"])
+        rows = database.query("SELECT symbol, profile, fetched_at FROM stock_profile")
+    assert [(row["symbol"], row["profile"], str(row["fetched_at"])) for row in rows] == [("AAPL", '{"name": "Apple"}', "2026-01-01 00:00:00")]
+
+
+def test_sqlite_insert_ignore_skips_duplicates(db):
+    with Database(db) as database:
+        database.insert_ignore("stock_quote_history", ["symbol", "t", "price"], [("AAPL", 1, 100.0), ("AAPL", 1, 101.0), ("AAPL", 2, 102.0)])
+        rows = database.query("SELECT t, price FROM stock_quote_history ORDER BY t")
+    assert rows == [{"t": 1, "price": 100.0}, {"t": 2, "price": 102.0}]
@@ -0,0 +1,68 @@
+import time
+
+from database.queries import save_quote_history, stream_quote_points
+from stocks.history import RAW, get_quote_history, rollup_quote_history, expire_quote_history
+
+DAY = 86400
+
+
+def start_of_day(days_ago):
+    today = int(time.time())
+    return today - today % DAY - days_ago * DAY
+
+
+def points(resolution, start, end):
+    return [(point["symbol"], point["bucket"], point["open"], point["high"], point["low"], point["close"], point["samples"])
+            for point in stream_quote_points(resolution, start, end)]
+
+
+def test_rollup_aggregates_each_resolution_from_the_finer_one(db):
+    day = start_of_day(2)
+    save_quote_history([("AAPL", day + 10, 100.0), ("AAPL", day + 30, 102.0), ("AAPL", day + 50, 99.0),
+                        ("AAPL", day + 70, 101.0), ("MSFT", day + 20, 300.0)])
+
+    assert rollup_quote_history(now=day + DAY) == {60: 3, 3600: 2, 86400: 2}
+    assert points(60, day, day + DAY) == [
+        ("AAPL", day, 100.0, 102.0, 99.0, 99.0, 3),
+        ("AAPL", day + 60, 101.0, 101.0, 101.0, 101.0, 1),
+        ("MSFT", day, 300.0, 300.0, 300.0, 300.0, 1),
+    ]
+    assert points(86400, day, day + DAY) == [
+        ("AAPL", day, 100.0, 102.0, 99.0, 101.0, 4),
+        ("MSFT", day, 300.0, 300.0, 300.0, 300.0, 1),
+    ]
+
+    # Buckets rebuilt in later runs are replaced, not added to
+    rollup_quote_history(now=day + DAY)
+    assert len(points(60, day, day + DAY)) == 3
+
+
+def test_rollup_stops_at_the_last_complete_bucket(db):
+    day = start_of_day(2)
+    save_quote_history([("AAPL", day + 10, 100.0), ("AAPL", day + 70, 101.0)])
+    assert rollup_quote_history(now=day + 65) == {60: 1}
+    assert points(3600, day, day + DAY) == []
+
+
+def test_history_downsamples_raw_quotes(db):
+    day = start_of_day(2)
+    save_quote_history([("AAPL", day + 10, 100.0), ("AAPL", day + 70, 101.0), ("AAPL", day + 3610, 103.0)])
+    resolution, buckets = get_quote_history("AAPL", day + 5, day + DAY, 3600)
+    assert resolution == 3600
+    assert [(bucket["t"], bucket["open"], bucket["close"], bucket["samples"]) for bucket in buckets] == [
+        (day, 100.0, 101.0, 2),
+        (day + 3600, 103.0, 103.0, 1),
+    ]
+
+
+def test_retention_keeps_rollups_after_raw_quotes_expire(db):
+    day = start_of_day(2)
+    save_quote_history([("AAPL", day + 10, 100.0), ("AAPL", day + 70, 101.0)])
+    rollup_quote_history(now=day + DAY)
+
+    assert expire_quote_history(now=day + 8 * DAY) == {RAW: 2}
+    assert points(RAW, day, day + DAY) == []
+    assert len(points(60, day, day + DAY)) == 2
+
+    assert expire_quote_history(now=day + 91 * DAY) == {60: 2}
+    assert len(points(86400, day, day + DAY)) == 1
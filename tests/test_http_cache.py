@@ -0,0 +1,44 @@
+import pytest
+
+from flask import Flask
+from api.api import api_bp
+from api.http_cache import tracker_validators, is_not_modified
+from database.queries import fetch_tracker_state
+
+
+@pytest.fixture
+def app(tracked):
+    app = Flask(__name__)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    return app
+
+
+def test_validators_with_quotes_are_weak(app):
+    with app.test_request_context("/api/stocks/track?detailed=true"):
+        etag, _, max_age = tracker_validators(fetch_tracker_state(), True)
+        assert etag.startswith("W/")
+        assert max_age > 0
+    with app.test_request_context("/api/stocks/track?detailed=false"):
+        etag, _, max_age = tracker_validators(fetch_tracker_state(), False)
+        assert not etag.startswith("W/")
+        assert max_age is None
+
+
+def test_weak_validator_revalidates(app):
+    with app.test_request_context("/api/stocks/track?detailed=true"):
+        etag, last_modified, _ = tracker_validators(fetch_tracker_state(), True)
+    headers = {"If-None-Match": '{}"{}"'.format("W/", etag[2:])}
+    with app.test_request_context("/api/stocks/track?detailed=true", headers=headers):
+        assert is_not_modified(etag, last_modified)
+
+
+def test_responses_are_private(app):
+    response = app.test_client().get("/api/stocks/track?detailed=false")
+    assert response.status_code == 200
+    assert response.cache_control.private
+    assert not response.cache_control.public
+
+    revalidated = app.test_client().get("/api/stocks/track?detailed=false",
+                                        headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == response.headers["ETag"]
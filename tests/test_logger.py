@@ -0,0 +1,55 @@
+import logging
+import os
+import queue
+
+from logger import EnqueueHandler
+
+
+def make_record(msg, args):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+
+
+def test_mutable_arguments_are_formatted_when_logged():
+    records = queue.Queue()
+    handler = EnqueueHandler(records)
+    positions = ["AAPL"]
+    handler.emit(make_record("tracking %s", (positions,)))
+    positions.append("MSFT")
+
+    record = records.get_nowait()
+    assert record.getMessage() == "tracking ['AAPL']"
+    assert record.args is None
+
+
+def test_scalar_arguments_are_left_for_the_writer():
+    records = queue.Queue()
+    handler = EnqueueHandler(records)
+    handler.emit(make_record("%s went up %.2f%%", ("AAPL", 1.5)))
+
+    record = records.get_nowait()
+    assert record.args == ("AAPL", 1.5)
+    assert record.getMessage() == "AAPL went up 1.50%"
+
+
+def test_forked_child_writes_its_records(tmp_path, monkeypatch):
+    import config
+    import logger as logger_module
+
+    monkeypatch.setattr(config, "LOG_FILE_PATH", str(tmp_path / "bot.log"))
+    monkeypatch.setattr(logger_module, "_listener", None)
+    log = logger_module.configure_logger()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                log.warning("written by the child")
+                logger_module._stop_writer()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        assert "written by the child" in (tmp_path / "bot.log").read_text()
+    finally:
+        logger_module._stop_writer()
+        log.handlers.clear()
+        log.propagate = True
+        monkeypatch.setattr(logger_module, "_listener", None)
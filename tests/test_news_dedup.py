@@ -0,0 +1,39 @@
+from stocks.news_dedup import NewsIndex, normalize_headline
+
+
+def article(id, headline, source, datetime):
+    return {"id": id, "headline": headline, "source": source, "datetime": datetime, "url": "https://example.com/{}".format(id)}
+
+
+def test_only_the_articles_own_source_is_stripped():
+    assert normalize_headline("Apple beats estimates - Reuters", "Reuters") == "apple beats estimates"
+    assert normalize_headline("Apple vs Microsoft - The Verdict", "Reuters") == "apple vs microsoft the verdict"
+
+
+def test_syndicated_copies_published_together_are_one_article():
+    index = NewsIndex(near_duplicates=True)
+    first = index.add("AAPL", article(1, "Apple beats estimates - Reuters", "Reuters", 1000))
+    second = index.add("AAPL", article(2, "Apple Beats Estimates - Yahoo", "Yahoo", 1000 + 3600))
+    assert first is second
+    assert len(index.entries("AAPL")) == 1
+
+
+def test_same_headline_on_other_days_from_other_sources_stays_apart():
+    index = NewsIndex(near_duplicates=True)
+    index.add("AAPL", article(1, "Stocks to watch this week", "Reuters", 1000))
+    index.add("AAPL", article(2, "Stocks to Watch This Week!", "Yahoo", 1000 + 7 * 86400))
+    assert len(index.entries("AAPL")) == 2
+
+
+def test_different_endings_are_different_articles():
+    index = NewsIndex(near_duplicates=True)
+    index.add("AAPL", article(1, "Apple vs Microsoft - The Verdict", "Reuters", 1000))
+    index.add("AAPL", article(2, "Apple vs Microsoft - Round Two", "Reuters", 1000))
+    assert len(index.entries("AAPL")) == 2
+
+
+def test_near_duplicates_are_off_by_default():
+    index = NewsIndex()
+    index.add("AAPL", article(1, "Apple beats estimates - Reuters", "Reuters", 1000))
+    index.add("AAPL", article(2, "Apple beats estimates - Yahoo", "Yahoo", 1000))
+    assert len(index.entries("AAPL")) == 2
@@ -0,0 +1,29 @@
+import time
+
+from api.profiler import SamplingProfiler
+from stocks import fetcher
+
+
+def slow_fetch(key):
+    deadline = time.monotonic() + 0.1
+    while time.monotonic() < deadline:
+        pass
+    return key
+
+
+def test_fetch_all_workers_are_sampled_into_the_request(monkeypatch):
+    profiler = SamplingProfiler(interval=0.001)
+    monkeypatch.setattr(fetcher, "profiler", profiler)
+
+    profiler.start()
+    results = fetcher.fetch_all(slow_fetch, ["AAPL", "MSFT"])
+    stacks = profiler.stop()
+
+    assert [result.value for result in results] == ["AAPL", "MSFT"]
+    assert any(stack.endswith("test_profiler:slow_fetch") for stack in stacks)
+
+
+def test_workers_are_not_sampled_without_a_profiled_request():
+    profiler = SamplingProfiler(interval=0.001)
+    assert profiler.follow(slow_fetch, "AAPL") == "AAPL"
+    assert profiler._active == {}
@@ -0,0 +1,54 @@
+from stocks.cache import TTLCache
+from stocks.profiles import ProfileCache
+
+
+def profiles(calls, known=None, failing=()):
+    """
+    Fake fetch_profile recording each symbol looked up
+    """
+    known = known or {}
+
+    def fetch_profile(symbol):
+        calls.append(symbol)
+        if symbol in failing:
+            raise ConnectionError("down")
+        return known.get(symbol, {})
+    return fetch_profile
+
+
+def cache(fetch_profile, **kwargs):
+    return ProfileCache(fetch_profile, memory=TTLCache(60, 100), **kwargs)
+
+
+def test_unknown_symbols_are_remembered_in_the_database(db):
+    calls = []
+    fetch_profile = profiles(calls, {"AAPL": {"ticker": "AAPL", "name": "Apple Inc"}})
+    assert cache(fetch_profile).get("NOPE") == {}
+    assert cache(fetch_profile).get("AAPL")["name"] == "Apple Inc"
+
+    # A fresh memory cache finds both in the database, the unknown symbol as {}
+    fresh = cache(fetch_profile)
+    assert fresh.get("NOPE") == {}
+    assert fresh.get("AAPL")["name"] == "Apple Inc"
+    assert calls == ["NOPE", "AAPL"]
+    assert fresh.stats()["stored_hits"] == 2
+
+
+def test_unknown_symbols_are_looked_up_again_after_negative_ttl(db):
+    calls = []
+    fetch_profile = profiles(calls)
+    cache(fetch_profile, negative_ttl=0).get("NOPE")
+    cache(fetch_profile, negative_ttl=0).get("NOPE")
+    assert calls == ["NOPE", "NOPE"]
+
+
+def test_failed_lookups_are_not_cached(db):
+    calls = []
+    profile_cache = cache(profiles(calls, failing={"DOWN"}))
+    results = profile_cache.get_many(["DOWN", "NOPE", "DOWN"])
+    assert [result.key for result in results] == ["DOWN", "NOPE", "DOWN"]
+    assert isinstance(results[0].error, ConnectionError)
+    assert results[1].value == {} and results[1].error is None
+
+    profile_cache.get_many(["DOWN", "NOPE"])
+    assert sorted(calls) == ["DOWN", "DOWN", "NOPE"]
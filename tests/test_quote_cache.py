@@ -0,0 +1,39 @@
+import sys
+import threading
+
+from stocks.cache import TTLCache
+
+
+class FlakyBackend:
+    """
+    Shared backend that fails every get and has a value for every other key
+    """
+    def get(self, key):
+        if key % 2:
+            raise ConnectionError("backend down")
+        return {"c": key}
+
+    def set(self, key, value, ttl):
+        raise ConnectionError("backend down")
+
+
+def test_backend_counters_are_exact_under_concurrency():
+    switch_interval = sys.getswitchinterval()
+    # Switch threads as often as possible so unlocked increments would lose updates
+    sys.setswitchinterval(1e-6)
+    try:
+        cache = TTLCache(0, 10, FlakyBackend())
+        threads = [threading.Thread(target=lambda offset=offset: [cache.get_or_load(offset * 1000 + i, lambda key: {"c": key})
+                                                                 for i in range(1000)])
+                   for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    stats = cache.stats()
+    # Odd keys fail the get and then the set, even keys are shared hits
+    assert stats["shared_hits"] == 4000
+    assert stats["backend_errors"] == 8000
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+import requests
+
+from api.adapters import RetryPolicy, RetryDeadlineExceeded
+from api.resilience import request_deadline
+from stocks.cache import TTLCache
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ttl):
+        self.values[key] = value
+
+
+class Reply:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        raise requests.HTTPError(f"{self.status_code} Error")
+
+
+def test_async_loads_use_the_shared_backend():
+    backend = MemoryBackend()
+    backend.values["S1"] = {"c": 1}
+    cache = TTLCache(60, 10, backend)
+    calls = []
+
+    async def loader(key):
+        calls.append(key)
+        return {"c": 2}
+
+    assert asyncio.run(cache.get_or_load_async("S1", loader)) == {"c": 1}
+    assert asyncio.run(cache.get_or_load_async("S2", loader)) == {"c": 2}
+    assert calls == ["S2"]
+    assert backend.values["S2"] == {"c": 2}
+    assert cache.stats()["shared_hits"] == 1
+
+
+def test_async_loads_fall_back_to_the_stale_value():
+    cache = TTLCache(0, 10)
+    cache.set("S1", {"c": 1})
+
+    async def failing(key):
+        raise requests.ConnectionError("down")
+
+    assert asyncio.run(cache.get_or_load_async("S1", failing, stale_on=(requests.RequestException,))) == {"c": 1}
+    with pytest.raises(requests.ConnectionError):
+        asyncio.run(cache.get_or_load_async("S2", failing, stale_on=(requests.RequestException,)))
+
+
+def test_concurrent_async_misses_share_one_load():
+    cache = TTLCache(60, 10)
+    calls = []
+
+    async def loader(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"c": 3}
+
+    async def many():
+        return await asyncio.gather(*[cache.get_or_load_async("S1", loader) for _ in range(5)])
+
+    assert asyncio.run(many()) == [{"c": 3}] * 5
+    assert calls == ["S1"]
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_sync_and_async_sends_retry_the_same_way():
+    policy = RetryPolicy(total=2, backoff_factor=0, status_forcelist=[503])
+
+    def replies():
+        statuses = iter([503, 503, 200])
+        return lambda: Reply(next(statuses))
+
+    assert policy.send(replies(), "http://upstream").status_code == 200
+
+    attempt = replies()
+
+    async def attempt_async():
+        return attempt()
+
+    assert asyncio.run(policy.send_async(attempt_async, "http://upstream")).status_code == 200
+
+    statuses = iter([503, 503, 503])
+    with pytest.raises(requests.HTTPError):
+        policy.send(lambda: Reply(next(statuses)), "http://upstream")
+
+
+def test_retries_stop_at_the_request_deadline():
+    policy = RetryPolicy(total=3, backoff_factor=1, status_forcelist=[503])
+    with request_deadline(0.5):
+        with pytest.raises(RetryDeadlineExceeded):
+            policy.send(lambda: Reply(503), "http://upstream")
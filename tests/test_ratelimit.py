@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+from api.ratelimit import LocalTokenStore, RateLimiter
+
+
+class RecordingStore(LocalTokenStore):
+    """
+    LocalTokenStore that records the thread each take runs on
+    """
+    def __init__(self, blocking):
+        super().__init__()
+        self.blocking = blocking
+        self.threads = []
+
+    def take(self, key, rate, capacity, reserve):
+        self.threads.append(threading.get_ident())
+        return super().take(key, rate, capacity, reserve)
+
+
+def acquire_on_loop(store):
+    limiter = RateLimiter("test", 60, 5, {}, store, 1)
+
+    async def acquire():
+        await limiter.acquire_async()
+        return threading.get_ident()
+
+    return asyncio.run(acquire())
+
+
+def test_a_blocking_store_is_called_off_the_event_loop():
+    store = RecordingStore(blocking=True)
+    loop_thread = acquire_on_loop(store)
+    assert store.threads and loop_thread not in store.threads
+
+
+def test_a_local_store_is_called_on_the_event_loop():
+    store = RecordingStore(blocking=False)
+    loop_thread = acquire_on_loop(store)
+    assert store.threads == [loop_thread]
+
+
+class SlowStore(LocalTokenStore):
+    """
+    LocalTokenStore whose take blocks until released, like a slow Redis round trip
+    """
+    def __init__(self):
+        super().__init__()
+        self.taking = threading.Event()
+        self.release = threading.Event()
+
+    def take(self, key, rate, capacity, reserve):
+        self.taking.set()
+        self.release.wait(5)
+        return super().take(key, rate, capacity, reserve)
+
+
+def test_the_store_is_called_without_holding_the_limiter():
+    store = SlowStore()
+    limiter = RateLimiter("test", 60, 5, {}, store, 5)
+    thread = threading.Thread(target=limiter.acquire)
+    thread.start()
+    assert store.taking.wait(5)
+
+    stats = []
+    reader = threading.Thread(target=lambda: stats.append(limiter.stats()))
+    reader.start()
+    reader.join(1)
+    assert stats and stats[0]["queued"] == 1
+
+    store.release.set()
+    thread.join(5)
+    assert limiter.stats()["acquired"]["interactive"] == 1
+
+
+def test_every_attempt_takes_a_token(monkeypatch):
+    import requests
+    from stocks import stocks
+
+    class Reply:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+        def json(self):
+            return {"c": 1, "t": 1}
+
+        def raise_for_status(self):
+            raise requests.HTTPError(str(self.status_code))
+
+    replies = iter([Reply(429), Reply(200)])
+    acquired = []
+    monkeypatch.setattr(stocks.http, "get", lambda url: next(replies))
+    monkeypatch.setattr(stocks.finnhub_limiter, "acquire", lambda timeout=None: acquired.append(timeout))
+    monkeypatch.setattr(stocks.retries, "backoff_factor", 0)
+    assert stocks.finnhub_get("quote", "http://upstream/quote").status_code == 200
+    assert len(acquired) == 2
+
+
+def test_a_quote_without_a_token_is_served_stale(monkeypatch):
+    from api.ratelimit import RateLimitExceeded
+    from stocks import stocks
+
+    def exhausted(timeout=None):
+        raise RateLimitExceeded("no token")
+
+    monkeypatch.setattr(stocks.finnhub_limiter, "acquire", exhausted)
+    monkeypatch.setattr(stocks, "get_live_quote", lambda symbol: None)
+    stocks.quote_cache.set("STALE", {"c": 1, "t": 1})
+    monkeypatch.setattr(stocks.quote_cache, "ttl", 0)
+    assert stocks.get_stock_quote("STALE") == {"c": 1, "t": 1}
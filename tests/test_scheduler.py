@@ -0,0 +1,57 @@
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from stocks.scheduler import Scheduler
+
+
+def make_scheduler(worker_id, runs):
+    scheduler = Scheduler(leader_ttl=30, worker_id=worker_id)
+    scheduler._executor = ThreadPoolExecutor(max_workers=2)
+    intervals = {session: 60 for session in ("regular", "extended", "closed")}
+    scheduler.add_job("exclusive", lambda session: runs.append((worker_id, "exclusive")), intervals)
+    scheduler.add_job("everywhere", lambda session: runs.append((worker_id, "everywhere")), intervals, exclusive=False)
+    return scheduler
+
+
+def run_due(scheduler):
+    for job in scheduler.jobs.values():
+        if job.next_run is not None:
+            job.next_run = 0
+    scheduler.run_pending()
+    scheduler._executor.shutdown(wait=True)
+    scheduler._executor = ThreadPoolExecutor(max_workers=2)
+
+
+def test_only_the_leader_runs_exclusive_jobs(db):
+    runs = []
+    first = make_scheduler("first", runs)
+    second = make_scheduler("second", runs)
+    for scheduler in (first, second, first, second):
+        run_due(scheduler)
+
+    assert first.leader and not second.leader
+    assert sorted(set(runs)) == [("first", "everywhere"), ("first", "exclusive"), ("second", "everywhere")]
+
+
+def test_a_follower_takes_over_from_a_leader_that_stops(db):
+    runs = []
+    first = make_scheduler("first", runs)
+    second = make_scheduler("second", runs)
+    run_due(first)
+    run_due(second)
+    assert not second.leader
+
+    first.stop()
+    run_due(second)
+    assert second.leader
+    assert second.jobs["exclusive"].next_run is not None
+
+
+def test_a_leader_that_stops_renewing_is_replaced_after_its_ttl(db):
+    first = make_scheduler("first", [])
+    second = make_scheduler("second", [])
+    now = time.time()
+    assert first.elect(now)
+    assert not second.elect(now + 29)
+    assert second.elect(now + 31)
+    assert not first.elect(now + 32)
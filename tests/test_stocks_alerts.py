@@ -0,0 +1,63 @@
+import pytest
+import stocks.stocks
+
+from stocks.alerts import AlertEngine
+from stocks.fetcher import FetchResult
+from stocks.news import NewsSchedule
+
+
+@pytest.fixture
+def alert_run(tracked, monkeypatch):
+    """
+    run_tracked_stocks_alert with fresh alert state, quotes of 110 and news recorded instead of loaded
+    Returns (quoted symbols, news symbols)
+    """
+    quoted = []
+    news = []
+
+    def get_stock_quotes(symbols, timeout=None):
+        quoted.extend(symbols)
+        return [FetchResult(symbol, {"c": 110, "t": 1}, None) for symbol in symbols]
+
+    monkeypatch.setattr(stocks.stocks, "alert_engine", AlertEngine(stocks.stocks.calculate_percent_change))
+    monkeypatch.setattr(stocks.stocks, "alert_news", NewsSchedule(interval=3600))
+    monkeypatch.setattr(stocks.stocks, "get_stock_quotes", get_stock_quotes)
+    def construct_tracked_stocks_news(positions, *args):
+        news.extend(position["symbol"] for position in positions)
+        return [dict(position) for position in positions]
+
+    monkeypatch.setattr(stocks.stocks, "construct_tracked_stocks_news", construct_tracked_stocks_news)
+    monkeypatch.setattr(stocks.stocks, "trigger_alert", lambda increased, decreased, news_list: None)
+    return quoted, news
+
+
+def test_a_run_for_symbols_reads_only_their_positions(alert_run, monkeypatch):
+    quoted, news = alert_run
+    monkeypatch.setattr(stocks.stocks, "stream_tracked_stocks", None)
+    stocks.stocks.run_tracked_stocks_alert(["S3", "S7", "UNTRACKED"])
+    assert quoted == ["S3", "S7"]
+    assert news == ["S3", "S7"]
+
+
+def test_news_is_loaded_once_per_interval(alert_run):
+    quoted, news = alert_run
+    stocks.stocks.run_tracked_stocks_alert(["S1", "S2"])
+    stocks.stocks.run_tracked_stocks_alert(["S1", "S2", "S3"])
+    stocks.stocks.run_tracked_stocks_alert(None)
+
+    assert len(quoted) == 2 + 3 + 10
+    assert sorted(news) == sorted("S{}".format(stock_id) for stock_id in range(1, 11))
+
+
+def test_news_that_failed_to_load_is_due_again(alert_run, monkeypatch):
+    quoted, news = alert_run
+
+    def construct_tracked_stocks_news(positions, *args):
+        news.extend(position["symbol"] for position in positions)
+        return [dict(position, error="News unavailable") if position["symbol"] == "S1" else dict(position)
+                for position in positions]
+
+    monkeypatch.setattr(stocks.stocks, "construct_tracked_stocks_news", construct_tracked_stocks_news)
+    stocks.stocks.run_tracked_stocks_alert(["S1", "S2"])
+    stocks.stocks.run_tracked_stocks_alert(["S1", "S2"])
+    assert news == ["S1", "S2", "S1"]
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import pytest
+
+from flask import Flask
+from api.api import api_bp
+
+
+@pytest.fixture
+def client(tracked):
+    app = Flask(__name__)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    return app.test_client()
+
+
+def test_streamed_tracked_stock_is_listed(client):
+    response = client.get("/api/stocks/track?symbol=S1&detailed=false&stream=true")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == [{"symbol": "S1", "name": "Stock 1"}]
+
+
+@pytest.mark.parametrize("stream", ["false", "true"])
+def test_untracked_symbol_is_not_found_with_or_without_streaming(client, stream):
+    assert client.get("/api/stocks/track?symbol=NOPE&detailed=false&stream=" + stream).status_code == 404
+    news = "/api/stocks/news?symbol=NOPE&start=2026-01-05&end=2026-01-06&detailed=false&stream=" + stream
+    assert client.get(news).status_code == 404
+
+
+def test_untracked_symbol_is_not_found_when_streamed_in_async_mode(tracked):
+    quart = pytest.importorskip("quart")
+    from api.async_api import async_api_bp
+
+    async def get(path):
+        app = quart.Quart(__name__)
+        app.register_blueprint(async_api_bp, url_prefix="/api")
+        response = await app.test_client().get(path)
+        return response.status_code, await response.get_data(as_text=True)
+
+    assert asyncio.run(get("/api/stocks/track?symbol=NOPE&detailed=false&stream=true"))[0] == 404
+    status, body = asyncio.run(get("/api/stocks/track?symbol=S1&detailed=false&stream=true"))
+    assert status == 200
+    assert [json.loads(line) for line in body.splitlines()] == [{"symbol": "S1", "name": "Stock 1"}]
+
+
+def test_async_stream_reads_rows_from_a_cursor_and_closes_it(tracked):
+    from api.pagination import apeek
+    from database.queries import stream_tracked_stocks_async, fetch_tracked_stocks
+
+    async def read(symbol, limit):
+        first, rows = await apeek(stream_tracked_stocks_async(symbol))
+        if first is None:
+            return None
+        symbols = []
+        try:
+            async for row in rows:
+                symbols.append(row["symbol"])
+                if len(symbols) == limit:
+                    break
+        finally:
+            await rows.aclose()
+        return symbols
+
+    assert asyncio.run(read("NOPE", None)) is None
+    everything = [row["symbol"] for row in fetch_tracked_stocks()]
+    assert asyncio.run(read(None, None)) == everything
+    # A reader stopping early releases the connection, the next statements still run
+    assert asyncio.run(read(None, 1)) == everything[:1]
+    assert [row["symbol"] for row in fetch_tracked_stocks()] == everything
@@ -0,0 +1,39 @@
+import stocks.tracker
+
+from database.database import Database
+from database.migrate import downgrade, upgrade
+from stocks.tracker import store_positions, STORED
+
+
+def position(symbol):
+    return {"symbol": symbol, "avg_purchase_cost": 100, "percent": 5, "increase": True, "decrease": True}
+
+
+def test_stocks_sharing_a_name_are_both_stored(db, monkeypatch):
+    monkeypatch.setattr(stocks.tracker, "resolve_stock_names",
+                        lambda symbols, timeout=None: ({}, {"GOOG": "Alphabet Inc", "GOOGL": "Alphabet Inc"}, {}))
+
+    outcomes, new_stocks = store_positions([position("GOOG"), position("GOOGL")])
+
+    assert [outcome["status"] for outcome in outcomes] == [STORED, STORED]
+    assert new_stocks == 2
+    with Database(db) as database:
+        rows = database.query("""
+            SELECT stock.symbol FROM stock_tracker JOIN stock ON stock.id = stock_tracker.stock_id ORDER BY stock.symbol
+        """)
+    assert [row["symbol"] for row in rows] == ["GOOG", "GOOGL"]
+
+
+def test_rebuilding_the_stock_table_keeps_tracker_rows(db):
+    with Database(db) as database:
+        database.execute("INSERT INTO stock (id, symbol, name) VALUES (7, 'AAPL', 'Apple Inc')")
+        database.execute("INSERT INTO stock_tracker (avg_purchase_cost, percent, increase, decrease, stock_id) VALUES (1, 5, 1, 1, 7)")
+
+    downgrade(db, 3)
+    upgrade(db)
+
+    with Database(db) as database:
+        assert database.query("PRAGMA foreign_key_check") == []
+        assert database.query("PRAGMA foreign_keys")[0]["foreign_keys"] == 1
+        rows = database.query("SELECT stock.symbol FROM stock_tracker JOIN stock ON stock.id = stock_tracker.stock_id")
+    assert [row["symbol"] for row in rows] == ["AAPL"]
@@ -0,0 +1,52 @@
+import random
+import pytest
+import config
+
+from stocks.alerts import AlertEngine
+from stocks.stocks import calculate_percent_change
+
+np = pytest.importorskip("numpy")
+from stocks.vectorized import percent_changes
+
+
+def sample_prices(count, seed=7):
+    """
+    (price, avg_purchase_cost) pairs, many of them on cent and half-cent grids where rounding ties are likely
+    """
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(count):
+        avg_purchase_cost = rng.choice([rng.randint(1, 100000) / 100, rng.choice([1, 2, 4, 8, 20, 25, 40, 50, 80, 100, 200])])
+        price = rng.choice([rng.randint(1, 200000) / 200, avg_purchase_cost * (1 + rng.randint(-4000, 4000) / 200000),
+                            rng.uniform(0.01, 2000)])
+        pairs.append((price, avg_purchase_cost))
+    return pairs
+
+
+def test_vectorized_percent_changes_match_the_scalar_rounding_exactly():
+    pairs = sample_prices(50000)
+    prices = np.array([price for price, _ in pairs], dtype=np.float64)
+    costs = np.array([cost for _, cost in pairs], dtype=np.float64)
+
+    vectorized = percent_changes(prices, costs).tolist()
+    scalar = [calculate_percent_change({"c": price}, cost) for price, cost in pairs]
+    assert vectorized == scalar
+
+
+def test_alert_engine_reports_the_same_alerts_with_and_without_numpy(monkeypatch):
+    pairs = sample_prices(2000, seed=11)
+    positions = [{"id": i, "stock_id": i, "symbol": "S{}".format(i), "name": "Stock {}".format(i),
+                  "avg_purchase_cost": cost, "percent": (i % 7) + 0.5, "increase": i % 3 != 0, "decrease": i % 4 != 0}
+                 for i, (_, cost) in enumerate(pairs)]
+    quotes = {"S{}".format(i): {"c": price, "t": 1} for i, (price, _) in enumerate(pairs)}
+
+    def run(min_positions):
+        monkeypatch.setattr(config, "VECTORIZE_MIN_POSITIONS", min_positions)
+        engine = AlertEngine(calculate_percent_change, load_state=lambda stock_ids: [], save_state=lambda rows: None)
+        return engine.evaluate(positions, quotes)
+
+    vectorized_increased, vectorized_decreased = run(0)
+    scalar_increased, scalar_decreased = run(len(positions) + 1)
+    assert vectorized_increased == scalar_increased
+    assert vectorized_decreased == scalar_decreased
+    assert vectorized_increased and vectorized_decreased